@@ -0,0 +1,75 @@
+"""
+Alias matching for file commands
+Compiles a user's file aliases into an Aho-Corasick automaton so every alias
+can be found in a command with a single pass over the text
+"""
+from collections import deque
+
+class AliasMatcher:
+    def __init__(self, aliases):
+        """
+        Build the automaton
+        
+        Args:
+            aliases: Dict of lowercase alias -> path
+        """
+        self.aliases = aliases
+        self.transitions = [{}]  # state -> {char: next state}
+        self.fail = [0]
+        self.longest = [None]  # Longest alias ending at each state
+        
+        for alias in aliases:
+            if alias:
+                self.add(alias)
+        self.build_fail_links()
+    
+    def add(self, alias):
+        """Insert an alias into the trie"""
+        state = 0
+        for char in alias:
+            next_state = self.transitions[state].get(char)
+            if next_state is None:
+                next_state = len(self.transitions)
+                self.transitions[state][char] = next_state
+                self.transitions.append({})
+                self.fail.append(0)
+                self.longest.append(None)
+            state = next_state
+        self.longest[state] = alias
+    
+    def build_fail_links(self):
+        """Compute failure links breadth-first"""
+        pending = deque(self.transitions[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, next_state in self.transitions[state].items():
+                pending.append(next_state)
+                
+                fallback = self.fail[state]
+                while fallback and char not in self.transitions[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.transitions[fallback].get(char, 0)
+                
+                # A state's own alias is always longer than one inherited via its fail link
+                if self.longest[next_state] is None:
+                    self.longest[next_state] = self.longest[self.fail[next_state]]
+    
+    def longest_match(self, text):
+        """
+        Find the longest alias occurring anywhere in the text
+        
+        Returns:
+            (alias, path) or None
+        """
+        state = 0
+        best = None
+        for char in text:
+            while state and char not in self.transitions[state]:
+                state = self.fail[state]
+            state = self.transitions[state].get(char, 0)
+            
+            alias = self.longest[state]
+            if alias and (best is None or len(alias) > len(best)):
+                best = alias
+        
+        return (best, self.aliases[best]) if best else None
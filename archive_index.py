@@ -0,0 +1,193 @@
+"""
+Archive member listings for file searches
+Lets searches find files stored inside .zip and .tar archives. Zip members
+come from the central directory and tar members from their headers (the
+data in between is skipped with seeks), so an archive's contents are never
+read just to list it. Listings are cached by the archive's mtime and size, in
+memory and in the file index database, so they survive restarts. Compressed
+tars can only be listed by decompressing them, so searches leave them to the
+file index's background refresh.
+
+Members are named with virtual paths such as
+    /home/me/Downloads/export.zip!/AI_Assistant/config.py
+and extracted to a cache folder only when they are opened.
+"""
+import os
+import shutil
+import hashlib
+import tarfile
+import zipfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from config import config
+from file_index import file_index
+
+ARCHIVE_SEPARATOR = "!/"
+ZIP_SUFFIXES = ('.zip', '.jar')
+TAR_SUFFIXES = ('.tar',)
+# Compressed tars have no index; their headers can only be reached by decompressing
+COMPRESSED_TAR_SUFFIXES = ('.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+ARCHIVE_SUFFIXES = ZIP_SUFFIXES + TAR_SUFFIXES + COMPRESSED_TAR_SUFFIXES
+
+def is_archive_name(name):
+    """Check whether a (lowercase) file name looks like a supported archive"""
+    return name.endswith(ARCHIVE_SUFFIXES)
+
+def make_virtual_path(archive_path, member):
+    """Virtual path of an archive member"""
+    return archive_path + ARCHIVE_SEPARATOR + member
+
+def split_virtual_path(path):
+    """
+    Split a virtual path into (archive path, member name)
+    
+    Returns:
+        (archive, member), or (None, None) for an ordinary path
+    """
+    index = path.find(ARCHIVE_SEPARATOR)
+    while index >= 0:
+        archive = path[:index]
+        if is_archive_name(archive.lower()) and os.path.isfile(archive):
+            return archive, path[index + len(ARCHIVE_SEPARATOR):]
+        index = path.find(ARCHIVE_SEPARATOR, index + 1)
+    return None, None
+
+class ArchiveIndex:
+    def __init__(self, max_archives=256, extract_dir=None):
+        """
+        Initialize the archive index
+        
+        Args:
+            max_archives: Number of archive listings kept in memory
+            extract_dir: Folder that opened members are extracted to
+        """
+        self.max_archives = max_archives
+        self.extract_dir = Path(extract_dir) if extract_dir else Path.home() / ".ai_assistant" / "archive_cache"
+        self.listings = OrderedDict()  # archive path -> (mtime_ns, size, member names)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def members(self, archive_path, stat=None, list_compressed=False):
+        """
+        File members of an archive, from the cache while the archive is unchanged
+        
+        Args:
+            archive_path: Path of the archive
+            stat: The archive's os.stat result, if the caller already has it
+            list_compressed: Decompress a compressed tar that has no stored listing
+                             (background indexing); searches leave it unlisted
+        
+        Returns:
+            List of member names (empty for damaged or unsupported archives), or
+            None for a compressed tar that hasn't been listed yet
+        """
+        try:
+            stat = stat or os.stat(archive_path)
+        except OSError:
+            return []
+        version = (stat.st_mtime_ns, stat.st_size)
+        
+        with self.lock:
+            cached = self.listings.get(archive_path)
+            if cached and cached[:2] == version:
+                self.listings.move_to_end(archive_path)
+                self.hits += 1
+                return cached[2]
+            self.misses += 1
+        
+        try:
+            names = file_index.archive_members(archive_path, *version)
+        except Exception as e:
+            print(f"Error reading stored archive listing: {e}")
+            names = None
+        if names is None:
+            if archive_path.lower().endswith(COMPRESSED_TAR_SUFFIXES) and not list_compressed:
+                return None
+            names = self.read_members(archive_path, stat.st_size)
+            try:
+                file_index.store_archive_members(archive_path, *version, names)
+            except Exception as e:
+                print(f"Error storing archive listing: {e}")
+        with self.lock:
+            self.listings[archive_path] = version + (names,)
+            self.listings.move_to_end(archive_path)
+            while len(self.listings) > self.max_archives:
+                self.listings.popitem(last=False)
+        return names
+    
+    def read_members(self, archive_path, size):
+        """List an archive's file members from its directory or headers"""
+        name = archive_path.lower()
+        try:
+            if name.endswith(ZIP_SUFFIXES):
+                with zipfile.ZipFile(archive_path) as archive:
+                    return [info.filename for info in archive.infolist() if not info.is_dir()]
+            
+            if name.endswith(COMPRESSED_TAR_SUFFIXES):
+                # Listing means decompressing everything, so only small ones are listed
+                if size > config.get('archive_search_max_compressed_mb', 50) * 1024 * 1024:
+                    return []
+                mode = 'r:*'
+            else:
+                mode = 'r:'
+            with tarfile.open(archive_path, mode) as archive:
+                return [info.name for info in archive if info.isfile()]
+        except (OSError, EOFError, zipfile.BadZipFile, tarfile.TarError):
+            return []
+    
+    def extract(self, virtual_path):
+        """
+        Extract an archive member so it can be opened
+        
+        Returns:
+            Path of the extracted file, or None if the member can't be read
+        """
+        archive_path, member = split_virtual_path(virtual_path)
+        if not archive_path:
+            return None
+        try:
+            stat = os.stat(archive_path)
+        except OSError:
+            return None
+        
+        # One folder per archive version, so a changed archive never serves stale files
+        key = hashlib.sha1(f"{archive_path}|{stat.st_mtime_ns}|{stat.st_size}".encode('utf-8')).hexdigest()[:16]
+        digest = hashlib.sha1(member.encode('utf-8')).hexdigest()[:8]
+        target = self.extract_dir / key / digest / os.path.basename(member.rstrip('/'))
+        if target.exists():
+            return str(target)
+        
+        try:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if archive_path.lower().endswith(ZIP_SUFFIXES):
+                with zipfile.ZipFile(archive_path) as archive, archive.open(member) as source:
+                    self.write_member(source, target)
+            else:
+                with tarfile.open(archive_path, 'r:*') as archive:
+                    source = archive.extractfile(member)
+                    if source is None:
+                        return None
+                    with source:
+                        self.write_member(source, target)
+        except (OSError, KeyError, zipfile.BadZipFile, tarfile.TarError) as e:
+            print(f"Error extracting {member} from {archive_path}: {e}")
+            return None
+        return str(target)
+    
+    def write_member(self, source, target):
+        """Copy a member's data to a file, renaming it into place once complete"""
+        partial = target.with_name(target.name + ".part")
+        with open(partial, 'wb') as f:
+            shutil.copyfileobj(source, f, 1024 * 1024)
+        os.replace(partial, target)
+    
+    def get_stats(self):
+        """Get listing cache counters"""
+        with self.lock:
+            return {'archives': len(self.listings), 'hits': self.hits, 'misses': self.misses}
+
+# Global archive index instance
+archive_index = ArchiveIndex()
@@ -0,0 +1,156 @@
+"""
+Performance benchmarks for AI Assistant
+Run with: python benchmarks.py [name ...]
+"""
+import os
+import sys
+import glob
+import json
+import time
+import random
+import tempfile
+import statistics
+from datetime import datetime
+from pathlib import Path
+
+def time_calls(func, args_list):
+    """Time each call and return (mean, p95) in microseconds"""
+    timings = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+    return statistics.mean(timings), timings[int(len(timings) * 0.95) - 1]
+
+def legacy_authenticate(users_file, email, password):
+    """The previous authenticate_user: linear scan plus a full rewrite"""
+    with open(users_file, 'r') as f:
+        users = json.load(f)
+    for user in users:
+        if user.get('email') == email and user.get('password_hash') == password:
+            user['last_login'] = datetime.now().isoformat()
+            with open(users_file, 'w') as f:
+                json.dump(users, f, indent=2)
+            return user['id']
+    return None
+
+def benchmark_login(logins=1000):
+    """Login latency against the number of user profiles"""
+    from database import DatabaseManager
+    
+    print("Login latency (microseconds)")
+    print(f"{'users':>8} {'mean':>10} {'p95':>10} {'legacy mean':>12}")
+    
+    for user_count in (100, 1000, 10000):
+        with tempfile.TemporaryDirectory() as db_dir:
+            users = [
+                {"id": i, "email": f"user{i}@example.com", "password_hash": "secret",
+                 "assistant_name": "Assistant", "voice_preference": "female",
+                 "created_at": "", "last_login": ""}
+                for i in range(1, user_count + 1)
+            ]
+            users_file = Path(db_dir) / "users.json"
+            with open(users_file, 'w') as f:
+                json.dump(users, f, indent=2)
+            
+            database = DatabaseManager(db_dir)
+            database.load_users()  # One-time index build, not part of a login
+            calls = [(f"user{random.randint(1, user_count)}@example.com", "secret") for _ in range(logins)]
+            mean, p95 = time_calls(database.authenticate_user, calls)
+            database.flush_user_updates()
+            
+            legacy_calls = [(users_file,) + call for call in calls[:20]]
+            legacy_mean, _ = time_calls(legacy_authenticate, legacy_calls)
+            
+            print(f"{user_count:>8} {mean:>10.1f} {p95:>10.1f} {legacy_mean:>12.1f}")
+
+def legacy_search_for_file(base_path, filename):
+    """The previous search_for_file: one recursive glob per pattern"""
+    results = []
+    patterns = [
+        f"**/{filename}",
+        f"**/*{filename}*",
+        f"**/{filename}.*",
+        f"**/*{filename.split('.')[0]}*" if '.' in filename else f"**/*{filename}*"
+    ]
+    for pattern in patterns:
+        for match in glob.glob(os.path.join(base_path, pattern), recursive=True):
+            if os.path.isfile(match) or os.path.isdir(match):
+                results.append(match)
+        if results:
+            break
+    return list(set(results))
+
+def legacy_search_by_keywords(base_path, command):
+    """The previous search_by_keywords: os.walk with the depth checked after descending"""
+    results = []
+    keywords = command.split()
+    for root, dirs, files in os.walk(base_path):
+        depth = len(os.path.relpath(root, base_path).split(os.sep))
+        if depth > 3:
+            continue
+        for item in files + dirs:
+            if any(keyword.lower() in item.lower() for keyword in keywords):
+                results.append(os.path.join(root, item))
+                if len(results) >= 20:
+                    break
+        if len(results) >= 20:
+            break
+    return results
+
+def build_file_tree(base_path, top=10, middle=20, bottom=10, files=100):
+    """Create top * middle * bottom folders holding 'files' empty files each (200k by default)"""
+    for i in range(top):
+        for j in range(middle):
+            for k in range(bottom):
+                folder = os.path.join(base_path, f"area{i}", f"project{j}", f"part{k}")
+                os.makedirs(folder)
+                for n in range(files):
+                    open(os.path.join(folder, f"data_{i}_{j}_{k}_{n}.txt"), 'w').close()
+    open(os.path.join(base_path, f"area{top - 1}", f"project{middle - 1}", "quarterly_report.pdf"), 'w').close()
+
+def benchmark_file_search():
+    """Single-pass scandir walker against the glob/os.walk searches on a 200k-file tree"""
+    from file_handler import FileHandler
+    
+    # Skip __init__, which starts the background file index refresh
+    handler = FileHandler.__new__(FileHandler)
+    
+    with tempfile.TemporaryDirectory() as base_path:
+        print("Building 200k-file tree...")
+        build_file_tree(base_path)
+        
+        cases = [
+            ("find quarterly_report.pdf", handler.search_for_file, legacy_search_for_file, "quarterly_report.pdf"),
+            ("find missing.doc", handler.search_for_file, legacy_search_for_file, "missing.doc"),
+            ("find data_3_4 (many hits)", handler.search_for_file, legacy_search_for_file, "data_3_4"),
+            ("keywords 'budget report'", handler.search_by_keywords, legacy_search_by_keywords, "budget report"),
+        ]
+        
+        print("File search time (milliseconds)")
+        print(f"{'query':<28} {'walker':>10} {'legacy':>10} {'results':>9}")
+        for label, search, legacy, query in cases:
+            start = time.perf_counter()
+            results = search(base_path, query)
+            walker_ms = (time.perf_counter() - start) * 1000
+            
+            start = time.perf_counter()
+            legacy(base_path, query)
+            legacy_ms = (time.perf_counter() - start) * 1000
+            
+            print(f"{label:<28} {walker_ms:>10.1f} {legacy_ms:>10.1f} {len(results):>9}")
+
+BENCHMARKS = {
+    'login': benchmark_login,
+    'file_search': benchmark_file_search,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark '{name}'. Available: {', '.join(BENCHMARKS)}")
+            continue
+        BENCHMARKS[name]()
+        print()
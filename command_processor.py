@@ -11,6 +11,13 @@ import math
 from file_handler import file_handler
 from voice_handler import voice_handler
 from database import db
+from history_writer import history_writer
+from history_search import is_history_search, extract_search_query, parse_time_range, format_search_results
+from folder_watcher import is_watch_command, handle_watch_command
+from content_index import is_content_search, handle_content_search
+from duplicate_finder import is_duplicate_command, handle_duplicate_command
+from disk_usage import is_disk_usage_command, handle_disk_usage_command
+from media_index import is_media_command, handle_media_command
 from config import config
 
 class CommandProcessor:
@@ -24,6 +31,42 @@ class CommandProcessor:
         command = command.lower().strip()
         
         try:
+            # History search (before file operations, which also match 'search')
+            if is_history_search(command):
+                response = self.search_history(command)
+                self.save_interaction(command, response)
+                return response
+            
+            # Folder watches ("tell me when a file lands in downloads")
+            if is_watch_command(command):
+                response = handle_watch_command(command, db.get_file_aliases(self.user_id), self.process_command)
+                self.save_interaction(command, response)
+                return response
+            
+            # Document content search ("find the document that mentions invoice 4417")
+            if is_content_search(command):
+                response = self.format_file_results(handle_content_search(command))
+                self.save_interaction(command, str(response))
+                return response
+            
+            # Music and videos from the media catalog ("play songs by queen")
+            if is_media_command(command):
+                response = self.format_file_results(handle_media_command(command))
+                self.save_interaction(command, str(response))
+                return response
+            
+            # Duplicate files ("find duplicate files in downloads")
+            if is_duplicate_command(command):
+                response = handle_duplicate_command(command, self.user_id)
+                self.save_interaction(command, response)
+                return response
+            
+            # Disk usage ("what's taking up space in downloads")
+            if is_disk_usage_command(command):
+                response = handle_disk_usage_command(command, self.user_id)
+                self.save_interaction(command, response)
+                return response
+            
             # File/folder operations
             if any(keyword in command for keyword in ['open', 'find', 'search', 'play', 'show']):
                 if any(keyword in command for keyword in ['file', 'folder', 'drive', 'downloads', 'documents', 'desktop', 'music', 'videos', 'pictures']):
@@ -95,8 +138,10 @@ class CommandProcessor:
     
     def handle_file_command(self, command):
         """Handle file and folder operations"""
-        result = file_handler.parse_file_command(command, self.user_id)
-        
+        return self.format_file_results(file_handler.parse_file_command(command, self.user_id))
+    
+    def format_file_results(self, result):
+        """Number multiple file results so the user can pick one"""
         if isinstance(result, dict) and result.get('type') == 'multiple_results':
             self.last_search_results = result['results']
             response = result['message'] + "\n"
@@ -230,7 +275,9 @@ Hi! I'm {self.assistant_name}. Here's what I can do:
 • "Open Downloads folder"
 • "Find resume.pdf on C drive"
 • "Play music from Music folder"
+• "Play songs by Queen" or "Play the album Abbey Road"
 • "Show pictures from Desktop"
+• "Tell me when a file lands in Downloads"
 
 ⏰ TIME & DATE:
 • "What time is it?"
@@ -255,6 +302,7 @@ Hi! I'm {self.assistant_name}. Here's what I can do:
 • "Change name to [new name]"
 • "Change voice to male/female"
 • "Show history"
+• "Search history for resume last week"
 
 Just speak naturally or type your commands!
         """
@@ -262,6 +310,7 @@ Just speak naturally or type your commands!
     
     def show_history(self):
         """Show recent chat history"""
+        history_writer.flush()  # Include interactions still in the write queue
         history = db.get_chat_history(self.user_id, limit=10)
         if not history:
             return "No chat history found."
@@ -272,6 +321,16 @@ Just speak naturally or type your commands!
         
         return response
     
+    def search_history(self, command):
+        """Search past conversations"""
+        since, until, label, query = parse_time_range(extract_search_query(command))
+        if not query:
+            return "What should I look for? Try: 'search history for resume last week'"
+        
+        history_writer.flush()  # Include interactions still in the write queue
+        results = db.search_chat_history(self.user_id, query, since=since, until=until, limit=10)
+        return format_search_results(results, query, label)
+    
     def default_response(self, command):
         """Default response for unrecognized commands"""
         responses = [
@@ -284,6 +343,6 @@ Just speak naturally or type your commands!
     def save_interaction(self, prompt, response):
         """Save interaction to database"""
         try:
-            db.save_chat_history(self.user_id, prompt, str(response))
+            history_writer.save(self.user_id, prompt, str(response))
         except Exception as e:
             print(f"Error saving interaction: {e}")
\ No newline at end of file
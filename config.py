@@ -5,6 +5,8 @@ import os
 import json
 from pathlib import Path
 
+from utils.file_store import atomic_write_json
+
 class Config:
     def __init__(self):
         self.config_dir = Path.home() / ".ai_assistant"
@@ -29,6 +31,39 @@ class Config:
             "auto_listen": True,
             "offline_mode": True,
             "file_search_depth": 5,
+            "file_search_workers": 4,  # Folders searched in parallel
+            "file_search_time_budget": 30,  # Seconds before a GUI file search returns what it has
+            "scan_time_budget": 600,  # Seconds a disk usage or duplicate scan may run (file searches stop sooner)
+            "file_search_cache_size": 128,  # Recent searches kept, revalidated by folder mtimes
+            "file_search_root_time_budget": 10,  # Seconds one folder's walk may take
+            "file_search_root_entry_budget": 500000,  # Directory entries one folder's walk may list
+            "file_search_slow_root_rate": 1000,  # Entries/s below which a folder counts as slow
+            "file_search_slow_root_retry": 3600,  # Seconds a slow folder is skipped before it is tried again
+            "file_search_ignore": [],  # Extra gitignore-style patterns skipped by file searches
+            "file_search_ignore_defaults": True,  # Skip node_modules, virtualenvs, caches, etc.
+            "archive_search_enabled": True,  # Also match files inside .zip and .tar archives
+            "archive_search_max_compressed_mb": 50,  # Largest .tar.gz/.tar.xz listed (they must be decompressed)
+            "duplicate_finder_workers": 0,  # Hashing threads for duplicate searches (0 = one per CPU)
+            "disk_usage_workers": 8,  # Folders listed in parallel by the disk usage analyzer
+            "disk_usage_top": 10,  # Folders and files listed in a disk usage answer
+            "storage_backend": "json",  # "json" or "sqlite"
+            "history_fsync": False,  # fsync every chat history append
+            "history_batch_size": 50,
+            "history_flush_interval_ms": 500,
+            "history_queue_size": 10000,
+            "history_hot_limit": 50000,  # Live SQLite rows per user before older ones are archived
+            "file_index_enabled": True,  # Persistent filename index of common_folders
+            "file_index_drives": False,  # Also index whole drives (slow first build)
+            "file_index_refresh_minutes": 30,
+            "content_index_enabled": False,  # Index the words inside documents for "find the document that mentions X"
+            "content_index_roots": [],  # Folders to index (defaults to documents, desktop and downloads)
+            "content_index_workers": 2,
+            "content_index_duty_cycle": 0.25,  # Share of a core each indexing worker may use
+            "content_index_max_kb": 2048,  # Only the start of larger files is indexed
+            "media_index_enabled": True,  # Catalog music and video tags for "play songs by ..."
+            "media_index_roots": [],  # Folders to catalog (empty = the Music and Videos folders)
+            "media_index_workers": 4,  # Files whose tags are read in parallel
+            "media_playlist_max": 200,  # Tracks in a "play music" shuffle
             "screenshot_interval": 120,  # Default 2 minutes
             "screenshot_folder": str(self.screenshots_dir),
             "common_folders": {
@@ -63,8 +98,7 @@ class Config:
     def save_config(self):
         """Save configuration to file"""
         try:
-            with open(self.config_file, 'w') as f:
-                json.dump(self.config, f, indent=4)
+            atomic_write_json(self.config_file, self.config, indent=4)
         except Exception as e:
             print(f"Error saving config: {e}")
     
@@ -0,0 +1,447 @@
+"""
+Document content index
+An inverted index over the words in text-like files (txt, md, csv, code, and
+the text of .docx/.odt documents), so "find the document that mentions
+invoice 4417" can be answered. Files are read through mmap and tokenized on a
+small, throttled worker pool; refreshes only re-read files whose mtime or
+size changed. Queries are ranked with BM25.
+"""
+import os
+import re
+import math
+import mmap
+import time
+import sqlite3
+import zipfile
+import threading
+from array import array
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+from config import config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime REAL,
+    size INTEGER,
+    length INTEGER NOT NULL DEFAULT 0,
+    terms BLOB
+);
+CREATE TABLE IF NOT EXISTS terms (
+    id INTEGER PRIMARY KEY,
+    term TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term_id INTEGER NOT NULL,
+    doc_id INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term_id, doc_id)
+) WITHOUT ROWID;
+"""
+
+TEXT_EXTENSIONS = {
+    '.txt', '.md', '.markdown', '.rst', '.csv', '.tsv', '.log', '.json', '.xml', '.yaml', '.yml',
+    '.ini', '.cfg', '.toml', '.html', '.htm', '.tex', '.py', '.js', '.ts', '.java', '.c', '.h',
+    '.cpp', '.hpp', '.cs', '.go', '.rs', '.rb', '.php', '.sh', '.bat', '.ps1', '.sql', '.css'
+}
+# Zipped documents whose text is one XML member away
+XML_DOCUMENTS = {'.docx': 'word/document.xml', '.odt': 'content.xml'}
+
+# Words are runs of letters and digits; bytes >= 0x80 keep UTF-8 letters whole
+TOKEN_PATTERN = re.compile(rb"[0-9A-Za-z\x80-\xff]{2,}")
+XML_TAG = re.compile(rb"<[^>]+>")
+MAX_TERM_LENGTH = 40
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+CONTENT_SEARCH_PATTERN = re.compile(
+    r"(?:find|search for|show me|open|which is) (?:the |a |any |my )?(?:documents?|files?|notes?) "
+    r"(?:that |which )?(?:mentions?|mentioning|contains?|containing|says?|saying|talks? about|about) (?P<terms>.+)$"
+    r"|search (?:inside |in |through )?(?:my )?(?:documents|files|notes) for (?P<terms2>.+)$"
+)
+
+def count_terms(data, end=None):
+    """Count the lowercase words in a bytes-like object (bytes or mmap)"""
+    raw = Counter(TOKEN_PATTERN.findall(data, 0, len(data) if end is None else end))
+    counts = Counter()
+    for token, count in raw.items():
+        if len(token) <= MAX_TERM_LENGTH:
+            counts[token.decode('utf-8', 'ignore').lower()] += count
+    return counts
+
+def tokenize_file(path, max_bytes):
+    """
+    Read a document's words
+    
+    Returns:
+        Counter of term frequencies (empty for binary or unreadable files)
+    """
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        if extension in XML_DOCUMENTS:
+            with zipfile.ZipFile(path) as archive:
+                data = archive.read(XML_DOCUMENTS[extension])[:max_bytes]
+            return count_terms(XML_TAG.sub(b" ", data))
+        
+        with open(path, 'rb') as f:
+            # mmap lets the tokenizer scan the page cache without copying the file
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if b"\0" in mm[:1024]:
+                    return Counter()  # Binary file with a text extension
+                return count_terms(mm, min(len(mm), max_bytes))
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        return Counter()  # Empty (mmap refuses those), unreadable or damaged
+
+def query_terms(query):
+    """Distinct search terms of a query, in order"""
+    return list(dict.fromkeys(count_terms(query.encode('utf-8'))))
+
+def is_content_search(command):
+    """
+    Check whether a command searches inside documents
+    
+    While content indexing is off (the default) this is always False, so
+    "find the file that contains X" falls through to the filename search.
+    """
+    if not config.get('content_index_enabled', False):
+        return False
+    return bool(CONTENT_SEARCH_PATTERN.search(command.lower().strip()))
+
+class ContentIndex:
+    # Documents tokenized per write transaction
+    BATCH_SIZE = 64
+    
+    def __init__(self, db_file=None):
+        """
+        Initialize the content index
+        
+        Args:
+            db_file: SQLite file holding the index
+        """
+        db_dir = Path.home() / ".ai_assistant" / "database"
+        db_dir.mkdir(parents=True, exist_ok=True)
+        self.db_file = Path(db_file) if db_file else db_dir / "content_index.db"
+        self.local = threading.local()
+        self.refresh_lock = threading.Lock()
+        self.refresh_thread = None
+        self.stop_event = threading.Event()
+        self.refreshing = False
+        
+        # Indexing waits while interactive commands run
+        self.pause_lock = threading.Lock()
+        self.pause_count = 0
+        self.resume_event = threading.Event()
+        self.resume_event.set()
+        
+        self.init_database()
+    
+    def get_connection(self):
+        """Get this thread's connection (sqlite3 connections are not shareable)"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_file), timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+    
+    def init_database(self):
+        """Create tables"""
+        conn = self.get_connection()
+        with conn:
+            conn.executescript(SCHEMA)
+    
+    @contextmanager
+    def paused(self):
+        """Hold background indexing back while an interactive command runs"""
+        with self.pause_lock:
+            self.pause_count += 1
+            self.resume_event.clear()
+        try:
+            yield
+        finally:
+            with self.pause_lock:
+                self.pause_count -= 1
+                if not self.pause_count:
+                    self.resume_event.set()
+    
+    def find_documents(self, root):
+        """Walk a root for indexable files, yielding (path, mtime, size)"""
+        extensions = TEXT_EXTENSIONS | set(XML_DOCUMENTS)
+        stack = [root]
+        while stack and not self.stop_event.is_set():
+            folder = stack.pop()
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.name[0] == '.':
+                            continue
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif os.path.splitext(entry.name)[1].lower() in extensions:
+                                stat = entry.stat(follow_symlinks=False)
+                                yield entry.path, stat.st_mtime, stat.st_size
+                        except OSError:
+                            continue
+            except OSError:
+                continue  # Unreadable or vanished folder
+    
+    def refresh(self, roots):
+        """
+        Bring the index up to date for the given root folders
+        
+        Returns:
+            Number of documents that were (re)read
+        """
+        with self.refresh_lock:
+            self.refreshing = True
+            try:
+                return self.refresh_roots([os.path.abspath(root) for root in roots if os.path.isdir(root)])
+            finally:
+                self.refreshing = False
+    
+    def refresh_roots(self, roots):
+        """Find changed documents under the roots and (re)index them"""
+        conn = self.get_connection()
+        known = {row['path']: (row['mtime'], row['size']) for row in conn.execute("SELECT path, mtime, size FROM docs")}
+        seen = set()
+        changed = []
+        for root in roots:
+            for path, mtime, size in self.find_documents(root):
+                seen.add(path)
+                if known.get(path) != (mtime, size):
+                    changed.append((path, mtime, size))
+        if self.stop_event.is_set():
+            return 0  # Interrupted walk; don't mistake unvisited files for deleted ones
+        
+        prefixes = tuple(root.rstrip(os.sep) + os.sep for root in roots)
+        removed = [path for path in known if path.startswith(prefixes) and path not in seen]
+        if removed:
+            with conn:
+                for path in removed:
+                    self.remove_document(conn, path)
+        
+        indexed = 0
+        term_ids = {}  # Term -> id cache for this refresh
+        workers = max(1, config.get('content_index_workers', 2))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for start in range(0, len(changed), self.BATCH_SIZE):
+                self.resume_event.wait()
+                if self.stop_event.is_set():
+                    break
+                batch = changed[start:start + self.BATCH_SIZE]
+                counts = list(pool.map(self.read_document, [path for path, _, _ in batch]))
+                with conn:
+                    for (path, mtime, size), terms in zip(batch, counts):
+                        self.store_document(conn, path, mtime, size, terms, term_ids)
+                indexed += len(batch)
+        return indexed
+    
+    def read_document(self, path):
+        """Tokenize one document on a worker, throttled to the configured duty cycle"""
+        self.resume_event.wait()
+        started = time.monotonic()
+        counts = tokenize_file(path, config.get('content_index_max_kb', 2048) * 1024)
+        
+        # Rest in proportion to the work done, so indexing uses at most this share of a core
+        duty = min(max(config.get('content_index_duty_cycle', 0.25), 0.01), 1.0)
+        busy = time.monotonic() - started
+        if duty < 1.0:
+            self.stop_event.wait(min(busy * (1 / duty - 1), 1.0))
+        return counts
+    
+    def store_document(self, conn, path, mtime, size, counts, term_ids):
+        """Replace a document's postings (inside the caller's transaction)"""
+        row = conn.execute("SELECT id, terms FROM docs WHERE path = ?", (path,)).fetchone()
+        if row:
+            doc_id = row['id']
+            self.remove_postings(conn, doc_id, row['terms'])
+        else:
+            doc_id = conn.execute("INSERT INTO docs (path) VALUES (?)", (path,)).lastrowid
+        
+        ids = array('I')
+        for term in counts:
+            term_id = term_ids.get(term)
+            if term_id is None:
+                found = conn.execute("SELECT id FROM terms WHERE term = ?", (term,)).fetchone()
+                term_id = found[0] if found else conn.execute("INSERT INTO terms (term) VALUES (?)", (term,)).lastrowid
+                term_ids[term] = term_id
+            ids.append(term_id)
+        
+        conn.executemany(
+            "INSERT INTO postings (term_id, doc_id, tf) VALUES (?, ?, ?)",
+            ((term_id, doc_id, tf) for term_id, tf in zip(ids, counts.values()))
+        )
+        # The term ids are kept with the document, so re-indexing it deletes by primary key
+        conn.execute(
+            "UPDATE docs SET mtime = ?, size = ?, length = ?, terms = ? WHERE id = ?",
+            (mtime, size, sum(counts.values()), ids.tobytes(), doc_id)
+        )
+    
+    def remove_postings(self, conn, doc_id, terms):
+        """Delete a document's postings given its stored term ids"""
+        ids = array('I')
+        ids.frombytes(terms or b"")
+        conn.executemany("DELETE FROM postings WHERE term_id = ? AND doc_id = ?", ((term_id, doc_id) for term_id in ids))
+    
+    def remove_document(self, conn, path):
+        """Drop a document from the index (inside the caller's transaction)"""
+        row = conn.execute("SELECT id, terms FROM docs WHERE path = ?", (path,)).fetchone()
+        if row:
+            self.remove_postings(conn, row['id'], row['terms'])
+            conn.execute("DELETE FROM docs WHERE id = ?", (row['id'],))
+    
+    def search(self, query, limit=10, under=None):
+        """
+        Rank documents against a query
+        
+        Documents containing more of the query's words come first; ties are
+        ordered by BM25 score.
+        
+        Args:
+            query: Words to look for
+            limit: Maximum number of results
+            under: Only return documents below this folder
+        
+        Returns:
+            List of dicts with path, score and matched (number of query words found)
+        """
+        terms = query_terms(query)
+        if not terms:
+            return []
+        
+        conn = self.get_connection()
+        placeholders = ", ".join("?" * len(terms))
+        term_ids = [row[0] for row in conn.execute(f"SELECT id FROM terms WHERE term IN ({placeholders})", terms)]
+        if not term_ids:
+            return []
+        
+        total, average = conn.execute("SELECT COUNT(*), AVG(length) FROM docs WHERE length > 0").fetchone()
+        if not total:
+            return []
+        weights = []
+        for term_id in term_ids:
+            df = conn.execute("SELECT COUNT(*) FROM postings WHERE term_id = ?", (term_id,)).fetchone()[0]
+            weights += [term_id, math.log(1 + (total - df + 0.5) / (df + 0.5))]
+        
+        condition = ""
+        params = weights + [average]
+        if under:
+            prefix = os.path.abspath(under).rstrip(os.sep) + os.sep
+            condition = "WHERE docs.path >= ? AND docs.path < ?"
+            params += [prefix, prefix + '\U0010ffff']
+        
+        rows = conn.execute(
+            f"WITH query (term_id, idf) AS (VALUES {', '.join(['(?, ?)'] * len(term_ids))}) "
+            f"SELECT docs.path, COUNT(*) AS matched, "
+            f"SUM(query.idf * postings.tf * {K1 + 1} / (postings.tf + {K1} * (1 - {B} + {B} * docs.length / ?))) AS score "
+            f"FROM query JOIN postings ON postings.term_id = query.term_id JOIN docs ON docs.id = postings.doc_id "
+            f"{condition} GROUP BY docs.id ORDER BY matched DESC, score DESC LIMIT ?",
+            params + [limit * 2]
+        ).fetchall()
+        
+        results = [
+            {'path': row['path'], 'score': round(row['score'], 3), 'matched': row['matched']}
+            for row in rows if os.path.exists(row['path'])
+        ]
+        return results[:limit]
+    
+    def snippet(self, path, query, width=100):
+        """The line of a text document where the query's words first appear"""
+        terms = query_terms(query)
+        if not terms or os.path.splitext(path)[1].lower() not in TEXT_EXTENSIONS:
+            return None
+        pattern = re.compile(b"(?i)" + b"|".join(re.escape(term.encode('utf-8')) for term in terms))
+        try:
+            with open(path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    match = pattern.search(mm)
+                    if not match:
+                        return None
+                    start = mm.rfind(b"\n", 0, match.start()) + 1
+                    end = mm.find(b"\n", match.end())
+                    line = mm[max(start, match.start() - width):end if end >= 0 else len(mm)][:width * 2]
+        except (OSError, ValueError):
+            return None
+        return " ".join(line.decode('utf-8', 'ignore').split())[:width * 2]
+    
+    def get_stats(self):
+        """Get index size information"""
+        conn = self.get_connection()
+        return {
+            'documents': conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0],
+            'terms': conn.execute("SELECT COUNT(*) FROM terms").fetchone()[0],
+            'postings': conn.execute("SELECT COUNT(*) FROM postings").fetchone()[0],
+            'refreshing': self.refreshing
+        }
+    
+    def start_background_refresh(self, roots, interval=1800):
+        """
+        Keep the index fresh from a daemon thread
+        
+        Args:
+            roots: Folders to index
+            interval: Seconds between incremental refreshes
+        """
+        if self.refresh_thread and self.refresh_thread.is_alive():
+            return
+        
+        def refresh_loop():
+            while not self.stop_event.is_set():
+                try:
+                    self.refresh(roots)
+                except Exception as e:
+                    print(f"Content index refresh error: {e}")
+                self.stop_event.wait(interval)
+        
+        self.refresh_thread = threading.Thread(target=refresh_loop, daemon=True)
+        self.refresh_thread.start()
+    
+    def stop(self):
+        """Stop the background refresh"""
+        self.stop_event.set()
+        self.resume_event.set()
+
+def handle_content_search(command):
+    """
+    Answer "find the document that mentions ..." from the content index
+    
+    Returns:
+        A message, or a multiple_results dict like FileHandler.handle_search_results
+    """
+    if not config.get('content_index_enabled', False):
+        return "Document content search is off. Turn on 'content_index_enabled' in the settings to index your documents."
+    
+    match = CONTENT_SEARCH_PATTERN.search(command.lower().strip().rstrip('.!?'))
+    query = (match.group('terms') or match.group('terms2')) if match else command
+    query = re.sub(r"^(?:the )?(?:words?|text|phrase) ", "", query.strip().strip('"\''))
+    
+    results = content_index.search(query)
+    if not results:
+        if content_index.refreshing:
+            return f"No documents mention '{query}' yet - I'm still indexing your files."
+        return f"No documents mention '{query}'."
+    
+    best = [result for result in results if result['matched'] == results[0]['matched']]
+    if len(best) == 1:
+        from file_handler import file_handler
+        response = file_handler.open_path(best[0]['path'])
+        line = content_index.snippet(best[0]['path'], query)
+        return f"{response}\n\"{line}\"" if line else response
+    
+    return {
+        'type': 'multiple_results',
+        'message': f"Found {len(best)} documents mentioning '{query}':",
+        'results': [result['path'] for result in best]
+    }
+
+# Global content index instance
+content_index = ContentIndex()
@@ -3,66 +3,151 @@ Database handler for AI Assistant
 """
 import os
 import json
+import atexit
+import threading
+import heapq
 from datetime import datetime
 from pathlib import Path
 
+from config import config
+from history_search import HistoryIndex
+from history_archive import HistoryArchive
+from utils.file_store import get_file_lock, atomic_write_json, atomic_write_lines
+
 class DatabaseManager:
-    def __init__(self):
-        self.db_dir = Path.home() / ".ai_assistant" / "database"
+    # Number of chat history entries kept in each user's live journal after
+    # compaction; older entries roll into the compressed archive
+    HISTORY_LIMIT = 1000
+    # Compact a user's journal once it holds this many entries
+    COMPACT_THRESHOLD = 2000
+    # Seconds to defer last_login writes so logins don't rewrite the user table
+    LOGIN_FLUSH_DELAY = 30
+    
+    def __init__(self, db_dir=None):
+        self.db_dir = Path(db_dir) if db_dir else Path.home() / ".ai_assistant" / "database"
         self.db_dir.mkdir(parents=True, exist_ok=True)
-        self.chat_history_file = self.db_dir / "chat_history.json"
+        self.chat_history_file = self.db_dir / "chat_history.json"  # Legacy format
+        self.chat_journal_file = self.db_dir / "chat_history.jsonl"  # Legacy shared journal
+        self.history_dir = self.db_dir / "history"  # One journal per user
+        self.shard_index_file = self.history_dir / "index.json"
         self.users_file = self.db_dir / "users.json"
         self.file_aliases_file = self.db_dir / "file_aliases.json"
+        self.fsync_history = config.get('history_fsync', False)
+        
+        # Writers take the per-file lock; readers rely on atomic replaces and need none
+        self.shard_index_lock = get_file_lock(self.shard_index_file)
+        self.users_lock = get_file_lock(self.users_file)
+        self.aliases_lock = get_file_lock(self.file_aliases_file)
+        
+        # Per-user journals, listed in the directory index and opened on first write
+        self.shards = {}  # user key -> {"user_id": ..., "file": ...}
+        self.journal_entries = {}  # user key -> entries in that journal
+        self.history_indexes = {}  # user key -> HistoryIndex, built on first search
+        self.archive = HistoryArchive(self.db_dir / "archive")
+        
+        # In-memory user table indexed by email, reloaded when users.json changes
+        self.users = []
+        self.users_by_email = {}
+        self.max_user_id = 0
+        self.users_mtime = None
+        self.pending_logins = {}  # email -> last_login not yet written
+        self.login_flush_timer = None
+        
+        # File aliases, cached until file_aliases.json changes
+        self.aliases = {}
+        self.aliases_mtime = None
         
         # Initialize database files
         self.init_database()
     
     def init_database(self):
         """Initialize database files"""
-        # Chat history
-        if not self.chat_history_file.exists():
-            with open(self.chat_history_file, 'w') as f:
-                json.dump([], f)
+        # Chat history: one journal per user (one JSON object per line)
+        self.history_dir.mkdir(exist_ok=True)
+        if not self.shard_index_file.exists():
+            self.migrate_chat_history()
+        self.load_shards()
         
         # Users
         if not self.users_file.exists():
-            with open(self.users_file, 'w') as f:
-                json.dump([], f)
+            atomic_write_json(self.users_file, [])
         
         # File aliases
         if not self.file_aliases_file.exists():
-            with open(self.file_aliases_file, 'w') as f:
-                json.dump({}, f)
+            atomic_write_json(self.file_aliases_file, {})
+    
+    def load_users(self):
+        """Load users.json into the email index if the file changed on disk (hold users_lock)"""
+        try:
+            stat = self.users_file.stat()
+            mtime = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self.users_mtime:
+            return
+        
+        with open(self.users_file, 'r') as f:
+            users = json.load(f)
+        
+        self.users = users
+        self.users_by_email = {user.get('email'): user for user in users}
+        self.max_user_id = max((user.get('id', 0) for user in users), default=0)
+        self.users_mtime = mtime
+        
+        # Re-apply logins that haven't been written yet
+        for email, last_login in self.pending_logins.items():
+            user = self.users_by_email.get(email)
+            if user:
+                user['last_login'] = last_login
+    
+    def save_users(self):
+        """Write the user table, including any deferred last_login updates (hold users_lock)"""
+        atomic_write_json(self.users_file, self.users)
+        stat = self.users_file.stat()
+        self.users_mtime = (stat.st_mtime_ns, stat.st_size)
+        self.pending_logins.clear()
+    
+    def flush_user_updates(self):
+        """Write deferred last_login updates"""
+        try:
+            with self.users_lock:
+                if self.login_flush_timer is not None:
+                    self.login_flush_timer.cancel()
+                    self.login_flush_timer = None
+                if self.pending_logins:
+                    self.load_users()
+                    self.save_users()
+        except Exception as e:
+            print(f"Error saving user updates: {e}")
     
     def create_user(self, email, password, assistant_name="Assistant", voice_preference="female"):
         """Create a new user"""
         try:
-            # Load existing users
-            with open(self.users_file, 'r') as f:
-                users = json.load(f)
-            
-            # Check if user already exists
-            for user in users:
-                if user.get('email') == email:
+            with self.users_lock:
+                self.load_users()
+                
+                # Check if user already exists
+                if email in self.users_by_email:
                     return None  # User already exists
-            
-            # Create new user
-            user_id = len(users) + 1
-            new_user = {
-                "id": user_id,
-                "email": email,
-                "password_hash": password,  # In a real app, this would be hashed
-                "assistant_name": assistant_name,
-                "voice_preference": voice_preference,
-                "created_at": datetime.now().isoformat(),
-                "last_login": datetime.now().isoformat()
-            }
-            
-            users.append(new_user)
-            
-            # Save updated users
-            with open(self.users_file, 'w') as f:
-                json.dump(users, f, indent=2)
+                
+                # Create new user
+                user_id = self.max_user_id + 1
+                new_user = {
+                    "id": user_id,
+                    "email": email,
+                    "password_hash": password,  # In a real app, this would be hashed
+                    "assistant_name": assistant_name,
+                    "voice_preference": voice_preference,
+                    "created_at": datetime.now().isoformat(),
+                    "last_login": datetime.now().isoformat()
+                }
+                
+                self.users.append(new_user)
+                self.users_by_email[email] = new_user
+                self.max_user_id = user_id
+                
+                # Save updated users
+                self.save_users()
             
             return user_id
             
@@ -73,113 +158,395 @@ class DatabaseManager:
     def authenticate_user(self, email, password):
         """Authenticate user login"""
         try:
-            # Load users
-            with open(self.users_file, 'r') as f:
-                users = json.load(f)
-            
-            # Find user by email
-            for user in users:
-                if user.get('email') == email and user.get('password_hash') == password:
-                    # Update last login
-                    user['last_login'] = datetime.now().isoformat()
-                    
-                    # Save updated users
-                    with open(self.users_file, 'w') as f:
-                        json.dump(users, f, indent=2)
-                    
-                    return {
-                        "id": user['id'],
-                        "assistant_name": user.get('assistant_name', 'Assistant')
-                    }
+            with self.users_lock:
+                self.load_users()
+                
+                # Find user by email
+                user = self.users_by_email.get(email)
+                if user is None or user.get('password_hash') != password:
+                    return None  # Authentication failed
+                
+                # Update last login; the write is deferred and batched
+                user['last_login'] = datetime.now().isoformat()
+                self.pending_logins[email] = user['last_login']
+                if self.login_flush_timer is None:
+                    self.login_flush_timer = threading.Timer(self.LOGIN_FLUSH_DELAY, self.flush_user_updates)
+                    self.login_flush_timer.daemon = True
+                    self.login_flush_timer.start()
             
-            return None  # Authentication failed
+            return {
+                "id": user['id'],
+                "assistant_name": user.get('assistant_name', 'Assistant')
+            }
             
         except Exception as e:
             print(f"Error authenticating user: {e}")
             return None
     
+    def shard_key(self, user_id):
+        """Key of a user's shard in the directory index"""
+        return str(user_id)
+    
+    def journal_file(self, user_id):
+        """Path of a user's history journal"""
+        shard = self.shards.get(self.shard_key(user_id))
+        return self.history_dir / (shard['file'] if shard else f"user_{self.shard_key(user_id)}.jsonl")
+    
+    def journal_lock(self, user_id):
+        """Lock guarding writes to a user's journal"""
+        return get_file_lock(self.journal_file(user_id))
+    
+    def load_shards(self):
+        """Load the directory index of per-user journals"""
+        try:
+            with open(self.shard_index_file, 'r') as f:
+                self.shards = json.load(f)
+        except Exception as e:
+            print(f"Error loading history index: {e}")
+            self.shards = {}
+    
+    def register_shard(self, user_id):
+        """Add a user's journal to the directory index the first time it is written"""
+        key = self.shard_key(user_id)
+        if key in self.shards:
+            return
+        with self.shard_index_lock:
+            if key in self.shards:
+                return
+            shards = dict(self.shards)
+            shards[key] = {"user_id": user_id, "file": f"user_{key}.jsonl"}
+            atomic_write_json(self.shard_index_file, shards)
+            self.shards = shards
+    
+    def migrate_chat_history(self):
+        """Split the legacy shared history (chat_history.jsonl or .json) into per-user journals"""
+        history = []
+        legacy_file = self.chat_journal_file if self.chat_journal_file.exists() else self.chat_history_file
+        if legacy_file.exists():
+            try:
+                with open(legacy_file, 'r', encoding='utf-8') as f:
+                    if legacy_file == self.chat_journal_file:
+                        history = list(self.read_journal(f))
+                    else:
+                        history = json.load(f)[-self.HISTORY_LIMIT:]
+            except Exception as e:
+                print(f"Error reading legacy chat history: {e}")
+        
+        by_user = {}
+        for entry in history:
+            by_user.setdefault(self.shard_key(entry.get('user_id')), []).append(entry)
+        
+        self.shards = {}
+        for key, entries in by_user.items():
+            shard = {"user_id": entries[0].get('user_id'), "file": f"user_{key}.jsonl"}
+            atomic_write_lines(self.history_dir / shard['file'], (json.dumps(entry) for entry in entries))
+            self.shards[key] = shard
+        
+        # The index is written last, so an interrupted migration simply runs again
+        atomic_write_json(self.shard_index_file, self.shards)
+        
+        # Keep the old files around as a backup
+        for legacy_file in (self.chat_journal_file, self.chat_history_file):
+            if legacy_file.exists():
+                legacy_file.replace(legacy_file.with_name(legacy_file.name + '.bak'))
+    
+    def repair_journal(self, journal_file):
+        """Terminate a torn last line so the next append starts cleanly"""
+        try:
+            with open(journal_file, 'rb+') as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() == 0:
+                    return
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+        except Exception as e:
+            print(f"Error repairing chat journal: {e}")
+    
+    def read_journal(self, f):
+        """Yield chat history entries from an open journal, skipping damaged lines"""
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+    
+    def read_user_journal(self, user_id):
+        """Yield a user's live history entries, oldest first"""
+        try:
+            with open(self.journal_file(user_id), 'r', encoding='utf-8') as f:
+                yield from self.read_journal(f)
+        except FileNotFoundError:
+            return
+    
+    def open_journal(self, user_id):
+        """Prepare a user's journal for appending and count its entries (hold its lock)"""
+        key = self.shard_key(user_id)
+        if key in self.journal_entries:
+            return
+        self.register_shard(user_id)
+        journal_file = self.journal_file(user_id)
+        journal_file.touch()
+        self.repair_journal(journal_file)
+        self.journal_entries[key] = sum(1 for _ in self.read_user_journal(user_id))
+    
+    def compact_chat_history(self, user_id):
+        """Roll a user's older entries into the archive, keeping the hot tail (hold its lock)"""
+        try:
+            key = self.shard_key(user_id)
+            # Imported history may be appended after newer entries, so the hot tail
+            # is chosen by timestamp rather than by position in the journal
+            entries = sorted(self.read_user_journal(user_id), key=lambda entry: entry.get('timestamp', ''))
+            history = entries[-self.HISTORY_LIMIT:]
+            
+            # Archive first: a crash before the rewrite duplicates entries rather than losing them
+            self.archive.append(entries[:-self.HISTORY_LIMIT])
+            
+            atomic_write_lines(self.journal_file(user_id), (json.dumps(entry) for entry in history))
+            
+            self.journal_entries[key] = len(history)
+            self.history_indexes.pop(key, None)  # Rebuilt on next search
+            
+        except Exception as e:
+            print(f"Error compacting chat history: {e}")
+    
     def save_chat_history(self, user_id, prompt, response):
         """Save chat interaction to history"""
+        self.save_chat_history_batch([{
+            "user_id": user_id,
+            "prompt": prompt,
+            "response": response,
+            "timestamp": datetime.now().isoformat()
+        }])
+    
+    def save_chat_history_batch(self, entries):
+        """Save several chat interactions with one append per user"""
+        by_user = {}
+        for entry in entries:
+            by_user.setdefault(self.shard_key(entry.get('user_id')), []).append(entry)
+        
+        for key, user_entries in by_user.items():
+            user_id = user_entries[0].get('user_id')
+            try:
+                data = "".join(json.dumps(entry) + "\n" for entry in user_entries)
+                with self.journal_lock(user_id):
+                    self.open_journal(user_id)
+                    
+                    # Append lines instead of rewriting the whole history
+                    with open(self.journal_file(user_id), 'a', encoding='utf-8') as f:
+                        f.write(data)
+                        if self.fsync_history:
+                            f.flush()
+                            os.fsync(f.fileno())
+                    
+                    # Compaction is amortized over COMPACT_THRESHOLD - HISTORY_LIMIT appends,
+                    # and each user has their own budget
+                    self.journal_entries[key] += len(user_entries)
+                    if key in self.history_indexes:
+                        self.history_indexes[key].add_many(user_entries)
+                    if self.journal_entries[key] >= self.COMPACT_THRESHOLD:
+                        self.compact_chat_history(user_id)
+                    
+            except Exception as e:
+                print(f"Error saving chat history: {e}")
+    
+    def import_chat_history(self, entries, batch_size=None):
+        """
+        Bulk-load history entries, e.g. from history_transfer
+        
+        Entries go straight into full-size archive segments and the manifest is
+        written once at the end, so an import costs one write per entry instead
+        of a journal compaction and manifest rewrite every few thousand entries.
+        Reads order entries by timestamp, so imported entries newer than the
+        live journal still show up first.
+        
+        Args:
+            entries: Iterable of entries, in any order
+            batch_size: Unused; archive segments set the write size
+        
+        Returns:
+            Number of entries imported
+        """
+        count = 0
+        chunk = []
         try:
-            # Load existing history
-            with open(self.chat_history_file, 'r') as f:
-                history = json.load(f)
-            
-            # Add new entry
-            history.append({
-                "user_id": user_id,
-                "prompt": prompt,
-                "response": response,
-                "timestamp": datetime.now().isoformat()
-            })
-            
-            # Keep only last 1000 entries
-            if len(history) > 1000:
-                history = history[-1000:]
-            
-            # Save updated history
-            with open(self.chat_history_file, 'w') as f:
-                json.dump(history, f, indent=2)
-                
-        except Exception as e:
-            print(f"Error saving chat history: {e}")
+            for entry in entries:
+                chunk.append(entry)
+                if len(chunk) >= self.archive.segment_size:
+                    count += self.archive.append(chunk, save=False)
+                    chunk = []
+            count += self.archive.append(chunk, save=False)
+        finally:
+            with self.archive.lock:
+                self.archive.save_manifest()
+        return count
     
     def get_chat_history(self, user_id, limit=50):
         """Get user's chat history"""
         try:
-            # Load history
-            with open(self.chat_history_file, 'r') as f:
-                history = json.load(f)
+            # Open the journal and snapshot the archive together; reading happens outside
+            # the lock, and compaction replaces the journal, so the handle keeps one version
+            with self.journal_lock(user_id):
+                segments = self.archive.find_segments(user_id)
+                try:
+                    journal = open(self.journal_file(user_id), 'r', encoding='utf-8')
+                except FileNotFoundError:
+                    journal = None
             
-            # Filter by user_id and get last 'limit' entries
-            user_history = [
+            # Keep the 'limit' newest entries of the user's own journal; imports may have
+            # appended older entries after newer ones, so rank by timestamp, then position
+            user_history = []
+            if journal is not None:
+                with journal:
+                    newest = heapq.nlargest(
+                        limit, enumerate(self.read_journal(journal)),
+                        key=lambda item: (item[1].get('timestamp', ''), item[0])
+                    )
+                user_history = [
+                    (entry['prompt'], entry['response'], entry.get('timestamp', ''))
+                    for _, entry in reversed(newest)
+                ]
+            
+            # Continue into the archive when the live journal doesn't have enough, or when
+            # archived (imported) entries are newer than the oldest journal entry kept
+            if len(user_history) >= limit:
+                oldest = user_history[0][2]
+                segments = [segment for segment in segments if segment['max_timestamp'] > oldest]
+            older = [
                 (entry['prompt'], entry['response'], entry.get('timestamp', ''))
-                for entry in history
-                if entry.get('user_id') == user_id
+                for entry in self.archive.get_recent(user_id, limit, segments=segments)
             ]
             
-            return user_history[-limit:]
+            # Either side may hold imported entries older than the other's
+            return sorted(older + user_history, key=lambda item: item[2])[-limit:]
             
         except Exception as e:
             print(f"Error getting chat history: {e}")
             return []
     
-    def add_file_alias(self, user_id, alias, path):
-        """Add file/folder alias"""
-        try:
-            # Load existing aliases
-            with open(self.file_aliases_file, 'r') as f:
-                aliases = json.load(f)
+    def iter_chat_history(self, user_id=None, since=None, until=None):
+        """
+        Stream history entries, archive then live journals, oldest first per user
+        
+        Args:
+            user_id: Only entries of this user (None for all users)
+            since: Only entries at or after this datetime/ISO timestamp
+            until: Only entries before this datetime/ISO timestamp
+        """
+        since = since.isoformat() if isinstance(since, datetime) else since
+        until = until.isoformat() if isinstance(until, datetime) else until
+        
+        segments = self.archive.find_segments(user_id, since, until)
+        last_segment = max((segment['id'] for segment in self.archive.find_segments()), default=0)
+        yield from self.archive.iter_entries(user_id, since, until, oldest_first=True, segments=segments)
+        
+        if user_id is None:
+            shards = list(self.shards.values())
+        else:
+            shard = self.shards.get(self.shard_key(user_id))
+            shards = [shard] if shard else []
+        
+        for shard in shards:
+            # Segments a compaction created since the snapshot above, taken together with
+            # the journal they were cut from. The open handle keeps reading that version
+            # even if the journal is replaced, so no entry is yielded twice
+            with self.journal_lock(shard['user_id']):
+                newer = [
+                    segment for segment in self.archive.find_segments(shard['user_id'], since, until)
+                    if segment['id'] > last_segment
+                ]
+                try:
+                    journal = open(self.history_dir / shard['file'], 'r', encoding='utf-8')
+                except FileNotFoundError:
+                    continue
             
-            # Initialize user's aliases if not exists
-            user_id_str = str(user_id)
-            if user_id_str not in aliases:
-                aliases[user_id_str] = {}
+            with journal:
+                yield from self.archive.iter_entries(shard['user_id'], since, until, oldest_first=True, segments=newer)
+                for entry in self.read_journal(journal):
+                    timestamp = entry.get('timestamp', '')
+                    if (since and timestamp < since) or (until and timestamp >= until):
+                        continue
+                    yield entry
+    
+    def search_chat_history(self, user_id, query, since=None, until=None, limit=10):
+        """Full-text search over a user's prompts and responses"""
+        try:
+            key = self.shard_key(user_id)
             
-            # Add/update alias
-            aliases[user_id_str][alias.lower()] = path
+            # The in-memory index is shared with the writer, so search under the journal's lock
+            with self.journal_lock(user_id):
+                index = self.history_indexes.get(key)
+                if index is None:
+                    index = HistoryIndex()
+                    index.add_many(self.read_user_journal(user_id))
+                    self.history_indexes[key] = index
+                
+                if not self.archive.find_segments(user_id, since, until):
+                    return index.search(user_id, query, since, until, limit)
+                
+                # Rank live and archived entries together
+                return self.archive.search(user_id, query, since, until, limit, extra_index=index)
             
-            # Save updated aliases
-            with open(self.file_aliases_file, 'w') as f:
-                json.dump(aliases, f, indent=2)
+        except Exception as e:
+            print(f"Error searching chat history: {e}")
+            return []
+    
+    def load_aliases(self):
+        """Get all aliases, re-reading file_aliases.json only when it changed on disk"""
+        with self.aliases_lock:
+            stat = self.file_aliases_file.stat()
+            mtime = (stat.st_mtime_ns, stat.st_size)
+            if mtime != self.aliases_mtime:
+                with open(self.file_aliases_file, 'r') as f:
+                    self.aliases = json.load(f)
+                self.aliases_mtime = mtime
+            return self.aliases
+    
+    def add_file_alias(self, user_id, alias, path):
+        """Add file/folder alias"""
+        try:
+            with self.aliases_lock:
+                # Copy rather than mutate, so dicts handed out by get_file_aliases stay unchanged
+                aliases = dict(self.load_aliases())
+                user_id_str = str(user_id)
+                user_aliases = dict(aliases.get(user_id_str, {}))
                 
+                # Add/update alias
+                user_aliases[alias.lower()] = path
+                aliases[user_id_str] = user_aliases
+                
+                # Save updated aliases
+                atomic_write_json(self.file_aliases_file, aliases)
+                
+                stat = self.file_aliases_file.stat()
+                self.aliases = aliases
+                self.aliases_mtime = (stat.st_mtime_ns, stat.st_size)
+            
         except Exception as e:
             print(f"Error adding file alias: {e}")
     
     def get_file_aliases(self, user_id):
-        """Get user's file aliases"""
+        """Get user's file aliases (cached; the returned dict must not be modified)"""
         try:
-            # Load aliases
-            with open(self.file_aliases_file, 'r') as f:
-                aliases = json.load(f)
-            
-            # Get user's aliases
-            user_id_str = str(user_id)
-            return aliases.get(user_id_str, {})
+            return self.load_aliases().get(str(user_id), {})
             
         except Exception as e:
             print(f"Error getting file aliases: {e}")
             return {}
 
+def create_database():
+    """Create the database manager for the configured storage backend"""
+    if config.get('storage_backend', 'json') == 'sqlite':
+        from sqlite_database import SQLiteDatabaseManager
+        database = SQLiteDatabaseManager()
+        database.migrate_from_json()  # No-op after the first run
+        return database
+    database = DatabaseManager()
+    atexit.register(database.flush_user_updates)
+    return database
+
 # Global database instance
-db = DatabaseManager()
\ No newline at end of file
+db = create_database()
\ No newline at end of file
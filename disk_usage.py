@@ -0,0 +1,284 @@
+"""
+Disk usage analyzer
+Answers "what's taking up space in <folder>" with per-directory sizes from a
+parallel scandir walk. Each directory's own totals are cached with its mtime;
+a directory whose mtime hasn't changed has had no entries added, removed or
+renamed, so a repeat query only stats it and re-lists the ones that changed.
+(Files rewritten in place keep their folder's mtime; their new size shows up
+once something else in that folder changes.)
+"""
+import os
+import re
+import heapq
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import config
+from duplicate_finder import format_size
+
+DISK_USAGE_PATTERN = re.compile(
+    r"(?:what(?:'s| is) (?:taking up|using|eating|hogging|filling) (?:all )?(?:the |my )?(?:disk )?space"
+    r"(?: (?:in|on|under) (?:my |the )?(?P<folder>.+?)(?: folder)?)?"
+    r"|(?:disk|space) usage(?: (?:of|for|in|on) (?:my |the )?(?P<folder2>.+?)(?: folder)?)?"
+    r"|(?:show|find) (?:me )?(?:the )?(?:biggest|largest) (?:files and folders|folders|files)"
+    r"(?: (?:in|on|under) (?:my |the )?(?P<folder3>.+?)(?: folder)?)?)$",
+    re.IGNORECASE
+)
+
+class DirRecord:
+    """A directory's own contents, valid while its mtime is unchanged"""
+    __slots__ = ('mtime_ns', 'size', 'files', 'subdirs', 'big_files')
+    
+    def __init__(self, mtime_ns, size, files, subdirs, big_files):
+        self.mtime_ns = mtime_ns
+        self.size = size            # Bytes used by the files directly inside
+        self.files = files          # Number of those files
+        self.subdirs = subdirs      # Child directory paths
+        self.big_files = big_files  # Largest (size, path) files directly inside
+
+def is_disk_usage_command(command):
+    """Check whether a command asks what is using disk space"""
+    return bool(DISK_USAGE_PATTERN.match(command.strip().rstrip('.!?')))
+
+class DiskUsageAnalyzer:
+    # Largest files remembered per directory, and the smallest size worth remembering
+    BIG_FILES_PER_DIR = 3
+    BIG_FILE_MIN = 1024 * 1024
+    
+    def __init__(self, workers=None):
+        """
+        Initialize the analyzer
+        
+        Args:
+            workers: Listing threads (defaults to config disk_usage_workers)
+        """
+        self.workers = workers or config.get('disk_usage_workers', 8)
+        self.records = {}  # directory path -> DirRecord
+        self.scan_lock = threading.Lock()
+    
+    def file_usage(self, stat):
+        """Bytes a file occupies on disk (allocated blocks where the OS reports them)"""
+        blocks = getattr(stat, 'st_blocks', None)
+        return blocks * 512 if blocks is not None else stat.st_size
+    
+    def list_directory(self, path, mtime_ns):
+        """Read one directory into a fresh DirRecord"""
+        size = 0
+        files = 0
+        subdirs = []
+        big_files = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                            continue
+                        if entry.is_symlink():
+                            continue
+                        usage = self.file_usage(entry.stat(follow_symlinks=False))
+                    except OSError:
+                        continue
+                    size += usage
+                    files += 1
+                    if usage >= self.BIG_FILE_MIN:
+                        big_files.append((usage, entry.path))
+        except OSError:
+            pass  # Unreadable folder counts as empty
+        big_files = heapq.nlargest(self.BIG_FILES_PER_DIR, big_files)
+        return DirRecord(mtime_ns, size, files, subdirs, big_files)
+    
+    def scan(self, root, cancel=None):
+        """
+        Bring the cached records under a folder up to date
+        
+        Directories are listed on a thread pool. A worker walks depth first
+        on its own and hands subfolders to the pool while other workers are
+        short of work, so small trees don't pay a task per folder.
+        
+        Returns:
+            Dict with 'listed' (directories re-read) and 'cached' (unchanged) counts
+        """
+        counts = {'listed': 0, 'cached': 0}
+        try:
+            device = os.stat(root).st_dev
+        except OSError:
+            return counts
+        lock = threading.Lock()
+        done = threading.Event()
+        state = {'active': 0}
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        
+        def submit(path):
+            with lock:
+                state['active'] += 1
+            pool.submit(walk, path)
+        
+        def walk(path):
+            listed = cached = 0
+            stack = [path]
+            try:
+                while stack:
+                    if cancel is not None and cancel.is_set():
+                        break
+                    folder = stack.pop()
+                    try:
+                        stat = os.stat(folder, follow_symlinks=False)
+                    except OSError:
+                        self.forget(folder)
+                        continue
+                    if stat.st_dev != device:
+                        continue  # Another file system mounted here
+                    
+                    record = self.records.get(folder)
+                    if record is None or record.mtime_ns != stat.st_mtime_ns:
+                        old = record
+                        record = self.list_directory(folder, stat.st_mtime_ns)
+                        self.records[folder] = record
+                        if old:
+                            for subdir in set(old.subdirs).difference(record.subdirs):
+                                self.forget(subdir)
+                        listed += 1
+                    else:
+                        cached += 1
+                    
+                    for subdir in record.subdirs:
+                        if state['active'] < self.workers * 2:
+                            submit(subdir)
+                        else:
+                            stack.append(subdir)
+            finally:
+                with lock:
+                    counts['listed'] += listed
+                    counts['cached'] += cached
+                    state['active'] -= 1
+                    if not state['active']:
+                        done.set()
+        
+        with self.scan_lock:
+            try:
+                submit(root)
+                done.wait()
+            finally:
+                pool.shutdown(wait=True)
+        return counts
+    
+    def forget(self, path):
+        """Drop the records of a directory that no longer exists and everything below it"""
+        stack = [path]
+        while stack:
+            record = self.records.pop(stack.pop(), None)
+            if record:
+                stack.extend(record.subdirs)
+    
+    def subtree_sizes(self, root):
+        """
+        Total size and file count of every directory below a root, from the records
+        
+        Returns:
+            Dict of path -> (size, files)
+        """
+        totals = {}
+        stack = [(root, False)]
+        while stack:
+            path, children_done = stack.pop()
+            record = self.records.get(path)
+            if record is None:
+                continue
+            if not children_done:
+                stack.append((path, True))
+                stack.extend((subdir, False) for subdir in record.subdirs)
+                continue
+            size, files = record.size, record.files
+            for subdir in record.subdirs:
+                child = totals.get(subdir)
+                if child:
+                    size += child[0]
+                    files += child[1]
+            totals[path] = (size, files)
+        return totals
+    
+    def analyze(self, root, top=10, cancel=None):
+        """
+        Measure a folder
+        
+        Args:
+            root: Folder to analyze
+            top: Number of directories and files to return
+            cancel: Optional threading.Event or SearchToken that stops the scan
+        
+        Returns:
+            Dict with size, files, the heaviest subfolders and files, and scan statistics
+        """
+        root = os.path.abspath(root)
+        started = time.monotonic()
+        counts = self.scan(root, cancel)
+        
+        # Another scan may be updating the records; read them while no scan runs
+        with self.scan_lock:
+            totals = self.subtree_sizes(root)
+            size, files = totals.get(root, (0, 0))
+            
+            record = self.records.get(root)
+            folders = [
+                (totals[subdir][0], subdir) for subdir in (record.subdirs if record else [])
+                if totals.get(subdir, (0, 0))[0]
+            ]
+            big_files = heapq.nlargest(top, (
+                big_file for path in totals for big_file in self.records[path].big_files
+            ))
+        return {
+            'path': root,
+            'size': size,
+            'files': files,
+            'folders': heapq.nlargest(top, folders),
+            'big_files': big_files,
+            'listed': counts['listed'],
+            'cached': counts['cached'],
+            'seconds': round(time.monotonic() - started, 2),
+            'complete': not (cancel is not None and cancel.is_set())
+        }
+
+def handle_disk_usage_command(command, user_id=None):
+    """Answer "what's taking up space in <folder>" """
+    from file_handler import file_handler, current_search, SearchToken
+    match = DISK_USAGE_PATTERN.match(command.strip().rstrip('.!?'))
+    folder_name = (match and (match.group('folder') or match.group('folder2') or match.group('folder3'))) or 'home'
+    root = file_handler.resolve_folder(folder_name, user_id)
+    if not root or not os.path.isdir(root):
+        return f"I don't know a folder called '{folder_name}'."
+    
+    # Whole-tree scans take longer than a file search; they keep the GUI's
+    # cancellation but get their own time budget
+    _, search_token = current_search()
+    token = SearchToken(time_budget=config.get('scan_time_budget', 600), parent=search_token, own_budget=True)
+    try:
+        result = disk_usage.analyze(root, config.get('disk_usage_top', 10), token)
+    except Exception as e:
+        return f"Error measuring {root}: {e}"
+    if token is not None and token.cancelled:
+        return "Disk usage scan cancelled."
+    
+    lines = [f"📦 {result['path']} uses {format_size(result['size'])} in {result['files']:,} files"]
+    if not result['complete']:
+        lines[0] += " (stopped at the time limit; totals are partial)"
+    if result['folders']:
+        lines.append("\nBiggest folders:")
+        lines += [
+            f"{number}. {os.path.basename(path)} - {format_size(size)}"
+            for number, (size, path) in enumerate(result['folders'], 1)
+        ]
+    if result['big_files']:
+        lines.append("\nBiggest files:")
+        lines += [
+            f"{number}. {os.path.basename(path)} - {format_size(size)} ({os.path.dirname(path)})"
+            for number, (size, path) in enumerate(result['big_files'], 1)
+        ]
+    lines.append(
+        f"\nScanned in {result['seconds']}s ({result['listed']:,} folders read, {result['cached']:,} unchanged)"
+    )
+    return "\n".join(lines)
+
+# Global disk usage analyzer instance
+disk_usage = DiskUsageAnalyzer()
@@ -0,0 +1,239 @@
+"""
+Duplicate file finder
+Files are grouped by size first, then by a hash of their first and last
+blocks, and only files that still collide are hashed in full - so most bytes
+of a large folder are never read. Hashing runs on a thread pool: hashlib
+releases the GIL while it digests large buffers, so the threads use every
+core.
+"""
+import os
+import re
+import hashlib
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from config import config
+from ignore_rules import get_ignore_rules
+
+# Bytes hashed from each end of a file for the partial hash
+EDGE_BLOCK = 64 * 1024
+# Files up to this size are hashed whole straight away; the edges would be most of them
+EDGE_MIN_SIZE = 4 * EDGE_BLOCK
+# Read buffer for full hashes
+READ_BUFFER = 1024 * 1024
+
+DUPLICATE_PATTERN = re.compile(
+    r"(?:find|show|list|check for|look for) (?:the |any |all )?duplicates?(?: files?)?"
+    r"(?: (?:in|under|inside|on) (?:my |the )?(?P<folder>.+?)(?: folder| directory)?)?$",
+    re.IGNORECASE
+)
+
+def is_duplicate_command(command):
+    """Check whether a command asks for duplicate files"""
+    return bool(DUPLICATE_PATTERN.match(command.strip().rstrip('.!?')))
+
+def format_size(size):
+    """Human readable byte count"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+class DuplicateFinder:
+    def __init__(self, workers=None, min_size=1):
+        """
+        Initialize the finder
+        
+        Args:
+            workers: Hashing threads (defaults to config duplicate_finder_workers, then the CPU count)
+            min_size: Smallest file size considered, in bytes
+        """
+        self.workers = workers or config.get('duplicate_finder_workers') or os.cpu_count() or 4
+        self.min_size = min_size
+        self.local = threading.local()
+        self.stats = {}
+    
+    def collect_sizes(self, root, cancel=None):
+        """
+        Walk a folder, grouping regular files by size
+        
+        Hard links to one file are counted once, since they take no extra space.
+        """
+        rules = get_ignore_rules()
+        by_size = defaultdict(list)
+        seen_inodes = set()
+        stack = [root]
+        while stack:
+            if cancel is not None and cancel.is_set():
+                break
+            folder = stack.pop()
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.name[0] == '.':
+                            continue
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if not rules.ignored(entry.name, True):
+                                    stack.append(entry.path)
+                                continue
+                            if not entry.is_file(follow_symlinks=False):
+                                continue
+                            stat = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        self.stats['files'] += 1
+                        if stat.st_size < self.min_size:
+                            continue
+                        if stat.st_nlink > 1:
+                            inode = (stat.st_dev, stat.st_ino)
+                            if inode in seen_inodes:
+                                continue
+                            seen_inodes.add(inode)
+                        by_size[stat.st_size].append(entry.path)
+            except OSError:
+                continue  # Unreadable or vanished folder
+        return by_size
+    
+    def get_buffer(self):
+        """This thread's reusable read buffer"""
+        buffer = getattr(self.local, 'buffer', None)
+        if buffer is None:
+            buffer = self.local.buffer = bytearray(READ_BUFFER)
+        return buffer
+    
+    def partial_hash(self, path, size):
+        """Hash of the first and last EDGE_BLOCK bytes (only used above EDGE_MIN_SIZE)"""
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb', buffering=0) as f:
+            digest.update(f.read(EDGE_BLOCK))
+            f.seek(-EDGE_BLOCK, os.SEEK_END)
+            digest.update(f.read(EDGE_BLOCK))
+        return digest.digest(), 2 * EDGE_BLOCK
+    
+    def full_hash(self, path, size, cancel=None):
+        """Hash of the whole file, read in large chunks into a reused buffer"""
+        digest = hashlib.blake2b(digest_size=32)
+        buffer = self.get_buffer()
+        view = memoryview(buffer)
+        with open(path, 'rb', buffering=0) as f:
+            while True:
+                if cancel is not None and cancel.is_set():
+                    return None, 0
+                count = f.readinto(buffer)
+                if not count:
+                    break
+                digest.update(view[:count])
+        return digest.digest(), size
+    
+    def group_by(self, pool, groups, hasher, cancel=None, reread=0):
+        """
+        Split each group of paths by a hash computed on the pool, keeping only collisions
+        
+        Args:
+            reread: Bytes of each file an earlier stage already read; they count in
+                    bytes_read (actual I/O) but not again in bytes_unique
+        """
+        jobs = []
+        for size, paths in groups:
+            for path in paths:
+                jobs.append((size, path, pool.submit(hasher, path, size)))
+        
+        buckets = defaultdict(list)
+        for size, path, future in jobs:
+            if cancel is not None and cancel.is_set():
+                future.cancel()  # Queued hashes are dropped
+                continue
+            try:
+                digest, read = future.result()
+            except OSError:
+                continue  # Unreadable or vanished file
+            if digest is None:
+                continue  # Cancelled mid-file
+            self.stats['bytes_read'] += read
+            self.stats['bytes_unique'] += max(read - reread, 0)
+            buckets[(size, digest)].append(path)
+        return [(size, paths) for (size, _), paths in buckets.items() if len(paths) > 1]
+    
+    def find(self, root, cancel=None):
+        """
+        Find groups of identical files below a folder
+        
+        Args:
+            root: Folder to scan
+            cancel: Optional threading.Event or SearchToken that stops the scan
+        
+        Returns:
+            List of (size, [paths]) groups, the most wasted space first
+        """
+        # bytes_read is the actual I/O; bytes_unique counts each byte of a file once,
+        # so it never exceeds bytes_total
+        self.stats = {'files': 0, 'bytes_total': 0, 'bytes_read': 0, 'bytes_unique': 0}
+        by_size = self.collect_sizes(root, cancel)
+        candidates = [(size, paths) for size, paths in by_size.items() if len(paths) > 1]
+        self.stats['bytes_total'] = sum(size * len(paths) for size, paths in by_size.items())
+        if not candidates or (cancel is not None and cancel.is_set()):
+            return []
+        
+        def full_hash(path, size):
+            return self.full_hash(path, size, cancel)
+        
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            # Small files are hashed whole at once; reading their edges first would
+            # read most of them twice
+            small = [(size, paths) for size, paths in candidates if size <= EDGE_MIN_SIZE]
+            large = [(size, paths) for size, paths in candidates if size > EDGE_MIN_SIZE]
+            confirmed = self.group_by(pool, small, full_hash, cancel) if small else []
+            if large and not (cancel is not None and cancel.is_set()):
+                large = self.group_by(pool, large, self.partial_hash, cancel)
+            if large and not (cancel is not None and cancel.is_set()):
+                # The edges are read again
+                confirmed += self.group_by(pool, large, full_hash, cancel, reread=2 * EDGE_BLOCK)
+        
+        confirmed.sort(key=lambda group: group[0] * (len(group[1]) - 1), reverse=True)
+        return [(size, sorted(paths)) for size, paths in confirmed]
+
+def handle_duplicate_command(command, user_id=None):
+    """Answer "find duplicate files in <folder>" """
+    from file_handler import file_handler, current_search, SearchToken
+    match = DUPLICATE_PATTERN.match(command.strip().rstrip('.!?'))
+    folder_name = (match.group('folder') if match else None) or 'downloads'
+    root = file_handler.resolve_folder(folder_name, user_id)
+    if not root or not os.path.isdir(root):
+        return f"I don't know a folder called '{folder_name}'."
+    
+    # Whole-tree scans take longer than a file search; they keep the GUI's
+    # cancellation but get their own time budget
+    _, search_token = current_search()
+    token = SearchToken(time_budget=config.get('scan_time_budget', 600), parent=search_token, own_budget=True)
+    finder = DuplicateFinder()
+    try:
+        groups = finder.find(root, token)
+    except Exception as e:
+        return f"Error finding duplicates: {e}"
+    if token is not None and token.cancelled:
+        return "Duplicate search cancelled."
+    
+    summary = (
+        f"{finder.stats['files']} files checked, {format_size(finder.stats['bytes_unique'])} of "
+        f"{format_size(finder.stats['bytes_total'])} read"
+    )
+    if finder.stats['bytes_read'] != finder.stats['bytes_unique']:
+        summary += f" ({format_size(finder.stats['bytes_read'])} of disk reads)"
+    if token is not None and token.expired():
+        summary += "; stopped at the time limit, so some duplicates may be missing"
+    if not groups:
+        return f"No duplicate files in {root} ({summary})."
+    
+    wasted = sum(size * (len(paths) - 1) for size, paths in groups)
+    lines = [f"Found {len(groups)} sets of duplicate files in {root} - {format_size(wasted)} could be freed:"]
+    for number, (size, paths) in enumerate(groups[:10], 1):
+        lines.append(f"{number}. {os.path.basename(paths[0])} - {len(paths)} copies of {format_size(size)}")
+        lines.extend(f"   {path}" for path in paths[:5])
+        if len(paths) > 5:
+            lines.append(f"   ... and {len(paths) - 5} more")
+    if len(groups) > 10:
+        lines.append(f"... and {len(groups) - 10} more sets")
+    lines.append(f"({summary})")
+    return "\n".join(lines)
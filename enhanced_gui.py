@@ -5,6 +5,7 @@ import tkinter as tk
 from tkinter import messagebox, ttk
 import customtkinter as ctk
 from PIL import Image, ImageTk, ImageDraw
+import os
 import threading
 import queue
 import json
@@ -14,9 +15,13 @@ import random
 from datetime import datetime
 
 from database import db
+from history_writer import history_writer
+from history_search import parse_time_range, format_search_results
 from advanced_voice_handler import advanced_voice_handler
 from smart_command_processor import SmartCommandProcessor
 from config import config
+from file_handler import streaming_search, SearchToken, is_cancel_search_command
+from content_index import content_index
 
 # Set appearance mode and color theme
 ctk.set_appearance_mode("dark")
@@ -211,6 +216,7 @@ class EnhancedMainApplication:
         self.user_id = user_id
         self.command_processor = SmartCommandProcessor(user_id)
         self.is_listening = False
+        self.search_tokens = set()  # Tokens of the file searches in progress
         self.avatar = None
         
         # Create main window
@@ -578,6 +584,27 @@ class EnhancedMainApplication:
         """Setup history tab"""
         history_tab = self.right_notebook.add("📜 History")
         
+        # History search
+        search_frame = ctk.CTkFrame(history_tab)
+        search_frame.pack(fill="x", padx=10, pady=(10, 0))
+        
+        self.history_search_entry = ctk.CTkEntry(
+            search_frame,
+            placeholder_text="Search history (e.g. resume last week)",
+            height=30
+        )
+        self.history_search_entry.pack(side="left", fill="x", expand=True, padx=(0, 5))
+        self.history_search_entry.bind('<Return>', lambda e: self.search_history())
+        
+        search_history_btn = ctk.CTkButton(
+            search_frame,
+            text="🔎 Search",
+            command=self.search_history,
+            width=80,
+            height=30
+        )
+        search_history_btn.pack(side="right")
+        
         # History display
         self.history_text = ctk.CTkTextbox(
             history_tab,
@@ -673,8 +700,17 @@ class EnhancedMainApplication:
     
     def process_command(self, command):
         """Process command and show response"""
+        if is_cancel_search_command(command):
+            self.add_message("Assistant", self.cancel_searches(), "assistant")
+            return
+        
+        # File searches show what they have found so far and stop at the time budget
+        token = SearchToken(time_budget=config.get('file_search_time_budget', 30))
+        self.search_tokens.add(token)
         try:
-            response = self.command_processor.process_command(command)
+            # Background document indexing waits until the command has answered
+            with content_index.paused(), streaming_search(self.show_search_progress, token):
+                response = self.command_processor.process_command(command)
             
             # Handle multiple file results
             if isinstance(response, str) and "Say the number to open" in response:
@@ -688,6 +724,44 @@ class EnhancedMainApplication:
             error_msg = f"I encountered an error: {str(e)}"
             self.add_message("Assistant", error_msg, "assistant")
             advanced_voice_handler.speak(error_msg)
+        finally:
+            self.search_tokens.discard(token)
+            self.window.after(0, self.clear_search_progress)
+    
+    def cancel_searches(self):
+        """Stop the file searches in progress"""
+        if not self.search_tokens:
+            return "No search is running."
+        for token in list(self.search_tokens):
+            token.cancel()
+        return "Stopping the search."
+    
+    def show_search_progress(self, results):
+        """Show the matches found so far (called from the search thread)"""
+        lines = [f"🔎 Searching... {len(results)} found so far"]
+        lines += [f"   • {os.path.basename(path)} ({os.path.dirname(path)})" for path in results[:5]]
+        if len(results) > 5:
+            lines.append(f"   ... and {len(results) - 5} more")
+        text = "\n".join(lines) + "\n\n"
+        
+        def render():
+            # The progress block is tagged so it can be replaced in place
+            ranges = self.chat_display.tag_ranges("search_progress")
+            if ranges:
+                self.chat_display.delete(ranges[0], ranges[-1])
+                self.chat_display.insert(ranges[0], text, "search_progress")
+            else:
+                self.chat_display.insert("end", text, "search_progress")
+            if self.auto_scroll_var.get():
+                self.chat_display.see("end")
+        
+        self.window.after(0, render)
+    
+    def clear_search_progress(self):
+        """Remove the progress block once the search has answered"""
+        ranges = self.chat_display.tag_ranges("search_progress")
+        if ranges:
+            self.chat_display.delete(ranges[0], ranges[-1])
     
     def toggle_voice(self):
         """Toggle continuous voice listening with room-scale detection"""
@@ -753,7 +827,8 @@ class EnhancedMainApplication:
     def handle_voice_command(self, command):
         """Handle voice command from continuous listening"""
         self.window.after(0, lambda: self.add_message("You", command, "user"))
-        self.window.after(0, lambda: self.process_command(command))
+        # Off the UI thread, so searches can show progress while they run
+        threading.Thread(target=self.process_command, args=(command,), daemon=True).start()
     
     def execute_quick_action(self, command):
         """Execute quick action"""
@@ -814,6 +889,7 @@ class EnhancedMainApplication:
     def refresh_history(self):
         """Refresh chat history display"""
         try:
+            history_writer.flush()  # Include interactions still in the write queue
             history = db.get_chat_history(self.user_id, limit=20)
             
             history_text = "📜 RECENT CONVERSATIONS\n" + "="*40 + "\n\n"
@@ -832,6 +908,30 @@ class EnhancedMainApplication:
             self.history_text.delete("1.0", "end")
             self.history_text.insert("1.0", error_text)
     
+    def search_history(self):
+        """Search chat history and show ranked matches"""
+        query = self.history_search_entry.get().strip().lower()
+        if not query:
+            self.refresh_history()
+            return
+        
+        def run_search():
+            try:
+                since, until, label, terms = parse_time_range(query)
+                history_writer.flush()  # Include interactions still in the write queue
+                results = db.search_chat_history(self.user_id, terms, since=since, until=until, limit=20)
+                text = format_search_results(results, terms, label)
+            except Exception as e:
+                text = f"Error searching history: {str(e)}"
+            self.window.after(0, lambda: self.show_history_text(text))
+        
+        threading.Thread(target=run_search, daemon=True).start()
+    
+    def show_history_text(self, text):
+        """Replace the history tab contents"""
+        self.history_text.delete("1.0", "end")
+        self.history_text.insert("1.0", text)
+    
     def clear_history(self):
         """Clear chat history"""
         if messagebox.askyesno("Clear History", "Are you sure you want to clear the chat history?"):
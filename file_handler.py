@@ -2,13 +2,154 @@
 Smart file and folder handler
 """
 import os
-import glob
+import re
+import time
+import queue
+import fnmatch
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 
+from config import config
+from database import db
+from alias_matcher import AliasMatcher
+from file_index import file_index
+from content_index import content_index
+from media_index import media_index
+from search_cache import search_cache
+from ignore_rules import get_ignore_rules
+from archive_index import archive_index, ARCHIVE_SUFFIXES, make_virtual_path, split_virtual_path
+from frecency import frecency_store
+from root_stats import root_stats
+
+CANCEL_SEARCH_PATTERN = re.compile(r"(?:stop|cancel|abort) (?:the )?(?:file )?search(?:ing)?$")
+
+# Progress callback and token of the search running in each thread
+search_context = threading.local()
+
+class SearchToken:
+    """
+    Cancellation token for a running search
+    
+    A token is set when cancelled, once its time or entry budget runs out, or
+    when its parent is set. It has the is_set() of a threading.Event, so the
+    walkers accept either. With own_budget, the token only follows its
+    parent's cancellation, not the parent's budget.
+    """
+    def __init__(self, time_budget=None, parent=None, entry_budget=None, own_budget=False):
+        self.event = threading.Event()
+        self.deadline = time.monotonic() + time_budget if time_budget else None
+        self.parent = parent
+        self.entry_budget = entry_budget
+        self.own_budget = own_budget
+        self.entries = 0
+    
+    def cancel(self):
+        """Stop the search"""
+        self.event.set()
+    
+    set = cancel
+    
+    @property
+    def cancelled(self):
+        """Whether the search was stopped on purpose (not by its time budget)"""
+        return self.event.is_set() or bool(self.parent and getattr(self.parent, 'cancelled', False))
+    
+    def expired(self):
+        """Whether the time budget has run out"""
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return True
+        return bool(self.parent and not self.own_budget and getattr(self.parent, 'expired', lambda: False)())
+    
+    def add_entries(self, count):
+        """Count directory entries listed by the walk this token limits"""
+        self.entries += count
+    
+    def out_of_entries(self):
+        """Whether the entry budget has run out"""
+        return self.entry_budget is not None and self.entries >= self.entry_budget
+    
+    def is_set(self):
+        if self.parent and self.own_budget:
+            return self.event.is_set() or self.expired() or self.out_of_entries() or self.cancelled
+        return (self.event.is_set() or self.expired() or self.out_of_entries()
+                or bool(self.parent and self.parent.is_set()))
+
+@contextmanager
+def streaming_search(progress=None, token=None):
+    """
+    Stream the file searches made in this thread
+    
+    Args:
+        progress: Called with the best matches found so far while a search runs
+        token: SearchToken that cancels or time-limits the searches
+    """
+    previous = getattr(search_context, 'state', None)
+    search_context.state = (progress, token)
+    try:
+        yield token
+    finally:
+        search_context.state = previous
+
+def current_search():
+    """(progress, token) set by streaming_search for this thread"""
+    return getattr(search_context, 'state', None) or (None, None)
+
+def is_cancel_search_command(command):
+    """Check whether a command asks to stop the running search"""
+    return bool(CANCEL_SEARCH_PATTERN.match(command.lower().strip()))
+
 class FileHandler:
+    # Exact-name matches after which a multi-root search stops the other roots
+    ENOUGH_EXACT_MATCHES = 1
+    
     def __init__(self):
         self.system = os.name  # 'nt' for Windows, 'posix' for Unix/Linux/Mac
         self.drives = self.get_available_drives()
+        self.alias_matchers = {}  # user_id -> (aliases dict, compiled matcher)
+        
+        # Keep the filename index of the common folders (and optionally drives) fresh
+        if config.get('file_index_enabled', True):
+            file_index.start_background_refresh(
+                self.get_index_roots(), config.get('file_index_refresh_minutes', 30) * 60
+            )
+        
+        # Optional index of the words inside documents, built in the background
+        if config.get('content_index_enabled', False):
+            content_index.start_background_refresh(
+                self.get_content_roots(), config.get('file_index_refresh_minutes', 30) * 60
+            )
+        
+        # Tag catalog of the music and video folders, for "play songs by ..."
+        if config.get('media_index_enabled', True):
+            media_index.start_background_refresh(
+                self.get_media_roots(), config.get('file_index_refresh_minutes', 30) * 60
+            )
+    
+    def get_index_roots(self):
+        """Folders covered by the filename index"""
+        roots = list(config.get('common_folders', {}).values())
+        if config.get('file_index_drives', False):
+            roots.extend(self.drives)
+        return roots
+    
+    def get_content_roots(self):
+        """Folders covered by the document content index"""
+        roots = config.get('content_index_roots') or []
+        if not roots:
+            folders = config.get('common_folders', {})
+            roots = [folders[name] for name in ('documents', 'desktop', 'downloads') if name in folders]
+        return roots
+    
+    def get_media_roots(self):
+        """Folders covered by the media catalog"""
+        roots = config.get('media_index_roots') or []
+        if not roots:
+            folders = config.get('common_folders', {})
+            roots = [folders[name] for name in ('music', 'videos') if name in folders]
+        return roots
     
     def get_available_drives(self):
         """Get all available drives"""
@@ -26,13 +167,12 @@ class FileHandler:
         """Parse file/folder command and extract path components"""
         command = command.lower().strip()
         
-        # Get user's file aliases
-        aliases = {}  # In a real app, this would come from the database
-        
-        # Check for aliases first
-        for alias, path in aliases.items():
-            if alias in command:
-                return self.handle_alias_command(command, alias, path)
+        # Check for aliases first, matching all of them in one pass
+        matcher = self.get_alias_matcher(user_id)
+        match = matcher.longest_match(command) if matcher else None
+        if match:
+            alias, path = match
+            return self.handle_alias_command(command, alias, path)
         
         # Parse drive, folder, and file from command
         drive = None
@@ -62,6 +202,50 @@ class FileHandler:
         
         return self.find_and_open_file(drive, folder, filename, command)
     
+    def resolve_folder(self, name, user_id=None):
+        """
+        Map a spoken folder name to a path
+        
+        Tries the user's aliases, the common folders ("downloads"), drives
+        ("d drive"), "home", and finally a literal path.
+        """
+        name = name.strip().strip('"\'')
+        spoken = name.lower()
+        if user_id is not None:
+            aliases = db.get_file_aliases(user_id) or {}
+            if spoken in aliases:
+                return aliases[spoken]
+        
+        common_folders = config.get('common_folders', {})
+        for key in (spoken, spoken.rstrip('s'), spoken + 's'):
+            if key in common_folders:
+                return common_folders[key]
+        
+        if self.system == 'nt':
+            for drive in self.drives:
+                if spoken in (f"{drive[0].lower()} drive", f"{drive[0].lower()}:", drive.lower()):
+                    return drive
+        if spoken in ('home', 'home folder', 'my home'):
+            return str(Path.home())
+        
+        path = os.path.expanduser(name)
+        return path if os.path.isdir(path) else None
+    
+    def get_alias_matcher(self, user_id):
+        """Get the compiled alias matcher, rebuilding it only when the aliases change"""
+        aliases = db.get_file_aliases(user_id)
+        if not aliases:
+            return None
+        
+        # The database returns the same dict object until the aliases change
+        cached = self.alias_matchers.get(user_id)
+        if cached and cached[0] is aliases:
+            return cached[1]
+        
+        matcher = AliasMatcher(aliases)
+        self.alias_matchers[user_id] = (aliases, matcher)
+        return matcher
+    
     def handle_alias_command(self, command, alias, base_path):
         """Handle commands with aliases"""
         if not os.path.exists(base_path):
@@ -82,6 +266,12 @@ class FileHandler:
     def find_and_open_file(self, drive, folder, filename, original_command):
         """Find and open file/folder based on parsed components"""
         search_paths = []
+        progress, token = current_search()
+        if token is None:
+            # Searches outside the GUI get the same overall time limit
+            token = SearchToken(config.get('file_search_time_budget', 30))
+        pruned = []  # Ignored entries skipped by each folder walk
+        skipped = []  # (root, reason) for slow roots skipped or cut short
         
         # Build search paths
         if drive and folder:
@@ -105,111 +295,562 @@ class FileHandler:
             else:
                 # Search in all common folders
                 search_paths.extend(common_folders.values())
+        elif filename:
+            # Named file only: look in the common folders (and other drives) side by side,
+            # then in the rest of the home directory
+            search_paths = list(config.get('common_folders', {}).values())
+            if self.system == 'nt':
+                search_paths.extend(self.drives)
+            results = self.search_roots(search_paths, filename, progress, token, pruned=pruned, skipped=skipped)
+            if not results and not (token and token.is_set()):
+                results = self.search_roots([str(Path.home())], filename, progress, token, search_paths, pruned,
+                                            skipped)
+            return self.handle_search_results(results, original_command, token, sum(pruned), skipped)
         else:
             # Search in home directory
             search_paths = [str(Path.home())]
         
-        # Search for the file/folder
+        # Search for the file/folder, answering from the index where it covers the path
+        if filename:
+            results = self.search_roots(search_paths, filename, progress, token, pruned=pruned, skipped=skipped)
+        else:
+            results = self.search_keywords_in_roots(search_paths, original_command, progress, token, pruned, skipped)
+        
+        return self.handle_search_results(results, original_command, token, sum(pruned), skipped)
+    
+    def search_roots(self, roots, filename, progress=None, token=None, exclude=(), pruned=None, skipped=None):
+        """
+        Search several folders at once on a bounded thread pool
+        
+        Results are merged as they arrive, keeping the most specific kind of
+        match. Once a folder has finished with enough exact-name matches, the
+        remaining searches are cancelled, so latency follows the fastest folder
+        that has the file.
+        
+        Args:
+            roots: Folders to search
+            filename: Name to look for
+            progress: Optional callback called with the best matches so far
+            token: Optional SearchToken; the matches found so far are returned once it is set
+            exclude: Folders not to descend into
+            pruned: Optional list that receives the number of ignored entries of each walk
+            skipped: Optional list that receives (root, reason) for slow roots skipped or cut short
+        """
+        best_rank = None
         results = []
-        for search_path in search_paths:
-            if os.path.exists(search_path):
-                if filename:
-                    results.extend(self.search_for_file(search_path, filename))
+        exact_roots = set()
+        
+        def stream(root, cancel):
+            return self.stream_file_matches(root, filename, cancel, exclude, pruned)
+        
+        for batch in self.iter_search_roots(roots, stream, token, skipped=skipped):
+            changed = False
+            for root, rank, path in batch:
+                if rank is None:  # The root has finished
+                    if root in exact_roots and len(results) >= self.ENOUGH_EXACT_MATCHES:
+                        return results
+                    continue
+                if best_rank is None or rank < best_rank:
+                    best_rank, results, exact_roots = rank, [path], set()
+                elif rank == best_rank and path not in results:
+                    results.append(path)
                 else:
-                    # Search for any relevant files based on command
-                    results.extend(self.search_by_keywords(search_path, original_command))
+                    continue
+                if rank == 0:
+                    exact_roots.add(root)
+                changed = True
+            
+            if progress and changed:
+                progress(list(results))
         
-        return self.handle_search_results(results, original_command)
+        return results
     
-    def search_for_file(self, base_path, filename):
-        """Search for a specific file"""
+    def search_keywords_in_roots(self, roots, command, progress=None, token=None, pruned=None, skipped=None):
+        """Search several folders at once for names containing words of a command"""
         results = []
         
+        def stream(root, cancel):
+            return self.stream_keyword_matches(root, command, cancel, pruned)
+        
+        for batch in self.iter_search_roots(roots, stream, token, skipped=skipped):
+            found = [path for _, rank, path in batch if rank is not None]
+            results.extend(found)
+            if progress and found:
+                progress(list(results))
+        
+        return results
+    
+    def iter_search_roots(self, roots, stream, token=None, batch_interval=0.1, skipped=None):
+        """
+        Run a per-folder search over several folders at once, yielding matches as they come
+        
+        The first match is yielded as soon as it is found; later ones are
+        batched every batch_interval seconds so callers aren't flooded.
+        Closing the generator cancels the searches still running.
+        
+        Each folder gets its own time and entry budget, and its walk speed is
+        recorded in root_stats. Folders known to be slow are skipped while
+        there are others to search, and searched last otherwise.
+        
+        Args:
+            roots: Folders to search (missing ones are skipped)
+            stream: Function (root, cancel) returning an iterable of (rank, path)
+            token: Optional SearchToken that stops every folder's search
+            batch_interval: Seconds between batches
+            skipped: Optional list that receives (root, reason) for roots skipped or cut short
+        
+        Yields:
+            Lists of (root, rank, path); rank None marks a root whose search finished
+        """
+        roots = [root for root in dict.fromkeys(roots) if os.path.exists(root)]
+        if not roots:
+            return
+        
+        slow = {root: root_stats.slow_reason(root) for root in roots}
+        if any(slow.values()) and not all(slow.values()):
+            if skipped is not None:
+                skipped.extend((root, reason) for root, reason in slow.items() if reason)
+            roots = [root for root in roots if not slow[root]]
+        roots = root_stats.order(roots)
+        
+        time_budget = config.get('file_search_root_time_budget', 10)
+        entry_budget = config.get('file_search_root_entry_budget', 500000)
+        cancel = SearchToken(parent=token)
+        found = queue.Queue()
+        budgets = {}  # root -> (its SearchToken, start time) once its walk starts
+        finished = set()
+        
+        def run(root):
+            budget = SearchToken(time_budget, cancel, entry_budget)
+            started = time.monotonic()
+            budgets[root] = (budget, started)
+            try:
+                for rank, path in stream(root, budget):
+                    if budget.is_set():
+                        break
+                    found.put((root, rank, path))
+            except Exception as e:
+                print(f"Search error in {root}: {e}")
+            finally:
+                # Walks stopped by the search as a whole (or given up on) say nothing about this root
+                measured = not cancel.is_set() and root not in finished
+                timed_out = measured and budget.expired()
+                if skipped is not None and timed_out:
+                    skipped.append((root, f"stopped at its {time_budget}s time limit"))
+                elif skipped is not None and measured and budget.out_of_entries():
+                    skipped.append((root, f"stopped after {budget.entries:,} entries"))
+                found.put((root, None, None))
+                if measured and (budget.entries or timed_out):
+                    root_stats.record(root, budget.entries, time.monotonic() - started, timed_out)
+        
+        pool = ThreadPoolExecutor(max_workers=min(len(roots), config.get('file_search_workers', 4)))
         try:
-            # Direct search with glob
-            patterns = [
-                f"**/{filename}",
-                f"**/*{filename}*",
-                f"**/{filename}.*",
-                f"**/*{filename.split('.')[0]}*" if '.' in filename else f"**/*{filename}*"
-            ]
+            for root in roots:
+                pool.submit(run, root)
             
-            for pattern in patterns:
-                matches = glob.glob(os.path.join(base_path, pattern), recursive=True)
-                for match in matches:
-                    if os.path.isfile(match) or os.path.isdir(match):
-                        results.append(match)
+            batch = []
+            last_batch = 0.0
+            while len(finished) < len(roots) and not cancel.is_set():
+                try:
+                    item = found.get(timeout=batch_interval)
+                    if item[0] not in finished:
+                        batch.append(item)
+                        if item[1] is None:
+                            finished.add(item[0])
+                except queue.Empty:
+                    pass
+                
+                # A walk stuck in one listing (a share that stopped answering) never checks its
+                # budget, so it is given up on a second after its time limit
+                now = time.monotonic()
+                for root, (budget, started) in list(budgets.items()):
+                    if root not in finished and budget.deadline is not None and now > budget.deadline + 1:
+                        finished.add(root)
+                        batch.append((root, None, None))
+                        root_stats.record(root, budget.entries, now - started, True)
+                        if skipped is not None:
+                            skipped.append((root, f"not responding after {time_budget}s"))
                 
-                if results:  # Stop at first successful pattern
-                    break
+                if batch and (len(finished) == len(roots) or now - last_batch >= batch_interval):
+                    yield batch
+                    batch = []
+                    last_batch = time.monotonic()
+            
+            if batch:
+                yield batch
+        finally:
+            # Running walks notice the token between folders; queued ones never start
+            cancel.cancel()
+            pool.shutdown(wait=False, cancel_futures=True)
+    
+    def find_file_matches(self, base_path, filename, cancel=None):
+        """
+        Find a filename below a folder, from the index when it covers the folder
+        
+        Returns:
+            (rank, paths) - rank is the position of the matching pattern, 0 for an exact name
+        """
+        rank, results = self.index_file_matches(base_path, filename)
+        if results:
+            return rank, results
+        return self.rank_file_matches(base_path, filename, cancel)
+    
+    def index_file_matches(self, base_path, filename):
+        """
+        Look a filename up in the index, when the index can stand in for a walk
+        
+        Paths the ignore rules cover, or that lie in hidden folders, are dropped
+        like the walk would skip them. Only an exact name match is trusted
+        outright: a looser match may be shadowed by a better file created since
+        the last refresh, so it is used only while the folders holding it are
+        unchanged.
+        
+        Returns:
+            (rank, paths), or (None, []) when the folder has to be walked
+        """
+        try:
+            if not file_index.covers(base_path):
+                return None, []
+            rules = get_ignore_rules()
+            root_length = len(base_path.rstrip(os.sep)) + 1
+            
+            def keep(path):
+                parts = path[root_length:].split(os.sep)
+                for depth, name in enumerate(parts, 1):
+                    if name.startswith('.'):
+                        return False
+                    is_dir = depth < len(parts) or os.path.isdir(path)
+                    rel_path = '/'.join(parts[:depth]) if rules.needs_path else None
+                    if rules.ignored(name, is_dir, rel_path):
+                        return False
+                return True
+            
+            _, results = file_index.lookup_ranked(filename, under=base_path, keep=keep)
+            # Ranked by the same rule as walk results, so the two merge correctly
+            ranked = [(self.name_rank(filename, path), path) for path in results]
+            ranked = [(rank, path) for rank, path in ranked if rank is not None]
+            if ranked:
+                rank = min(rank for rank, _ in ranked)
+                results = [path for path_rank, path in ranked if path_rank == rank]
+                if rank == 0 or file_index.parents_current(results):
+                    return rank, results
+        except Exception as e:
+            print(f"File index error: {e}")
+        return None, []
+    
+    def stream_file_matches(self, base_path, filename, cancel=None, exclude=(), pruned=None):
+        """
+        Like find_file_matches, yielding (rank, path) while the walk goes on
+        
+        Each path is yielded once, with the rank name_rank gives it - the same
+        for index and walk results, so callers can merge them.
+        """
+        rank, results = self.index_file_matches(base_path, filename)
+        if results:
+            for path in results:
+                yield rank, path
+            return
+        
+        regexes, required = self.file_patterns(filename)
+        key = search_cache.make_key('name', base_path, filename, tuple(sorted(exclude)))
+        seen = set()
+        for _, path in self.cached_scan(key, base_path, regexes, required=required, cancel=cancel, exclude=exclude,
+                                        pruned=pruned):
+            rank = self.name_rank(filename, path)
+            if rank is not None and path not in seen:
+                seen.add(path)
+                yield rank, path
+    
+    def stream_keyword_matches(self, base_path, command, cancel=None, pruned=None):
+        """Like search_by_keywords, yielding (0, path) while the walk goes on"""
+        keywords = sorted({re.escape(keyword.lower()) for keyword in command.split()})
+        if keywords:
+            key = search_cache.make_key('keywords', base_path, " ".join(keywords))
+            yield from self.cached_scan(key, base_path, [f"(?s:.*(?:{'|'.join(keywords)}))"], limit=20, cancel=cancel, pruned=pruned)
+    
+    def cached_scan(self, key, base_path, patterns, limit=50, required=None, cancel=None, exclude=(), pruned=None):
+        """
+        iter_scan through the search cache
+        
+        A walk is only cached when it ran to completion, not when it was
+        cancelled or its consumer stopped reading.
+        """
+        max_depth = config.get('file_search_depth', 5)
+        archives = config.get('archive_search_enabled', True)
+        key += (max_depth, limit, get_ignore_rules().patterns, archives)
+        cached = search_cache.get(key)
+        if cached is not None:
+            matches, ignored = cached
+            if pruned is not None:
+                pruned.append(ignored)
+            yield from matches
+            return
+        
+        matches = []
+        folders = []
+        ignored = []
+        try:
+            for match in self.iter_scan(base_path, patterns, max_depth, limit, required, cancel, exclude, folders, ignored,
+                                        archives):
+                matches.append(match)
+                yield match
+        finally:
+            if pruned is not None:
+                pruned.extend(ignored)
+        if cancel is None or not cancel.is_set():
+            search_cache.put(key, (matches, sum(ignored)), folders)
+    
+    def scan_tree(self, base_path, patterns, max_depth=None, limit=50, required=None, cancel=None, exclude=()):
+        """
+        Walk a folder once, matching every entry name against several patterns
+        
+        Args:
+            base_path: Folder to search
+            patterns: Regular expressions matched against lowercase names, in priority order
+            max_depth: Folder levels to descend (defaults to config file_search_depth)
+            limit: Stop once the first pattern has this many results; the others keep at most this many
+            required: Lowercase text every match contains, checked before the patterns
+            cancel: Optional threading.Event or SearchToken that stops the walk early
+            exclude: Folders not to descend into (e.g. ones already searched)
+        
+        Returns:
+            List of matching paths for each pattern
+        """
+        results = [[] for _ in patterns]
+        for rank, path in self.iter_scan(base_path, patterns, max_depth, limit, required, cancel, exclude):
+            results[rank].append(path)
+        return results
+    
+    def iter_scan(self, base_path, patterns, max_depth=None, limit=50, required=None, cancel=None, exclude=(),
+                  visited=None, pruned=None, archives=None):
+        """
+        Generator behind scan_tree, yielding (pattern index, path) as matches are found
+        
+        Matches and folders covered by the ignore rules (see ignore_rules.py)
+        are skipped, so ignored folders are never listed.
+        
+        Args:
+            visited: Optional list that receives (path, mtime_ns) for every folder and archive listed
+            pruned: Optional list that receives the number of ignored folders and matches when the walk ends
+            archives: Also match the members of zip/tar archives, as virtual paths
+                      (defaults to config archive_search_enabled)
+        """
+        if max_depth is None:
+            max_depth = config.get('file_search_depth', 5)
+        if archives is None:
+            archives = config.get('archive_search_enabled', True)
+        count_entries = getattr(cancel, 'add_entries', None)
+        matchers = [re.compile(pattern).match for pattern in patterns]
+        # One combined regex rejects non-matching names in a single call
+        any_match = re.compile("|".join(f"(?:{pattern})" for pattern in patterns)).match
+        counts = [0] * len(patterns)
+        exclude = {os.path.normcase(os.path.abspath(folder)) for folder in exclude}
+        rules = get_ignore_rules()
+        candidate = rules.candidate
+        check_paths = rules.needs_path
+        root_length = len(base_path.rstrip(os.sep)) + 1
+        ignored = 0
+        
+        def match(name, path):
+            for rank, matches in enumerate(matchers):
+                if counts[rank] < limit and matches(name):
+                    counts[rank] += 1
+                    yield rank, path
+        
+        def is_ignored(entry):
+            # Only folders and matches are checked, so plain files cost nothing
+            if (candidate and candidate(entry.name)) or check_paths:
+                rel_path = entry.path[root_length:].replace(os.sep, '/') if check_paths else None
+                return rules.ignored(entry.name, entry.is_dir(follow_symlinks=False), rel_path)
+            return False
+        
+        # Breadth first, so the shallowest matches are found before an early stop
+        pending = deque([(base_path, 1)])
+        try:
+            while pending:
+                if cancel is not None and cancel.is_set():
+                    return
+                folder, depth = pending.popleft()
+                descend = depth < max_depth
+                try:
+                    if visited is not None:
+                        # Taken before listing, so a change made meanwhile invalidates the cache entry
+                        visited.append((folder, os.stat(folder).st_mtime_ns))
+                    listed = 0
+                    with os.scandir(folder) as entries:
+                        for entry in entries:
+                            listed += 1
+                            name = entry.name
+                            if name[0] == '.':
+                                continue  # Hidden entries, which glob skipped as well
+                            
+                            name = name.lower()
+                            if (required is None or required in name) and any_match(name):
+                                if is_ignored(entry):
+                                    ignored += 1
+                                    continue
+                                yield from match(name, entry.path)
+                                if counts[0] >= limit:
+                                    return
+                            
+                            # Archive members, listed from the archive's directory or headers
+                            if archives and name.endswith(ARCHIVE_SUFFIXES) and entry.is_file(follow_symlinks=False):
+                                if is_ignored(entry):
+                                    ignored += 1
+                                    continue
+                                stat = entry.stat()
+                                members = archive_index.members(entry.path, stat)
+                                if visited is not None:
+                                    # An archive not listed yet keeps the walk from being reused from the cache
+                                    visited.append((entry.path, stat.st_mtime_ns if members is not None else None))
+                                for member in members or ():
+                                    member_name = member.rsplit('/', 1)[-1].lower()
+                                    if (required is None or required in member_name) and any_match(member_name):
+                                        yield from match(member_name, make_virtual_path(entry.path, member))
+                                        if counts[0] >= limit:
+                                            return
+                                continue
+                            
+                            # DirEntry caches the type from the directory listing, so no extra stat
+                            if descend and entry.is_dir(follow_symlinks=False):
+                                if is_ignored(entry):
+                                    ignored += 1  # Never listed
+                                elif not exclude or os.path.normcase(entry.path) not in exclude:
+                                    pending.append((entry.path, depth + 1))
+                    if count_entries:
+                        count_entries(listed)  # Charged to the token's entry budget
+                except OSError:
+                    continue  # Unreadable or vanished folder
+        finally:
+            if pruned is not None:
+                pruned.append(ignored)
+    
+    def search_for_file(self, base_path, filename, cancel=None):
+        """Search for a specific file"""
+        return self.rank_file_matches(base_path, filename, cancel)[1]
+    
+    def rank_file_matches(self, base_path, filename, cancel=None, exclude=()):
+        """Walk a folder for a filename, returning (rank, paths) like find_file_matches"""
+        try:
+            regexes, required = self.file_patterns(filename)
+            for rank, results in enumerate(self.scan_tree(base_path, regexes, required=required, cancel=cancel, exclude=exclude)):
+                if results:  # Results of the most specific pattern that matched
+                    return rank, results
         
         except Exception as e:
             print(f"Search error: {e}")
         
-        return list(set(results))  # Remove duplicates
+        return None, []
+    
+    def file_patterns(self, filename):
+        """
+        Name regexes for a filename, from most to least specific
+        
+        The order is the file index's too: exact name, "name.*", names
+        containing the name, names containing its stem.
+        
+        Returns:
+            (regexes, required) - required is the lowercase stem every match contains
+        """
+        patterns = [
+            filename,
+            f"{filename}.*",
+            f"*{filename}*",
+            f"*{filename.split('.')[0]}*" if '.' in filename else f"*{filename}*"
+        ]
+        
+        # Every pattern contains the name's stem, a much cheaper test than the regexes
+        required = filename.split('.')[0].lower()
+        return [fnmatch.translate(pattern.lower()) for pattern in patterns], required
+    
+    def name_rank(self, filename, path):
+        """
+        Rank of a found path for a filename: the first of file_patterns its name matches
+        
+        Index lookups and folder walks both rank their results with this, so
+        their ranks mean the same thing when results are merged.
+        
+        Returns:
+            0 for an exact name, higher for looser matches, None if it doesn't match
+        """
+        name = os.path.basename(path).lower()
+        for rank, regex in enumerate(self.file_patterns(filename)[0]):
+            if re.match(regex, name):
+                return rank
+        return None
     
     def search_by_keywords(self, base_path, command):
         """Search files by keywords in command"""
-        results = []
-        keywords = command.split()
+        keywords = [re.escape(keyword.lower()) for keyword in command.split()]
+        if not keywords:
+            return []
         
         try:
-            for root, dirs, files in os.walk(base_path):
-                # Limit search depth
-                depth = len(os.path.relpath(root, base_path).split(os.sep))
-                if depth > 3:  # Limit depth to prevent deep searches
-                    continue
-                
-                # Search in filenames and folder names
-                all_items = files + dirs
-                for item in all_items:
-                    item_lower = item.lower()
-                    if any(keyword.lower() in item_lower for keyword in keywords):
-                        full_path = os.path.join(root, item)
-                        results.append(full_path)
-                        
-                        if len(results) >= 20:  # Limit results
-                            break
-                
-                if len(results) >= 20:
-                    break
+            return self.scan_tree(base_path, [f"(?s:.*(?:{'|'.join(keywords)}))"], limit=20)[0]
         
         except Exception as e:
             print(f"Keyword search error: {e}")
         
-        return results
+        return []
     
     def search_in_directory(self, directory, search_term):
         """Search for files in a specific directory"""
         if not os.path.exists(directory):
             return f"Directory not found: {directory}"
         
-        results = self.search_for_file(directory, search_term)
-        if not results:
-            results = self.search_by_keywords(directory, search_term)
+        progress, token = current_search()
+        if token is None:
+            token = SearchToken(config.get('file_search_time_budget', 30))
+        pruned = []
+        skipped = []
+        results = self.search_roots([directory], search_term, progress, token, pruned=pruned, skipped=skipped)
+        if not results and not (token and token.is_set()):
+            results = self.search_keywords_in_roots([directory], search_term, progress, token, pruned, skipped)
         
-        return self.handle_search_results(results, search_term)
+        return self.handle_search_results(results, search_term, token, sum(pruned), skipped)
     
-    def handle_search_results(self, results, original_command):
+    def handle_search_results(self, results, original_command, token=None, pruned=0, skipped=()):
         """Handle search results - open if single result, ask user if multiple"""
+        if token and token.cancelled:
+            return f"Search cancelled: {original_command}"
+        # Slow folders that were left out or cut short
+        note = "".join(f"\n(Skipped {root}: {reason})" for root, reason in skipped)
         if not results:
-            return f"No files found for: {original_command}"
+            if token and token.expired():
+                return f"No files found for: {original_command} (search stopped at the time limit){note}"
+            if pruned:
+                return f"No files found for: {original_command} ({pruned} ignored folders and files were skipped){note}"
+            return f"No files found for: {original_command}{note}"
         
         if len(results) == 1:
-            return self.open_path(results[0])
+            return self.open_path(results[0]) + note
+        
+        # Open the file the user keeps choosing without asking again
+        dominant = frecency_store.dominant(results)
+        if dominant:
+            return self.open_path(dominant) + note
         
-        # Multiple results - return list for user to choose
+        # Multiple results - return list for user to choose, most frecent first
         return {
             'type': 'multiple_results',
-            'message': f"Found {len(results)} matches for '{original_command}':",
-            'results': results[:10]  # Limit to 10 results
+            'message': f"Found {len(results)} matches for '{original_command}':{note}",
+            'results': frecency_store.rank(results)[:10]  # Limit to 10 results
         }
     
     def open_path(self, path):
         """Open file or folder using system default application"""
         try:
             if not os.path.exists(path):
-                return f"Path not found: {path}"
+                # Members of archives are extracted when first opened
+                extracted = archive_index.extract(path)
+                if not extracted:
+                    return f"Path not found: {path}"
+                frecency_store.record(path)
+                archive_path, _ = split_virtual_path(path)
+                return f"Opened: {os.path.basename(extracted)} (extracted from {os.path.basename(archive_path)})"
+            
+            # Opens feed the frecency ranking of later search results
+            frecency_store.record(path)
             
             # In a real app, this would open the file/folder
             # For this simulation, we'll just return a success message
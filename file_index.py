@@ -0,0 +1,434 @@
+"""
+Persistent filename index for file searches
+Keeps path, name, size, mtime and type of everything under the indexed roots
+in SQLite, so "find X" answers exact, prefix and substring queries without
+walking the disk. Refreshes are incremental: directories whose mtime hasn't
+changed are not listed again.
+"""
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from config import config
+from trigram_index import TrigramIndex
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    parent TEXT NOT NULL,
+    name TEXT NOT NULL,
+    name_lower TEXT NOT NULL,
+    size INTEGER,
+    mtime REAL,
+    type TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_files_name_lower ON files (name_lower);
+CREATE INDEX IF NOT EXISTS idx_files_parent ON files (parent);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER
+);
+CREATE TABLE IF NOT EXISTS roots (
+    path TEXT PRIMARY KEY,
+    refreshed_at TEXT
+);
+CREATE TABLE IF NOT EXISTS archives (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER,
+    size INTEGER,
+    members TEXT NOT NULL
+);
+"""
+
+# Trigram index for substring queries, kept in sync by triggers. Upserts only
+# touch size/mtime, so no update trigger is needed
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5 (
+    name_lower, content='files', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS files_fts_insert AFTER INSERT ON files BEGIN
+    INSERT INTO files_fts (rowid, name_lower) VALUES (new.id, new.name_lower);
+END;
+CREATE TRIGGER IF NOT EXISTS files_fts_delete AFTER DELETE ON files BEGIN
+    INSERT INTO files_fts (files_fts, rowid, name_lower) VALUES ('delete', old.id, old.name_lower);
+END;
+"""
+
+def path_range(path):
+    """Bounds of the paths strictly below a directory, for index range scans"""
+    prefix = path.rstrip(os.sep) + os.sep
+    return prefix, prefix + '\U0010ffff'
+
+class FileIndex:
+    def __init__(self, db_file=None):
+        """
+        Initialize the file index
+        
+        Args:
+            db_file: SQLite file holding the index
+        """
+        db_dir = Path.home() / ".ai_assistant" / "database"
+        db_dir.mkdir(parents=True, exist_ok=True)
+        self.db_file = Path(db_file) if db_file else db_dir / "file_index.db"
+        self.local = threading.local()
+        self.has_fts = False
+        self.refresh_lock = threading.Lock()
+        self.refresh_thread = None
+        self.stop_event = threading.Event()
+        
+        # In-memory trigram index of the distinct names, for "did you mean" suggestions
+        self.name_index = None
+        self.name_index_stale = True
+        self.name_index_lock = threading.Lock()
+        
+        self.init_database()
+    
+    def get_connection(self):
+        """Get this thread's connection (sqlite3 connections are not shareable)"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_file), timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+    
+    def init_database(self):
+        """Create tables and indexes"""
+        conn = self.get_connection()
+        with conn:
+            conn.executescript(SCHEMA)
+        
+        # The trigram tokenizer needs SQLite 3.34+; substring queries scan otherwise
+        try:
+            with conn:
+                conn.executescript(FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            self.has_fts = False
+    
+    def refresh(self, roots):
+        """
+        Bring the index up to date for the given root folders
+        
+        Returns:
+            Number of directories that were (re)listed
+        """
+        with self.refresh_lock:
+            listed = 0
+            for root in roots:
+                root = os.path.abspath(root)
+                if not os.path.isdir(root):
+                    continue
+                changed = self.refresh_root(root)
+                listed += changed
+                if changed:
+                    self.name_index_stale = True
+                if self.stop_event.is_set():
+                    break  # Interrupted; the root doesn't count as indexed
+                
+                conn = self.get_connection()
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO roots (path, refreshed_at) VALUES (?, ?)",
+                        (root, datetime.now().isoformat())
+                    )
+            return listed
+    
+    def refresh_root(self, root):
+        """Walk a root, re-listing only directories whose mtime changed"""
+        conn = self.get_connection()
+        stack = [root]
+        listed = 0
+        
+        while stack and not self.stop_event.is_set():
+            directory = stack.pop()
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+            except OSError:
+                with conn:
+                    self.remove_subtree(directory)
+                continue
+            
+            row = conn.execute("SELECT mtime_ns FROM dirs WHERE path = ?", (directory,)).fetchone()
+            if row and row['mtime_ns'] == mtime_ns:
+                # Unchanged listing: descend using the subfolders we already know about
+                stack.extend(
+                    child['path'] for child in conn.execute(
+                        "SELECT path FROM files WHERE parent = ? AND type = 'dir'", (directory,)
+                    )
+                )
+                continue
+            
+            stack.extend(self.index_directory(directory, mtime_ns))
+            listed += 1
+        
+        return listed
+    
+    def index_directory(self, directory, mtime_ns):
+        """List one directory into the index and return its subfolders"""
+        entries = []
+        subdirs = []
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        stat = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    entries.append((
+                        entry.path, directory, entry.name, entry.name.lower(),
+                        0 if is_dir else stat.st_size, stat.st_mtime, 'dir' if is_dir else 'file'
+                    ))
+                    if is_dir:
+                        subdirs.append(entry.path)
+        except OSError:
+            return []  # Unreadable folder; keep what we had
+        
+        conn = self.get_connection()
+        current = {entry[0] for entry in entries}
+        removed = [
+            row['path'] for row in conn.execute("SELECT path FROM files WHERE parent = ?", (directory,))
+            if row['path'] not in current
+        ]
+        
+        with conn:
+            for path in removed:
+                self.remove_subtree(path)
+            conn.executemany(
+                "INSERT INTO files (path, parent, name, name_lower, size, mtime, type) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (path) DO UPDATE SET size = excluded.size, mtime = excluded.mtime, type = excluded.type",
+                entries
+            )
+            conn.execute("INSERT OR REPLACE INTO dirs (path, mtime_ns) VALUES (?, ?)", (directory, mtime_ns))
+        
+        return subdirs
+    
+    def remove_subtree(self, path):
+        """Drop a path and everything below it (inside the caller's transaction)"""
+        conn = self.get_connection()
+        low, high = path_range(path)
+        conn.execute("DELETE FROM files WHERE path = ? OR (path >= ? AND path < ?)", (path, low, high))
+        conn.execute("DELETE FROM dirs WHERE path = ? OR (path >= ? AND path < ?)", (path, low, high))
+        conn.execute("DELETE FROM archives WHERE path = ? OR (path >= ? AND path < ?)", (path, low, high))
+    
+    def covers(self, path):
+        """Check whether a path lies inside a root that has been fully indexed"""
+        path = os.path.abspath(path)
+        for row in self.get_connection().execute("SELECT path FROM roots WHERE refreshed_at IS NOT NULL"):
+            root = row['path']
+            if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+                return True
+        return False
+    
+    def search(self, query, mode='substring', under=None, limit=100):
+        """
+        Query the index by name
+        
+        Args:
+            query: Name or name fragment (case-insensitive)
+            mode: 'exact', 'prefix' or 'substring'
+            under: Only return paths below this folder
+            limit: Maximum number of results
+        
+        Returns:
+            List of dicts with path, name, size, mtime and type
+        """
+        query = query.lower()
+        conditions = []
+        params = []
+        source = "files"
+        
+        if mode == 'exact':
+            conditions.append("files.name_lower = ?")
+            params.append(query)
+        elif mode == 'prefix':
+            conditions.append("files.name_lower >= ? AND files.name_lower < ?")
+            params += [query, query + '\U0010ffff']
+        elif self.has_fts and len(query) >= 3:
+            source = "files_fts JOIN files ON files.id = files_fts.rowid"
+            conditions.append("files_fts MATCH ?")
+            params.append('"' + query.replace('"', '""') + '"')
+        else:
+            conditions.append("instr(files.name_lower, ?) > 0")
+            params.append(query)
+        
+        if under:
+            low, high = path_range(os.path.abspath(under))
+            conditions.append("files.path >= ? AND files.path < ?")
+            params += [low, high]
+        
+        rows = self.get_connection().execute(
+            "SELECT files.path, files.name, files.size, files.mtime, files.type "
+            f"FROM {source} WHERE {' AND '.join(conditions)} LIMIT ?",
+            params + [limit]
+        ).fetchall()
+        return [dict(row) for row in rows]
+    
+    def lookup(self, filename, under=None, limit=100):
+        """
+        Find paths for a filename, from the most to the least specific match
+        
+        Tries the exact name, then "name.*", then names containing it, then
+        names containing its stem - the same order as the old glob patterns.
+        Paths that no longer exist are dropped.
+        """
+        return self.lookup_ranked(filename, under, limit)[1]
+    
+    def lookup_ranked(self, filename, under=None, limit=100, keep=None):
+        """
+        Like lookup, returning (rank, paths) where rank 0 means an exact name match
+        
+        Args:
+            keep: Optional predicate; paths it rejects are dropped before a rank is chosen
+        """
+        stem = filename.split('.')[0] if '.' in filename else filename
+        queries = [(filename, 'exact'), (filename + '.', 'prefix'), (filename, 'substring'), (stem, 'substring')]
+        
+        for rank, (query, mode) in enumerate(queries):
+            if not query:
+                continue
+            results = [
+                row['path'] for row in self.search(query, mode, under, limit)
+                if (keep is None or keep(row['path'])) and os.path.exists(row['path'])
+            ]
+            if results:
+                return rank, results
+        return None, []
+    
+    def parents_current(self, paths):
+        """Check that the folders holding these paths haven't changed since they were indexed"""
+        conn = self.get_connection()
+        for parent in {os.path.dirname(path) for path in paths}:
+            row = conn.execute("SELECT mtime_ns FROM dirs WHERE path = ?", (parent,)).fetchone()
+            try:
+                if row is None or os.stat(parent).st_mtime_ns != row['mtime_ns']:
+                    return False
+            except OSError:
+                return False
+        return True
+    
+    def archive_members(self, path, mtime_ns, size):
+        """Stored member listing of an archive, or None if it changed or was never listed"""
+        row = self.get_connection().execute(
+            "SELECT members FROM archives WHERE path = ? AND mtime_ns = ? AND size = ?", (path, mtime_ns, size)
+        ).fetchone()
+        if row is None:
+            return None
+        return row['members'].split("\n") if row['members'] else []
+    
+    def store_archive_members(self, path, mtime_ns, size, members):
+        """Keep an archive's member listing across restarts"""
+        conn = self.get_connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO archives (path, mtime_ns, size, members) VALUES (?, ?, ?, ?)",
+                (path, mtime_ns, size, "\n".join(members))
+            )
+    
+    def list_archives(self, roots):
+        """
+        List the compressed tars under the roots that have no stored listing
+        
+        Their headers can only be reached by decompressing them, which file
+        searches don't do, so their members become searchable once this has run.
+        """
+        from archive_index import archive_index, COMPRESSED_TAR_SUFFIXES
+        conn = self.get_connection()
+        for root in roots:
+            low, high = path_range(os.path.abspath(root))
+            conditions = " OR ".join("name_lower LIKE ?" for _ in COMPRESSED_TAR_SUFFIXES)
+            rows = conn.execute(
+                f"SELECT path FROM files WHERE type = 'file' AND path >= ? AND path < ? AND ({conditions})",
+                [low, high] + [f"%{suffix}" for suffix in COMPRESSED_TAR_SUFFIXES]
+            ).fetchall()
+            for row in rows:
+                if self.stop_event.is_set():
+                    return
+                archive_index.members(row['path'], list_compressed=True)
+    
+    def build_name_index(self):
+        """(Re)build the trigram index over the distinct indexed names"""
+        with self.name_index_lock:
+            if self.name_index is not None and not self.name_index_stale:
+                return self.name_index
+            self.name_index_stale = False
+            rows = self.get_connection().execute("SELECT DISTINCT name FROM files")
+            self.name_index = TrigramIndex(row['name'] for row in rows)
+            return self.name_index
+    
+    def suggest(self, query, limit=5):
+        """
+        Real files whose names are close to a misheard or misspelled query
+        
+        The trigram index is built by the background refresh; building it here
+        would take seconds on a large index, so there are no suggestions until
+        it is ready.
+        
+        Returns:
+            List of dicts with name, path and score, best first
+        """
+        # A stale index still gives good suggestions; the background refresh rebuilds it
+        name_index = self.name_index
+        if name_index is None:
+            return []
+        suggestions = []
+        for score, name in name_index.search(query, limit * 2):
+            for row in self.get_connection().execute("SELECT path FROM files WHERE name_lower = ? AND name = ? LIMIT 3", (name.lower(), name)):
+                if os.path.exists(row['path']):
+                    suggestions.append({'name': name, 'path': row['path'], 'score': score})
+                    break
+            if len(suggestions) >= limit:
+                break
+        return suggestions
+    
+    def get_stats(self):
+        """Get index size information"""
+        conn = self.get_connection()
+        return {
+            'files': conn.execute("SELECT COUNT(*) FROM files WHERE type = 'file'").fetchone()[0],
+            'dirs': conn.execute("SELECT COUNT(*) FROM files WHERE type = 'dir'").fetchone()[0],
+            'roots': [dict(row) for row in conn.execute("SELECT path, refreshed_at FROM roots")]
+        }
+    
+    def start_background_refresh(self, roots, interval=1800):
+        """
+        Keep the index fresh from a daemon thread
+        
+        Args:
+            roots: Folders to index
+            interval: Seconds between incremental refreshes
+        """
+        if self.refresh_thread and self.refresh_thread.is_alive():
+            return
+        
+        def refresh_loop():
+            while not self.stop_event.is_set():
+                try:
+                    # Suggestions work from the names already indexed while the refresh runs
+                    if self.name_index is None:
+                        self.build_name_index()
+                    self.refresh(roots)
+                    if self.name_index_stale:
+                        self.build_name_index()
+                    if config.get('archive_search_enabled', True):
+                        self.list_archives(roots)
+                except Exception as e:
+                    print(f"File index refresh error: {e}")
+                self.stop_event.wait(interval)
+        
+        self.refresh_thread = threading.Thread(target=refresh_loop, daemon=True)
+        self.refresh_thread.start()
+    
+    def stop(self):
+        """Stop the background refresh"""
+        self.stop_event.set()
+
+# Global file index instance
+file_index = FileIndex()
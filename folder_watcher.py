@@ -0,0 +1,404 @@
+"""
+Folder watcher for Athena AI Assistant
+Reacts to files landing in watched folders ("tell me when a file lands in
+Downloads"). Uses inotify on Linux and a cheap directory-mtime poll elsewhere.
+Bursts of events are coalesced, so unpacking an archive of thousands of files
+produces one notification instead of thousands.
+"""
+import os
+import re
+import time
+import queue
+import select
+import struct
+import ctypes
+import ctypes.util
+import fnmatch
+import threading
+
+# inotify event masks (see <sys/inotify.h>)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0x00080000
+
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+# Files still being downloaded or written; the finished file arrives under its real name
+PARTIAL_SUFFIXES = ('.crdownload', '.part', '.partial', '.download', '.opdownload', '.tmp', '.temp', '.!qb')
+
+# Phrases that set up a watch, e.g. "tell me when a pdf lands in downloads", optionally
+# with a command to run as well ("... and organize downloads")
+WATCH_PATTERN = re.compile(
+    r"(?:tell|notify|alert|let) me (?:know )?when (?:a |an |any )?(?:new )?(?P<kind>[\w.]+ )?"
+    r"(?:file |files )?(?:lands|land|arrives|arrive|appears|appear|shows up|is added|gets added|comes) "
+    r"(?:in|into|to) (?:my |the )?(?P<folder>.+?)(?: folder)?(?:,? (?:and|then) (?P<action>.+))?$"
+)
+UNWATCH_PATTERN = re.compile(r"stop (?:watching|monitoring) (?:my |the )?(?P<folder>.+?)(?: folder)?$")
+
+class InotifyBackend:
+    """Blocks on an inotify descriptor, so an idle watcher costs no CPU"""
+    
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    # Created files remembered until they are closed
+    MAX_PENDING = 10000
+    
+    def __init__(self, emit):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.libc = libc
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.emit = emit
+        self.watches = {}  # wd -> folder
+        self.created = {}  # Paths created and not yet closed after writing (insertion ordered)
+    
+    def add(self, folder):
+        """Start receiving events for a folder"""
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(folder), self.MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"Cannot watch {folder}")
+        self.watches[wd] = folder
+    
+    def remove(self, folder):
+        """Stop receiving events for a folder"""
+        for wd, watched in list(self.watches.items()):
+            if watched == folder:
+                self.libc.inotify_rm_watch(self.fd, wd)
+                self.watches.pop(wd, None)
+    
+    def run(self, stop_event):
+        """Read events until stopped, handing each read's events on as one batch"""
+        while not stop_event.is_set():
+            # The timeout only bounds how long stop() takes to be noticed
+            readable, _, _ = select.select([self.fd], [], [], 1.0)
+            if not readable:
+                continue
+            data = os.read(self.fd, 64 * 1024)
+            
+            batch = []
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                
+                if mask & IN_Q_OVERFLOW:
+                    batch.extend((folder, None) for folder in set(self.watches.values()))
+                    continue
+                if mask & IN_IGNORED:
+                    self.watches.pop(wd, None)
+                    continue
+                folder = self.watches.get(wd)
+                if not folder:
+                    continue
+                path = os.path.join(folder, os.fsdecode(name))
+                if mask & IN_CREATE and not mask & IN_ISDIR:
+                    # New files are reported once written (IN_CLOSE_WRITE)
+                    self.created[path] = None
+                    if len(self.created) > self.MAX_PENDING:
+                        self.created.pop(next(iter(self.created)))
+                    continue
+                if mask & IN_CLOSE_WRITE:
+                    if path not in self.created:
+                        continue  # An existing file was edited in place
+                    del self.created[path]
+                batch.append((folder, path))
+            
+            if batch:
+                self.emit(batch)
+    
+    def close(self):
+        """Release the inotify descriptor"""
+        os.close(self.fd)
+
+class PollBackend:
+    """Checks each folder's mtime and lists it only when it changed"""
+    
+    def __init__(self, emit, interval=2.0):
+        self.emit = emit
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.folders = {}  # folder -> (mtime_ns, set of names)
+    
+    def snapshot(self, folder):
+        """Current mtime and entry names of a folder"""
+        try:
+            return os.stat(folder).st_mtime_ns, set(os.listdir(folder))
+        except OSError:
+            return None, set()
+    
+    def add(self, folder):
+        """Start receiving events for a folder"""
+        with self.lock:
+            self.folders[folder] = self.snapshot(folder)
+    
+    def remove(self, folder):
+        """Stop receiving events for a folder"""
+        with self.lock:
+            self.folders.pop(folder, None)
+    
+    def run(self, stop_event):
+        """Poll until stopped"""
+        while not stop_event.wait(self.interval):
+            with self.lock:
+                folders = list(self.folders.items())
+            
+            batch = []
+            for folder, (mtime_ns, names) in folders:
+                try:
+                    if os.stat(folder).st_mtime_ns == mtime_ns:
+                        continue
+                except OSError:
+                    continue
+                new_mtime, new_names = self.snapshot(folder)
+                batch.extend((folder, os.path.join(folder, name)) for name in sorted(new_names - names))
+                with self.lock:
+                    if folder in self.folders:
+                        self.folders[folder] = (new_mtime, new_names)
+            
+            if batch:
+                self.emit(batch)
+    
+    def close(self):
+        pass
+
+class FolderWatcher:
+    # Seconds without new events before a burst is reported
+    QUIET_PERIOD = 0.5
+    # A continuous stream of events is still reported at least this often
+    MAX_DELAY = 5.0
+    # Bursts larger than this are summarized instead of listing file names
+    LIST_LIMIT = 3
+    # Paths kept per rule and burst; the count covers every matching event
+    SAMPLE_LIMIT = 100
+    
+    def __init__(self):
+        self.rules = []  # {'folder', 'label', 'pattern', 'notify', 'command', 'handler'}
+        self.rules_lock = threading.Lock()
+        self.events = queue.SimpleQueue()
+        self.stop_event = threading.Event()
+        self.backend = None
+        self.threads = []
+        self.stats = {'events': 0, 'batches': 0, 'reports': 0}
+    
+    def create_backend(self):
+        """inotify where available, polling elsewhere"""
+        if hasattr(os, 'uname') and os.uname().sysname == 'Linux':
+            try:
+                return InotifyBackend(self.events.put)
+            except Exception as e:
+                print(f"inotify unavailable, polling instead: {e}")
+        return PollBackend(self.events.put)
+    
+    def start(self):
+        """Start the watcher threads (done automatically by the first rule)"""
+        if self.backend:
+            return
+        self.stop_event.clear()
+        self.backend = self.create_backend()
+        self.threads = [
+            threading.Thread(target=self.backend.run, args=(self.stop_event,), daemon=True),
+            threading.Thread(target=self._dispatch_loop, daemon=True)
+        ]
+        for thread in self.threads:
+            thread.start()
+        
+        # Re-arm folders that had rules before a stop()
+        with self.rules_lock:
+            for folder in {rule['folder'] for rule in self.rules}:
+                self.backend.add(folder)
+    
+    def stop(self):
+        """Stop watching all folders"""
+        if not self.backend:
+            return
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout=2)
+        self.backend.close()
+        self.backend = None
+    
+    def add_rule(self, folder, label=None, pattern="*", notify=True, command=None, handler=None):
+        """
+        React to files landing in a folder
+        
+        Args:
+            folder: Folder to watch
+            label: Name used in notifications (defaults to the folder name)
+            pattern: Glob the file name must match
+            notify: Show a desktop notification
+            command: Command passed to handler; {path} and {count} are filled in
+            handler: Function that runs the command (e.g. a processor's process_command)
+        """
+        folder = os.path.abspath(folder)
+        if not os.path.isdir(folder):
+            raise FileNotFoundError(folder)
+        
+        self.start()
+        with self.rules_lock:
+            if not any(rule['folder'] == folder for rule in self.rules):
+                self.backend.add(folder)
+            self.rules.append({
+                'folder': folder,
+                'label': label or os.path.basename(folder) or folder,
+                'pattern': pattern.lower(),
+                'notify': notify,
+                'command': command,
+                'handler': handler
+            })
+    
+    def remove_rules(self, folder):
+        """Stop watching a folder; returns the number of rules removed"""
+        folder = os.path.abspath(folder)
+        with self.rules_lock:
+            removed = [rule for rule in self.rules if rule['folder'] == folder]
+            self.rules = [rule for rule in self.rules if rule['folder'] != folder]
+            if removed and self.backend:
+                self.backend.remove(folder)
+        return len(removed)
+    
+    def _dispatch_loop(self):
+        """Coalesce raw events into bursts and hand each burst to the rules"""
+        while not self.stop_event.is_set():
+            try:
+                batch = self.events.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            
+            # Keep collecting until the folder goes quiet or the burst gets too old.
+            # Every event is matched as it arrives, so counts are exact and only the
+            # paths kept for the notification text are bounded
+            with self.rules_lock:
+                rules_by_folder = {}
+                for rule in self.rules:
+                    rules_by_folder.setdefault(rule['folder'], []).append(rule)
+            pending = {}  # id(rule) -> [rule, matched count, overflowed, sample paths]
+            started = time.monotonic()
+            while True:
+                self.stats['batches'] += 1
+                self.stats['events'] += len(batch)
+                for folder, path in batch:
+                    name = os.path.basename(path).lower() if path else None
+                    if name and name.endswith(PARTIAL_SUFFIXES):
+                        continue  # Reported when it is renamed to its final name
+                    for rule in rules_by_folder.get(folder, ()):
+                        if path is not None and not fnmatch.fnmatch(name, rule['pattern']):
+                            continue
+                        entry = pending.setdefault(id(rule), [rule, 0, False, {}])
+                        if path is None:
+                            entry[2] = True  # Events were lost; report the folder as changed
+                        elif path not in entry[3]:
+                            entry[1] += 1
+                            if len(entry[3]) < self.SAMPLE_LIMIT:
+                                entry[3][path] = None  # Ordered and de-duplicated
+                if time.monotonic() - started >= self.MAX_DELAY:
+                    break
+                try:
+                    batch = self.events.get(timeout=self.QUIET_PERIOD)
+                except queue.Empty:
+                    break
+            
+            for rule, count, overflowed, paths in pending.values():
+                try:
+                    self.report(rule, count, overflowed, list(paths))
+                except Exception as e:
+                    print(f"Folder watcher error: {e}")
+    
+    def report(self, rule, count, overflowed, paths):
+        """
+        Run one rule for a coalesced burst in its folder
+        
+        Args:
+            rule: The rule whose pattern the files matched
+            count: Number of matching files
+            overflowed: Whether events were lost, so the folder changed in unknown ways
+            paths: A bounded sample of the matching files, in arrival order
+        """
+        message = self.describe(paths, count, overflowed)
+        if rule['command'] and rule['handler']:
+            # Spoken text may contain braces, so only the two placeholders are filled in
+            command = rule['command'].replace('{path}', paths[0] if paths else rule['folder'])
+            response = rule['handler'](command.replace('{count}', str(count)))
+            if isinstance(response, str) and response:
+                message = f"{message}\n{response}"
+        if rule['notify']:
+            from notification_system import notification_manager
+            notification_manager.show_notification(f"New in {rule['label']}", message, "info")
+        self.stats['reports'] += 1
+    
+    def describe(self, paths, total, overflowed):
+        """Summarize a burst for a notification"""
+        names = [os.path.basename(path) for path in paths]
+        if overflowed and not names:
+            return "Many files changed"
+        if total <= self.LIST_LIMIT:
+            return ", ".join(names)
+        return f"{', '.join(names[:self.LIST_LIMIT])} and {total - self.LIST_LIMIT} more ({total} files)"
+    
+    def get_stats(self):
+        """Get watcher statistics"""
+        with self.rules_lock:
+            folders = sorted({rule['label'] for rule in self.rules})
+        return dict(self.stats, folders=folders, backend=type(self.backend).__name__ if self.backend else None)
+
+def resolve_watch_folder(name, aliases=None):
+    """Map a spoken folder name to a path via user aliases or config.common_folders"""
+    from config import config
+    name = name.strip().lower()
+    for alias, path in (aliases or {}).items():
+        if alias == name:
+            return path
+    common_folders = config.get('common_folders', {})
+    return common_folders.get(name) or common_folders.get(name.rstrip('s'))
+
+def is_watch_command(command):
+    """Check whether a command sets up or removes a folder watch"""
+    return bool(WATCH_PATTERN.search(command) or UNWATCH_PATTERN.search(command))
+
+def handle_watch_command(command, aliases=None, command_handler=None):
+    """
+    Set up or remove a folder watch from a spoken command
+    
+    Args:
+        command: The spoken command
+        aliases: User folder aliases
+        command_handler: Runs the command that follows "and"/"then" when files land
+                         (the calling processor's process_command)
+    """
+    command = command.lower().strip().rstrip('.!?')
+    match = UNWATCH_PATTERN.search(command)
+    if match:
+        path = resolve_watch_folder(match.group('folder'), aliases)
+        if not path or not folder_watcher.remove_rules(path):
+            return f"I'm not watching {match.group('folder')}."
+        return f"🔕 Stopped watching {match.group('folder')}."
+    
+    match = WATCH_PATTERN.search(command)
+    if not match:
+        return "Try: tell me when a file lands in downloads"
+    
+    folder_name = match.group('folder')
+    path = resolve_watch_folder(folder_name, aliases)
+    if not path or not os.path.isdir(path):
+        return f"I don't know a folder called '{folder_name}'. Add it as an alias first."
+    
+    kind = (match.group('kind') or '').strip().lstrip('.')
+    pattern = f"*.{kind}" if kind and kind not in ('file', 'files', 'something', 'anything') else "*"
+    action = match.group('action') if command_handler else None
+    try:
+        folder_watcher.add_rule(path, label=folder_name.title(), pattern=pattern, command=action, handler=command_handler)
+    except Exception as e:
+        return f"❌ Could not watch {folder_name}: {e}"
+    
+    what = f"{kind.upper()} file" if pattern != "*" else "file"
+    if action:
+        return f"👀 When a new {what} lands in {folder_name.title()}, I'll let you know and {action}."
+    return f"👀 I'll let you know when a new {what} lands in {folder_name.title()}."
+
+# Global folder watcher instance
+folder_watcher = FolderWatcher()
@@ -0,0 +1,119 @@
+"""
+Frecency ranking for opened files
+Every open adds a visit whose weight halves every HALF_LIFE_DAYS. Scores are
+kept in the log domain relative to a fixed epoch, so a visit is an O(1)
+update and scores never need to be decayed in place: ranking by the stored
+value is the same as ranking by the decayed score at any moment.
+"""
+import os
+import json
+import math
+import time
+import heapq
+from pathlib import Path
+
+from utils.file_store import get_file_lock, atomic_write_lines
+
+def log_add(a, b):
+    """log(exp(a) + exp(b)) without overflow"""
+    if a is None:
+        return b
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+class FrecencyStore:
+    HALF_LIFE_DAYS = 14
+    # A match is opened directly when it scores this many times the runner-up...
+    DOMINANCE_RATIO = 3.0
+    # ...and has at least this much weight (about three recent opens)
+    DOMINANCE_MIN_SCORE = 2.5
+    # Rewrite the visit log once it has this many more lines than there are paths
+    COMPACT_SLACK = 1000
+    
+    def __init__(self, store_file=None):
+        """
+        Initialize the frecency store
+        
+        Args:
+            store_file: Append-only visit log (JSON lines)
+        """
+        db_dir = Path.home() / ".ai_assistant" / "database"
+        db_dir.mkdir(parents=True, exist_ok=True)
+        self.store_file = Path(store_file) if store_file else db_dir / "frecency.jsonl"
+        self.lock = get_file_lock(self.store_file)
+        self.rate = math.log(2) / (self.HALF_LIFE_DAYS * 86400)
+        self.scores = {}  # path -> log of the undecayed visit weight sum
+        self.log_lines = 0
+        
+        self.load()
+    
+    def load(self):
+        """Replay the visit log"""
+        try:
+            with open(self.store_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Torn last line
+                    self.log_lines += 1
+                    path = record['path']
+                    if 'log_score' in record:  # Compacted entry
+                        self.scores[path] = log_add(self.scores.get(path), record['log_score'])
+                    else:
+                        self.scores[path] = log_add(self.scores.get(path), self.rate * record['time'])
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error loading frecency data: {e}")
+    
+    def record(self, path, when=None):
+        """Record that a path was opened"""
+        path = os.path.abspath(path)
+        when = when or time.time()
+        with self.lock:
+            self.scores[path] = log_add(self.scores.get(path), self.rate * when)
+            try:
+                with open(self.store_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({'path': path, 'time': when}) + "\n")
+                self.log_lines += 1
+                if self.log_lines > len(self.scores) + self.COMPACT_SLACK:
+                    self.compact()
+            except Exception as e:
+                print(f"Error saving frecency data: {e}")
+    
+    def compact(self):
+        """Rewrite the log with one line per path (hold the lock)"""
+        atomic_write_lines(self.store_file, (
+            json.dumps({'path': path, 'log_score': log_score}) for path, log_score in self.scores.items()
+        ))
+        self.log_lines = len(self.scores)
+    
+    def score(self, path, now=None):
+        """Decayed score: each open counts 1 when fresh and halves every HALF_LIFE_DAYS"""
+        log_score = self.scores.get(os.path.abspath(path))
+        if log_score is None:
+            return 0.0
+        return math.exp(log_score - self.rate * (now or time.time()))
+    
+    def rank(self, paths):
+        """Order paths by frecency; never-opened paths keep their original order at the end"""
+        keys = {path: self.scores.get(os.path.abspath(path), float('-inf')) for path in paths}
+        return sorted(paths, key=lambda path: -keys[path])
+    
+    def top(self, k=10):
+        """The k most frecent paths"""
+        best = heapq.nlargest(k, self.scores.items(), key=lambda item: item[1])
+        return [path for path, _ in best]
+    
+    def dominant(self, paths):
+        """The path to open without asking, if one clearly beats the others"""
+        scored = sorted((self.score(path) for path in paths), reverse=True)
+        if not scored or scored[0] < self.DOMINANCE_MIN_SCORE:
+            return None
+        if len(scored) > 1 and scored[0] < self.DOMINANCE_RATIO * scored[1]:
+            return None
+        return max(paths, key=self.score)
+
+# Global frecency store instance
+frecency_store = FrecencyStore()
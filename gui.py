@@ -5,6 +5,7 @@ import tkinter as tk
 from tkinter import messagebox, ttk
 import customtkinter as ctk
 from PIL import Image, ImageTk
+import os
 import threading
 import queue
 import json
@@ -14,6 +15,8 @@ from database import db
 from voice_handler import voice_handler
 from command_processor import CommandProcessor
 from config import config
+from file_handler import streaming_search, SearchToken, is_cancel_search_command
+from content_index import content_index
 
 # Set appearance mode and color theme
 ctk.set_appearance_mode("dark")
@@ -278,6 +281,7 @@ class MainApplication:
         self.user_id = user_id
         self.command_processor = CommandProcessor(user_id)
         self.is_listening = False
+        self.search_tokens = set()  # Tokens of the file searches in progress
         
         # Create main window
         self.window = ctk.CTk()
@@ -512,8 +516,17 @@ class MainApplication:
     
     def process_command(self, command):
         """Process command and show response"""
+        if is_cancel_search_command(command):
+            self.add_message("Assistant", self.cancel_searches(), "assistant")
+            return
+        
+        # File searches show what they have found so far and stop at the time budget
+        token = SearchToken(time_budget=config.get('file_search_time_budget', 30))
+        self.search_tokens.add(token)
         try:
-            response = self.command_processor.process_command(command)
+            # Background document indexing waits until the command has answered
+            with content_index.paused(), streaming_search(self.show_search_progress, token):
+                response = self.command_processor.process_command(command)
             
             # Handle multiple file results
             if isinstance(response, str) and "Say the number to open" in response:
@@ -527,6 +540,43 @@ class MainApplication:
             error_msg = f"Sorry, I encountered an error: {str(e)}"
             self.add_message("Assistant", error_msg, "assistant")
             voice_handler.speak(error_msg)
+        finally:
+            self.search_tokens.discard(token)
+            self.window.after(0, self.clear_search_progress)
+    
+    def cancel_searches(self):
+        """Stop the file searches in progress"""
+        if not self.search_tokens:
+            return "No search is running."
+        for token in list(self.search_tokens):
+            token.cancel()
+        return "Stopping the search."
+    
+    def show_search_progress(self, results):
+        """Show the matches found so far (called from the search thread)"""
+        lines = [f"🔎 Searching... {len(results)} found so far"]
+        lines += [f"   • {os.path.basename(path)} ({os.path.dirname(path)})" for path in results[:5]]
+        if len(results) > 5:
+            lines.append(f"   ... and {len(results) - 5} more")
+        text = "\n".join(lines) + "\n\n"
+        
+        def render():
+            # The progress block is tagged so it can be replaced in place
+            ranges = self.chat_display.tag_ranges("search_progress")
+            if ranges:
+                self.chat_display.delete(ranges[0], ranges[-1])
+                self.chat_display.insert(ranges[0], text, "search_progress")
+            else:
+                self.chat_display.insert("end", text, "search_progress")
+            self.chat_display.see("end")
+        
+        self.window.after(0, render)
+    
+    def clear_search_progress(self):
+        """Remove the progress block once the search has answered"""
+        ranges = self.chat_display.tag_ranges("search_progress")
+        if ranges:
+            self.chat_display.delete(ranges[0], ranges[-1])
     
     def toggle_voice(self):
         """Toggle continuous voice listening"""
@@ -562,7 +612,8 @@ class MainApplication:
     def handle_voice_command(self, command):
         """Handle voice command from continuous listening"""
         self.window.after(0, lambda: self.add_message("You", command, "user"))
-        self.window.after(0, lambda: self.process_command(command))
+        # Off the UI thread, so searches can show progress while they run
+        threading.Thread(target=self.process_command, args=(command,), daemon=True).start()
     
     def execute_quick_action(self, command):
         """Execute quick action"""
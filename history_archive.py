@@ -0,0 +1,291 @@
+"""
+Tiered retention for conversation history
+Older entries roll out of the live store into immutable, gzip-compressed
+segment files. A small manifest records each segment's time range and
+user ids so queries only open the segments they need. Each segment has a
+term index written next to it, so searches read small index files and only
+decompress the segments holding a result.
+"""
+import os
+import gzip
+import heapq
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+
+from history_search import tokenize, prefix_range, rank_entries
+from utils.file_store import atomic_write_json
+
+class SegmentIndex:
+    """Term index of one archive segment, with the interface rank_entries expects"""
+    
+    def __init__(self, docs, postings, load_entries):
+        """
+        Args:
+            docs: [user_id, timestamp] of each entry, in segment order
+            postings: term -> "doc tf doc tf ..." (decoded only for matching terms)
+            load_entries: Function returning the segment's entries
+        """
+        self.docs = docs
+        self.postings = postings
+        self.terms = sorted(postings)
+        self.load_entries = load_entries
+    
+    @staticmethod
+    def build(entries):
+        """(docs, postings) of a list of entries, in the stored form"""
+        docs = []
+        postings = {}
+        for doc_id, entry in enumerate(entries):
+            docs.append([entry.get('user_id'), entry.get('timestamp', '')])
+            counts = {}
+            for term in tokenize(f"{entry.get('prompt', '')} {entry.get('response', '')}"):
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                postings.setdefault(term, []).append(f"{doc_id} {count}")
+        return docs, {term: " ".join(items) for term, items in postings.items()}
+    
+    def __len__(self):
+        return len(self.docs)
+    
+    def matching(self, prefix):
+        """Term frequency per document, summed over the words starting with prefix"""
+        matches = {}
+        for term in prefix_range(self.terms, prefix):
+            values = self.postings[term].split()
+            for doc_id, frequency in zip(values[::2], values[1::2]):
+                doc_id = int(doc_id)
+                matches[doc_id] = matches.get(doc_id, 0) + int(frequency)
+        return matches
+    
+    def meta(self, doc_id):
+        """(user_id, timestamp) of a document"""
+        user_id, timestamp = self.docs[doc_id]
+        return user_id, timestamp
+    
+    def entries(self, doc_ids):
+        """The entries of several documents, read from the segment"""
+        entries = self.load_entries()
+        return [entries[doc_id] for doc_id in doc_ids]
+
+class HistoryArchive:
+    # Segment term indexes kept in memory
+    MAX_CACHED_INDEXES = 64
+    
+    def __init__(self, archive_dir, segment_size=5000):
+        """
+        Initialize the history archive
+        
+        Args:
+            archive_dir: Directory holding the segment files and manifest
+            segment_size: Maximum number of entries per segment file
+        """
+        self.archive_dir = Path(archive_dir)
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_file = self.archive_dir / "manifest.json"
+        self.segment_size = segment_size
+        self.lock = threading.Lock()
+        self.segments = self.load_manifest()
+        self.index_lock = threading.Lock()
+        self.indexes = OrderedDict()  # segment id -> SegmentIndex
+    
+    def load_manifest(self):
+        """Load the per-segment index"""
+        try:
+            if self.manifest_file.exists():
+                with open(self.manifest_file, 'r') as f:
+                    return json.load(f)
+        except Exception as e:
+            print(f"Error loading archive manifest: {e}")
+        return []
+    
+    def save_manifest(self):
+        """Write the per-segment index atomically"""
+        atomic_write_json(self.manifest_file, self.segments)
+    
+    def append(self, entries, save=True):
+        """
+        Roll entries (oldest first) into new immutable segments
+        
+        Args:
+            save: Write the manifest; bulk writers pass False and call save_manifest
+                  (holding the lock) once they are done
+        """
+        entries = list(entries)
+        if not entries:
+            return 0
+        
+        with self.lock:
+            next_id = max((segment['id'] for segment in self.segments), default=0) + 1
+            for start in range(0, len(entries), self.segment_size):
+                chunk = entries[start:start + self.segment_size]
+                segment_file = f"segment-{next_id:06d}.jsonl.gz"
+                
+                temp_file = self.archive_dir / (segment_file + ".tmp")
+                with gzip.open(temp_file, 'wt', encoding='utf-8') as f:
+                    for entry in chunk:
+                        f.write(json.dumps(entry) + "\n")
+                os.replace(temp_file, self.archive_dir / segment_file)
+                self.write_segment_index(segment_file, chunk)
+                
+                timestamps = [entry.get('timestamp', '') for entry in chunk]
+                self.segments.append({
+                    "id": next_id,
+                    "file": segment_file,
+                    "count": len(chunk),
+                    "min_timestamp": min(timestamps),
+                    "max_timestamp": max(timestamps),
+                    "user_ids": sorted({entry['user_id'] for entry in chunk if 'user_id' in entry}, key=str)
+                })
+                next_id += 1
+            
+            if save:
+                self.save_manifest()
+        
+        return len(entries)
+    
+    def find_segments(self, user_id=None, since=None, until=None):
+        """Segments that may hold matching entries, newest first"""
+        since = since.isoformat() if isinstance(since, datetime) else since
+        until = until.isoformat() if isinstance(until, datetime) else until
+        
+        with self.lock:
+            segments = list(self.segments)
+        
+        matches = []
+        for segment in segments:
+            if user_id is not None and user_id not in segment['user_ids']:
+                continue
+            if since and segment['max_timestamp'] < since:
+                continue
+            if until and segment['min_timestamp'] >= until:
+                continue
+            matches.append(segment)
+        
+        return sorted(matches, key=lambda segment: segment['id'], reverse=True)
+    
+    def read_segment(self, segment):
+        """Read all entries of a segment, oldest first"""
+        entries = []
+        try:
+            with gzip.open(self.archive_dir / segment['file'], 'rt', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        entries.append(json.loads(line))
+        except Exception as e:
+            print(f"Error reading archive segment {segment['file']}: {e}")
+        return entries
+    
+    def iter_entries(self, user_id=None, since=None, until=None, oldest_first=False, segments=None):
+        """Yield matching archived entries, newest first unless oldest_first is set"""
+        since_str = since.isoformat() if isinstance(since, datetime) else since
+        until_str = until.isoformat() if isinstance(until, datetime) else until
+        
+        segments = list(self.find_segments(user_id, since, until) if segments is None else segments)
+        if oldest_first:
+            segments.reverse()
+        
+        # Only one segment is held in memory at a time
+        for segment in segments:
+            entries = self.read_segment(segment)
+            for entry in (entries if oldest_first else reversed(entries)):
+                if user_id is not None and entry.get('user_id') != user_id:
+                    continue
+                timestamp = entry.get('timestamp', '')
+                if (since_str and timestamp < since_str) or (until_str and timestamp >= until_str):
+                    continue
+                yield entry
+    
+    def get_recent(self, user_id=None, limit=50, segments=None):
+        """Most recent archived entries for a user by timestamp, oldest first"""
+        if limit <= 0:
+            return []
+        
+        # Imported history can land in a newer segment than entries it predates, so
+        # segments are visited by their newest timestamp and the walk stops once no
+        # remaining segment can beat the oldest entry kept
+        segments = self.find_segments(user_id) if segments is None else segments
+        segments = sorted(segments, key=lambda segment: (segment['max_timestamp'], segment['id']), reverse=True)
+        recent = []  # min-heap of (timestamp, segment id, position, entry)
+        for segment in segments:
+            if len(recent) >= limit and segment['max_timestamp'] < recent[0][0]:
+                break
+            for position, entry in enumerate(self.iter_entries(user_id, segments=[segment], oldest_first=True)):
+                item = (entry.get('timestamp', ''), segment['id'], position, entry)
+                if len(recent) < limit:
+                    heapq.heappush(recent, item)
+                elif item[:3] > recent[0][:3]:
+                    heapq.heapreplace(recent, item)
+        
+        return [item[3] for item in sorted(recent, key=lambda item: item[:3])]
+    
+    def index_file(self, segment_file):
+        """Path of the term index written next to a segment"""
+        return self.archive_dir / segment_file.replace(".jsonl.gz", ".terms.json.gz")
+    
+    def write_segment_index(self, segment_file, entries):
+        """Write a segment's term index (before the manifest lists the segment)"""
+        docs, postings = SegmentIndex.build(entries)
+        index_file = self.index_file(segment_file)
+        temp_file = index_file.with_name(index_file.name + ".tmp")
+        with gzip.open(temp_file, 'wt', encoding='utf-8') as f:
+            json.dump({"docs": docs, "postings": postings}, f, separators=(',', ':'))
+        os.replace(temp_file, index_file)
+        return docs, postings
+    
+    def get_segment_index(self, segment):
+        """
+        Term index of a segment, from memory or its index file
+        
+        Segments archived before term indexes existed get one written on first use.
+        """
+        with self.index_lock:
+            index = self.indexes.get(segment['id'])
+            if index is not None:
+                self.indexes.move_to_end(segment['id'])
+                return index
+        
+        try:
+            with gzip.open(self.index_file(segment['file']), 'rt', encoding='utf-8') as f:
+                data = json.load(f)
+            docs, postings = data['docs'], data['postings']
+        except FileNotFoundError:
+            docs, postings = self.write_segment_index(segment['file'], self.read_segment(segment))
+        index = SegmentIndex(docs, postings, lambda: self.read_segment(segment))
+        
+        with self.index_lock:
+            self.indexes[segment['id']] = index
+            while len(self.indexes) > self.MAX_CACHED_INDEXES:
+                self.indexes.popitem(last=False)
+        return index
+    
+    def search(self, user_id, query, since=None, until=None, limit=10, extra_index=None):
+        """
+        Rank archived entries (plus a HistoryIndex of live ones, if given) against a query
+        
+        Only the segments that can hold the user's entries in the time range are
+        consulted, through their term indexes; a segment file is decompressed only
+        when it holds one of the results.
+        """
+        segments = sorted(self.find_segments(user_id, since, until), key=lambda segment: segment['id'])
+        # Oldest first, so newer entries win ties
+        sources = [self.get_segment_index(segment) for segment in segments]
+        if extra_index is not None:
+            sources.append(extra_index)
+        return rank_entries(sources, user_id, query, since, until, limit)
+    
+    def get_stats(self):
+        """Get archive size information"""
+        with self.lock:
+            return {
+                'segments': len(self.segments),
+                'entries': sum(segment['count'] for segment in self.segments),
+                'bytes': sum(
+                    (self.archive_dir / segment['file']).stat().st_size
+                    for segment in self.segments
+                    if (self.archive_dir / segment['file']).exists()
+                )
+            }
@@ -0,0 +1,213 @@
+"""
+Full-text search helpers for chat history
+Query parsing, time-range phrases and an incremental inverted index used by
+the JSON storage backend (the SQLite backend uses FTS5 instead)
+"""
+import bisect
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+STOP_WORDS = {
+    'a', 'an', 'the', 'and', 'or', 'of', 'to', 'in', 'on', 'for', 'about',
+    'with', 'what', 'did', 'do', 'i', 'me', 'my', 'ask', 'asked', 'say', 'said',
+    'is', 'was', 'it', 'from', 'history', 'search', 'find', 'that', 'this'
+}
+
+# Phrases that turn a command into a history search
+HISTORY_SEARCH_PHRASES = [
+    'search my history for', 'search history for', 'search my history',
+    'search history', 'find in history', 'what did i ask about',
+    'what did i ask', 'what did i say about', 'what did i say'
+]
+
+def normalize_term(term):
+    """Lowercase a term and fold simple plurals ("resumes" -> "resume")"""
+    term = term.lower()
+    if len(term) > 3 and term.endswith('s') and not term.endswith('ss'):
+        term = term[:-1]
+    return term
+
+def tokenize(text):
+    """Split text into normalized index terms"""
+    return [normalize_term(token) for token in TOKEN_PATTERN.findall(text.lower())]
+
+def query_terms(query):
+    """Get the distinct searchable terms of a query, dropping stop words"""
+    terms = []
+    for token in TOKEN_PATTERN.findall(query.lower()):
+        if token in STOP_WORDS:
+            continue
+        term = normalize_term(token)
+        if term not in terms:
+            terms.append(term)
+    return terms
+
+def is_history_search(command):
+    """Check whether a command asks to search the chat history"""
+    return any(phrase in command for phrase in HISTORY_SEARCH_PHRASES)
+
+def parse_time_range(text, now=None):
+    """
+    Extract a time range from phrases like "last week" or "past 3 days"
+    
+    Returns:
+        (since, until, label, remaining_text) - since/until are datetimes or None
+    """
+    now = now or datetime.now()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    week_start = today - timedelta(days=today.weekday())
+    month_start = today.replace(day=1)
+    
+    ranges = [
+        (r"\b(?:in the )?(?:last|past) (\d+) days?\b", None),
+        (r"\btoday\b", (today, None)),
+        (r"\byesterday\b", (today - timedelta(days=1), today)),
+        (r"\bthis week\b", (week_start, None)),
+        (r"\blast week\b", (week_start - timedelta(days=7), week_start)),
+        (r"\bthis month\b", (month_start, None)),
+        (r"\blast month\b", ((month_start - timedelta(days=1)).replace(day=1), month_start)),
+        (r"\bthis year\b", (today.replace(month=1, day=1), None)),
+    ]
+    
+    for pattern, bounds in ranges:
+        match = re.search(pattern, text)
+        if not match:
+            continue
+        if bounds is None:
+            bounds = (today - timedelta(days=int(match.group(1))), None)
+        remaining = (text[:match.start()] + text[match.end():]).strip()
+        return bounds[0], bounds[1], match.group(0), remaining
+    
+    return None, None, None, text
+
+def extract_search_query(command):
+    """Strip the command phrasing, leaving the search terms and time range"""
+    query = command
+    for phrase in HISTORY_SEARCH_PHRASES:
+        if phrase in query:
+            query = query.replace(phrase, ' ', 1)
+            break
+    return ' '.join(query.split())
+
+def prefix_range(terms, prefix):
+    """Slice of a sorted term list that starts with prefix"""
+    start = bisect.bisect_left(terms, prefix)
+    return terms[start:bisect.bisect_left(terms, prefix + '\U0010ffff', start)]
+
+def rank_entries(sources, user_id, query, since=None, until=None, limit=10):
+    """
+    Rank a user's entries in several indexes against a query with TF-IDF scoring
+    
+    A query term matches every indexed word that starts with it, the same rule
+    as the SQLite backend's FTS5 prefix queries ("term"*).
+    
+    Args:
+        sources: HistoryIndex-like objects, oldest first; newer entries win ties
+    
+    Returns:
+        List of (prompt, response, timestamp), best first
+    """
+    terms = query_terms(query)
+    if not terms:
+        return []
+    
+    since = since.isoformat() if isinstance(since, datetime) else since
+    until = until.isoformat() if isinstance(until, datetime) else until
+    total_docs = sum(len(source) for source in sources)
+    scores = defaultdict(float)  # (source position, doc id) -> score
+    
+    for term in terms:
+        found = [source.matching(term) for source in sources]
+        df = sum(len(postings) for postings in found)
+        if not df:
+            continue
+        idf = math.log(1 + total_docs / df)
+        for position, (source, postings) in enumerate(zip(sources, found)):
+            for doc_id, frequency in postings.items():
+                entry_user, timestamp = source.meta(doc_id)
+                if entry_user != user_id:
+                    continue
+                if (since and timestamp < since) or (until and timestamp >= until):
+                    continue
+                scores[(position, doc_id)] += (1 + math.log(frequency)) * idf
+    
+    best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+    
+    # Entries are fetched only for the results, one read per source
+    wanted = defaultdict(list)
+    for (position, doc_id), _ in best:
+        wanted[position].append(doc_id)
+    entries = {}
+    for position, doc_ids in wanted.items():
+        for doc_id, entry in zip(doc_ids, sources[position].entries(doc_ids)):
+            entries[(position, doc_id)] = entry
+    return [
+        (entry['prompt'], entry['response'], entry.get('timestamp', ''))
+        for entry in (entries[key] for key, _ in best)
+    ]
+
+class HistoryIndex:
+    """Inverted index over prompts and responses, updated as entries are added"""
+    
+    def __init__(self):
+        self.postings = defaultdict(dict)  # term -> {doc_id: term frequency}
+        self.docs = []
+        self.terms = None  # Sorted vocabulary for prefix matching, rebuilt when new terms appear
+    
+    def __len__(self):
+        return len(self.docs)
+    
+    def add(self, entry):
+        """Index a single history entry"""
+        doc_id = len(self.docs)
+        self.docs.append(entry)
+        text = f"{entry.get('prompt', '')} {entry.get('response', '')}"
+        for term, count in Counter(tokenize(text)).items():
+            if term not in self.postings:
+                self.terms = None
+            self.postings[term][doc_id] = count
+    
+    def add_many(self, entries):
+        """Index several history entries"""
+        for entry in entries:
+            self.add(entry)
+    
+    def matching(self, prefix):
+        """Term frequency per document, summed over the words starting with prefix"""
+        if self.terms is None:
+            self.terms = sorted(self.postings)
+        matches = defaultdict(int)
+        for term in prefix_range(self.terms, prefix):
+            for doc_id, frequency in self.postings[term].items():
+                matches[doc_id] += frequency
+        return matches
+    
+    def meta(self, doc_id):
+        """(user_id, timestamp) of a document"""
+        entry = self.docs[doc_id]
+        return entry.get('user_id'), entry.get('timestamp', '')
+    
+    def entries(self, doc_ids):
+        """The entries of several documents"""
+        return [self.docs[doc_id] for doc_id in doc_ids]
+    
+    def search(self, user_id, query, since=None, until=None, limit=10):
+        """Rank a user's entries against the query with TF-IDF scoring"""
+        return rank_entries([self], user_id, query, since, until, limit)
+
+def format_search_results(results, query, label=None):
+    """Format search results for the chat display"""
+    scope = f" ({label})" if label else ""
+    if not results:
+        return f"No conversations found matching '{query}'{scope}."
+    
+    response = f"🔎 Conversations matching '{query}'{scope}:\n"
+    for i, (prompt, resp, timestamp) in enumerate(results, 1):
+        time_str = timestamp[:16].replace('T', ' ') if timestamp else "Unknown"
+        response += f"{i}. [{time_str}] {prompt} → {resp[:60]}{'...' if len(resp) > 60 else ''}\n"
+    return response
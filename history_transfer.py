@@ -0,0 +1,164 @@
+"""
+Bulk import/export of conversation history
+Records are streamed as JSONL or CSV (optionally gzip-compressed), so
+histories of any size move between machines in constant memory.
+
+Usage:
+    python history_transfer.py export history.jsonl.gz [--user ID] [--since ISO] [--until ISO]
+    python history_transfer.py import history.jsonl.gz [--user ID] [--since ISO] [--until ISO]
+"""
+import csv
+import gzip
+import json
+import argparse
+from datetime import datetime
+
+FIELDS = ["user_id", "prompt", "response", "timestamp"]
+IMPORT_BATCH_SIZE = 1000
+PROGRESS_INTERVAL = 1000
+
+def detect_format(path):
+    """Pick 'csv' or 'jsonl' from the file name, ignoring a .gz suffix"""
+    name = str(path).lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    return 'csv' if name.endswith('.csv') else 'jsonl'
+
+def open_history_file(path, mode):
+    """Open a history file for text I/O, transparently handling gzip"""
+    if str(path).lower().endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8', newline='')
+    return open(path, mode, encoding='utf-8', newline='')
+
+def matches(entry, user_id=None, since=None, until=None):
+    """Check an entry against the user and time-range filters"""
+    if user_id is not None and entry.get('user_id') != user_id:
+        return False
+    timestamp = entry.get('timestamp', '')
+    return not ((since and timestamp < since) or (until and timestamp >= until))
+
+def iter_history_file(f, fmt):
+    """Yield entries from an open JSONL or CSV history file, skipping damaged lines"""
+    if fmt == 'csv':
+        for row in csv.DictReader(f):
+            user_id = row.get('user_id', '')
+            yield {
+                "user_id": int(user_id) if user_id.lstrip('-').isdigit() else (user_id or None),
+                "prompt": row.get('prompt', ''),
+                "response": row.get('response', ''),
+                "timestamp": row.get('timestamp', '')
+            }
+        return
+    
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            continue
+
+def export_history(path, database=None, user_id=None, since=None, until=None, fmt=None, progress=None):
+    """
+    Stream history entries to a JSONL or CSV file, oldest first
+    
+    Args:
+        path: Output file; a .gz suffix compresses it
+        database: Storage backend (defaults to the global db)
+        user_id: Only export this user's entries (None for all users)
+        since: Only entries at or after this datetime/ISO timestamp
+        until: Only entries before this datetime/ISO timestamp
+        fmt: 'jsonl' or 'csv' (detected from the file name by default)
+        progress: Optional callback called with the running entry count
+    
+    Returns:
+        Number of entries written
+    """
+    if database is None:
+        from database import db as database
+    fmt = fmt or detect_format(path)
+    count = 0
+    
+    with open_history_file(path, 'w') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS, extrasaction='ignore') if fmt == 'csv' else None
+        if writer:
+            writer.writeheader()
+        
+        for entry in database.iter_chat_history(user_id, since, until):
+            if writer:
+                writer.writerow(entry)
+            else:
+                f.write(json.dumps(entry) + "\n")
+            count += 1
+            if progress and count % PROGRESS_INTERVAL == 0:
+                progress(count)
+    
+    if progress:
+        progress(count)
+    return count
+
+def import_history(path, database=None, user_id=None, since=None, until=None, fmt=None,
+                   batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """
+    Stream history entries from a JSONL or CSV file into the database
+    
+    Args:
+        path: Input file; a .gz suffix is decompressed on the fly
+        database: Storage backend (defaults to the global db)
+        user_id: Only import this user's entries (None for all users)
+        since: Only entries at or after this datetime/ISO timestamp
+        until: Only entries before this datetime/ISO timestamp
+        fmt: 'jsonl' or 'csv' (detected from the file name by default)
+        batch_size: Number of entries written per batch (SQLite backend)
+        progress: Optional callback called with the running entry count
+    
+    Returns:
+        Number of entries imported
+    """
+    if database is None:
+        from database import db as database
+    fmt = fmt or detect_format(path)
+    since = since.isoformat() if isinstance(since, datetime) else since
+    until = until.isoformat() if isinstance(until, datetime) else until
+    count = 0
+    
+    def entries():
+        nonlocal count
+        for entry in iter_history_file(f, fmt):
+            if not matches(entry, user_id, since, until):
+                continue
+            yield {field: entry.get(field, '') for field in FIELDS}
+            count += 1
+            if progress and count % PROGRESS_INTERVAL == 0:
+                progress(count)
+    
+    # The backend decides where bulk entries go; the JSON one writes them straight
+    # to archive segments instead of compacting its journals over and over
+    with open_history_file(path, 'r') as f:
+        database.import_chat_history(entries(), batch_size)
+    
+    if progress:
+        progress(count)
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Import or export conversation history")
+    parser.add_argument("action", choices=["export", "import"])
+    parser.add_argument("path", help="JSONL or CSV file (.gz for compression)")
+    parser.add_argument("--user", type=int, help="Only this user id")
+    parser.add_argument("--since", help="Only entries at or after this ISO timestamp")
+    parser.add_argument("--until", help="Only entries before this ISO timestamp")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="Override the detected format")
+    args = parser.parse_args()
+    
+    def show_progress(count):
+        print(f"\r{count} entries", end="", flush=True)
+    
+    transfer = export_history if args.action == "export" else import_history
+    count = transfer(args.path, user_id=args.user, since=args.since, until=args.until,
+                     fmt=args.format, progress=show_progress)
+    print(f"\n{args.action.capitalize()}ed {count} history entries")
+
+if __name__ == "__main__":
+    main()
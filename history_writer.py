@@ -0,0 +1,182 @@
+"""
+Write-behind queue for chat history persistence
+Interactions are queued and group-committed on a background thread so that
+command responses never wait on disk I/O
+"""
+import atexit
+import queue
+import threading
+import time
+from datetime import datetime
+
+from database import db
+from config import config
+
+# Queue marker that stops the writer
+STOP = object()
+
+class FlushRequest:
+    """Queue marker whose event is set once everything queued before it is written"""
+    def __init__(self):
+        self.done = threading.Event()
+
+class HistoryWriter:
+    def __init__(self, database, batch_size=50, flush_interval=0.5, max_queue=10000):
+        """
+        Initialize the background history writer
+        
+        Args:
+            database: Database manager providing save_chat_history_batch
+            batch_size: Write as soon as this many interactions are queued
+            flush_interval: Write at least this often (seconds) while items are pending
+            max_queue: Maximum number of queued interactions
+        """
+        self.database = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.stats_lock = threading.Lock()
+        self.stats = {
+            'enqueued': 0,
+            'written': 0,
+            'dropped': 0,
+            'flushes': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0
+        }
+        
+        self.thread = threading.Thread(target=self._writer_loop, name="HistoryWriter", daemon=True)
+        self.thread.start()
+    
+    def save(self, user_id, prompt, response):
+        """Queue an interaction for saving; returns without touching the disk"""
+        entry = {
+            "user_id": user_id,
+            "prompt": prompt,
+            "response": response,
+            "timestamp": datetime.now().isoformat()
+        }
+        
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            # Never block the response: a full queue means the disk is stalled, so the entry is counted and dropped
+            self._update_stats(dropped=1)
+            print("History queue full, dropping interaction")
+            return False
+        
+        self._update_stats(enqueued=1)
+        return True
+    
+    def flush(self, timeout=2):
+        """
+        Wait until everything queued so far has been written
+        
+        A stalled writer must not hang the caller, so this gives up after
+        timeout seconds.
+        
+        Returns:
+            True if the queue was written in time
+        """
+        if not self.thread.is_alive():
+            return True
+        deadline = time.monotonic() + timeout
+        request = FlushRequest()
+        try:
+            self.queue.put(request, timeout=timeout)
+        except queue.Full:
+            print("History queue full, not waiting for it to be written")
+            return False
+        return request.done.wait(max(0, deadline - time.monotonic()))
+    
+    def close(self, timeout=5):
+        """Write pending interactions and stop the writer thread, waiting at most timeout seconds"""
+        if not self.thread.is_alive():
+            return
+        deadline = time.monotonic() + timeout
+        try:
+            self.queue.put(STOP, timeout=timeout)
+        except queue.Full:
+            print("History queue full at exit; unwritten interactions are lost")
+            return
+        self.thread.join(max(0, deadline - time.monotonic()))
+    
+    def get_stats(self):
+        """Get queue depth and flush latency counters"""
+        with self.stats_lock:
+            stats = self.stats.copy()
+        stats['queue_depth'] = self.queue.qsize()
+        stats['avg_flush_ms'] = stats['total_flush_ms'] / stats['flushes'] if stats['flushes'] else 0.0
+        return stats
+    
+    def _update_stats(self, **increments):
+        with self.stats_lock:
+            for key, value in increments.items():
+                self.stats[key] += value
+    
+    def _write_batch(self, batch):
+        """Group-commit a batch of interactions"""
+        if not batch:
+            return
+        
+        start = time.perf_counter()
+        try:
+            self.database.save_chat_history_batch(batch)
+        except Exception as e:
+            print(f"Error writing chat history batch: {e}")
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        
+        with self.stats_lock:
+            self.stats['written'] += len(batch)
+            self.stats['flushes'] += 1
+            self.stats['last_flush_ms'] = elapsed_ms
+            self.stats['total_flush_ms'] += elapsed_ms
+            self.stats['max_flush_ms'] = max(self.stats['max_flush_ms'], elapsed_ms)
+    
+    def _writer_loop(self):
+        """Collect queued interactions and write them every N items or T seconds"""
+        batch = []
+        deadline = None
+        
+        while True:
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            
+            if item is None or item is STOP or isinstance(item, FlushRequest):
+                self._write_batch(batch)
+                for _ in batch:
+                    self.queue.task_done()
+                batch = []
+                deadline = None
+                
+                if item is not None:
+                    self.queue.task_done()
+                if isinstance(item, FlushRequest):
+                    item.done.set()
+                if item is STOP:
+                    return
+                continue
+            
+            batch.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+            
+            if len(batch) >= self.batch_size:
+                self._write_batch(batch)
+                for _ in batch:
+                    self.queue.task_done()
+                batch = []
+                deadline = None
+
+# Global history writer instance
+history_writer = HistoryWriter(
+    db,
+    batch_size=config.get('history_batch_size', 50),
+    flush_interval=config.get('history_flush_interval_ms', 500) / 1000,
+    max_queue=config.get('history_queue_size', 10000)
+)
+atexit.register(history_writer.close)
@@ -0,0 +1,146 @@
+"""
+Ignore rules for file searches
+Compiles gitignore-style patterns into a few regular expressions, so a folder
+walk can decide with one or two regex calls per entry whether to skip it. An
+ignored folder is never listed, which keeps dependency trees, caches and
+build output out of both the walk time and the results.
+
+Pattern syntax (a subset of .gitignore):
+    name        ignore files and folders with this name at any depth
+    name/       ignore folders only
+    a/b, /a     patterns with a slash match the path relative to the search root
+    * ? [abc]   wildcards within one path component; ** spans components
+    !pattern    re-include something another pattern ignored
+    # comment   ignored, as are blank lines
+"""
+import os
+import re
+
+from config import config
+
+DEFAULT_IGNORE_PATTERNS = [
+    "node_modules/", "bower_components/", ".git/", ".hg/", ".svn/",
+    "__pycache__/", ".venv/", "venv/", "site-packages/", ".tox/", ".nox/",
+    ".mypy_cache/", ".pytest_cache/", ".ruff_cache/", ".gradle/", ".cache/",
+    "*.egg-info/", "$RECYCLE.BIN/", "System Volume Information/",
+    "*.pyc", "*.pyo", "*.tmp", "~$*"
+]
+
+def glob_to_regex(pattern):
+    """Translate one gitignore-style glob into a regex source"""
+    parts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+            continue
+        if char == "*":
+            parts.append("[^/]*")
+        elif char == "?":
+            parts.append("[^/]")
+        elif char == "[":
+            end = pattern.find("]", i + 1)
+            if end < 0:
+                parts.append(re.escape(char))
+            else:
+                body = pattern[i + 1:end]
+                parts.append("[" + ("^" + body[1:] if body.startswith("!") else body).replace("\\", "\\\\") + "]")
+                i = end
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    return "".join(parts)
+
+class IgnoreRules:
+    def __init__(self, patterns):
+        """
+        Compile ignore patterns
+        
+        Args:
+            patterns: gitignore-style pattern strings, in order
+        """
+        self.patterns = tuple(patterns)
+        flags = re.IGNORECASE if os.name == 'nt' else 0
+        groups = {}  # (negated, by path, folders only) -> regex sources
+        
+        for pattern in self.patterns:
+            pattern = pattern.strip()
+            if not pattern or pattern.startswith("#"):
+                continue
+            negated = pattern.startswith("!")
+            pattern = pattern.lstrip("!")
+            dir_only = pattern.endswith("/")
+            pattern = pattern.rstrip("/")
+            by_path = "/" in pattern
+            if not pattern:
+                continue
+            groups.setdefault((negated, by_path, dir_only), []).append(glob_to_regex(pattern.lstrip("/")))
+        
+        def compile_group(*key):
+            sources = groups.get(key)
+            if not sources:
+                return None
+            return re.compile("(?:" + "|".join(sources) + r")\Z", flags).match
+        
+        # One combined regex per kind of rule
+        self.name_any = compile_group(False, False, False)
+        self.name_dir = compile_group(False, False, True)
+        self.path_any = compile_group(False, True, False)
+        self.path_dir = compile_group(False, True, True)
+        self.keep_name_any = compile_group(True, False, False)
+        self.keep_name_dir = compile_group(True, False, True)
+        self.keep_path_any = compile_group(True, True, False)
+        self.keep_path_dir = compile_group(True, True, True)
+        # Quick test on the name alone: entries it rejects can't be ignored by a name rule
+        name_sources = groups.get((False, False, False), []) + groups.get((False, False, True), [])
+        self.candidate = re.compile("(?:" + "|".join(name_sources) + r")\Z", flags).match if name_sources else None
+        self.needs_path = any(key[1] for key in groups)
+        self.empty = not any(not key[0] for key in groups)
+    
+    def ignored(self, name, is_dir, rel_path=None):
+        """
+        Check whether a file or folder is ignored
+        
+        Args:
+            name: Entry name
+            is_dir: Whether the entry is a folder
+            rel_path: Path relative to the search root with '/' separators
+                      (only needed when needs_path is set)
+        """
+        if self.empty:
+            return False
+        if not self.matches(name, is_dir, rel_path, self.name_any, self.name_dir, self.path_any, self.path_dir):
+            return False
+        return not self.matches(name, is_dir, rel_path, self.keep_name_any, self.keep_name_dir,
+                                self.keep_path_any, self.keep_path_dir)
+    
+    def matches(self, name, is_dir, rel_path, name_any, name_dir, path_any, path_dir):
+        """Check one set of compiled rules"""
+        if name_any and name_any(name):
+            return True
+        if is_dir and name_dir and name_dir(name):
+            return True
+        if rel_path is not None:
+            if path_any and path_any(rel_path):
+                return True
+            if is_dir and path_dir and path_dir(rel_path):
+                return True
+        return False
+
+def get_ignore_rules():
+    """Ignore rules from the config, recompiled only when the patterns change"""
+    global ignore_rules
+    patterns = list(DEFAULT_IGNORE_PATTERNS) if config.get('file_search_ignore_defaults', True) else []
+    patterns += config.get('file_search_ignore', [])
+    if ignore_rules is None or ignore_rules.patterns != tuple(patterns):
+        ignore_rules = IgnoreRules(patterns)
+    return ignore_rules
+
+# Global ignore rules instance (built from the config on first use)
+ignore_rules = None
@@ -0,0 +1,718 @@
+"""
+Media library index
+A catalog of the music and videos under the media folders - title, artist,
+album, track number and duration - so "play songs by X" or "play the album Y"
+is answered with an indexed SQLite lookup instead of a folder walk.
+
+Tags are read from ID3 (mp3), MP4 atoms (m4a/mp4/mov) and FLAC metadata
+blocks by reading headers and seeking past everything else (audio data,
+cover art), so a file costs a few small reads no matter how large it is.
+Refreshes only re-read files whose mtime or size changed.
+"""
+import os
+import re
+import sqlite3
+import struct
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from config import config
+from utils.file_store import atomic_write_lines
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime REAL,
+    size INTEGER,
+    kind TEXT NOT NULL,
+    title TEXT,
+    artist TEXT,
+    album TEXT,
+    album_artist TEXT,
+    track INTEGER,
+    disc INTEGER,
+    duration REAL,
+    title_key TEXT,
+    artist_key TEXT,
+    album_key TEXT,
+    album_artist_key TEXT
+);
+CREATE INDEX IF NOT EXISTS media_title ON media (title_key);
+CREATE INDEX IF NOT EXISTS media_artist ON media (artist_key);
+CREATE INDEX IF NOT EXISTS media_album ON media (album_key);
+CREATE INDEX IF NOT EXISTS media_album_artist ON media (album_artist_key);
+CREATE INDEX IF NOT EXISTS media_kind ON media (kind, mtime);
+"""
+
+# Trigram index for substring queries ("songs by beatles" finding "the beatles"
+# is a prefix match, but "by fonsi" needs a substring), kept in sync by triggers.
+# Changed files are deleted and re-inserted, so no update trigger is needed
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS media_fts USING fts5 (
+    title_key, artist_key, album_key, album_artist_key, content='media', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS media_fts_insert AFTER INSERT ON media BEGIN
+    INSERT INTO media_fts (rowid, title_key, artist_key, album_key, album_artist_key)
+    VALUES (new.id, new.title_key, new.artist_key, new.album_key, new.album_artist_key);
+END;
+CREATE TRIGGER IF NOT EXISTS media_fts_delete AFTER DELETE ON media BEGIN
+    INSERT INTO media_fts (media_fts, rowid, title_key, artist_key, album_key, album_artist_key)
+    VALUES ('delete', old.id, old.title_key, old.artist_key, old.album_key, old.album_artist_key);
+END;
+"""
+
+AUDIO_EXTENSIONS = {'.mp3', '.m4a', '.m4b', '.flac', '.ogg', '.opus', '.wav', '.wma', '.aac'}
+VIDEO_EXTENSIONS = {'.mp4', '.m4v', '.mov', '.mkv', '.avi', '.webm', '.wmv'}
+MP4_EXTENSIONS = {'.m4a', '.m4b', '.mp4', '.m4v', '.mov'}
+
+# Text tags larger than this are skipped rather than read
+MAX_TAG_BYTES = 64 * 1024
+
+ID3_FRAMES = {
+    b'TIT2': 'title', b'TPE1': 'artist', b'TALB': 'album', b'TPE2': 'album_artist',
+    b'TRCK': 'track', b'TPOS': 'disc', b'TLEN': 'length'
+}
+ID3V22_FRAMES = {
+    b'TT2': 'title', b'TP1': 'artist', b'TAL': 'album', b'TP2': 'album_artist',
+    b'TRK': 'track', b'TPA': 'disc', b'TLE': 'length'
+}
+ID3_ENCODINGS = ('latin-1', 'utf-16', 'utf-16-be', 'utf-8')
+VORBIS_FIELDS = {
+    'TITLE': 'title', 'ARTIST': 'artist', 'ALBUM': 'album', 'ALBUMARTIST': 'album_artist',
+    'TRACKNUMBER': 'track', 'DISCNUMBER': 'disc'
+}
+MP4_ITEMS = {
+    b'\xa9nam': 'title', b'\xa9ART': 'artist', b'\xa9alb': 'album', b'aART': 'album_artist',
+    b'trkn': 'track', b'disk': 'disc'
+}
+
+# MPEG audio layer III: kbit/s by bitrate index, for MPEG-1 and MPEG-2/2.5
+MP3_BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+}
+MP3_SAMPLE_RATES = (44100, 48000, 32000)
+
+MEDIA_PATTERN = re.compile(
+    r"play (?:some |my |all )?music(?: from (?:my |the )?music(?: folder)?)?"
+    r"|play (?:all |some |the |my )?(?:songs?|music|tracks?) (?:by|from) (?P<artist>.+)"
+    r"|play (?:the |my )?album (?P<album>.+)"
+    r"|play (?:the )?(?:song|track) (?P<title>.+)"
+    r"|(?:show|list|find|play) (?:me )?(?:my |the |all )?videos?(?: (?:of|about|called|named|with) (?P<video>.+))?"
+    r"|play (?P<title2>.+?) by (?P<artist2>.+)"
+)
+
+def normalize(text):
+    """Search key for a tag: lowercase words without accents or a leading 'the'"""
+    if not text:
+        return ""
+    text = unicodedata.normalize('NFKD', text)
+    words = re.findall(r"\w+", "".join(char for char in text if not unicodedata.combining(char)).lower())
+    if len(words) > 1 and words[0] == 'the':
+        words = words[1:]
+    return " ".join(words)
+
+def parse_number(value):
+    """Track or disc number from '3', '3/12' or a plain int"""
+    if isinstance(value, int):
+        return value or None
+    match = re.match(r"\s*(\d+)", value or "")
+    return int(match.group(1)) if match else None
+
+def syncsafe(data):
+    """Decode an ID3 syncsafe integer (7 bits per byte)"""
+    value = 0
+    for byte in data:
+        value = (value << 7) | (byte & 0x7f)
+    return value
+
+def decode_id3_text(data):
+    """Decode a text frame: an encoding byte, then one or more null-separated values"""
+    if not data:
+        return ""
+    codec = ID3_ENCODINGS[data[0]] if data[0] < len(ID3_ENCODINGS) else 'latin-1'
+    return data[1:].decode(codec, 'replace').split('\0')[0].strip()
+
+def read_id3(f, size):
+    """
+    Read the ID3v2 tag at the start of an mp3 (ID3v1 at the end as a fallback)
+    
+    Only the text frames that are wanted are read; pictures, lyrics and the
+    like are skipped with seeks.
+    
+    Returns:
+        (tags dict, offset where the audio starts)
+    """
+    tags = {}
+    audio_start = 0
+    header = f.read(10)
+    if len(header) == 10 and header[:3] == b'ID3' and header[3] in (2, 3, 4):
+        version, flags = header[3], header[5]
+        tag_end = 10 + syncsafe(header[6:10])
+        audio_start = tag_end + (10 if flags & 0x10 else 0)  # Footer
+        position = 10
+        if flags & 0x40 and version > 2:  # Extended header
+            extended = f.read(4)
+            position += syncsafe(extended) if version == 4 else struct.unpack('>I', extended)[0] + 4
+        frame_header = 6 if version == 2 else 10
+        frames = ID3V22_FRAMES if version == 2 else ID3_FRAMES
+        
+        while position + frame_header <= tag_end:
+            f.seek(position)
+            head = f.read(frame_header)
+            if len(head) < frame_header or head[0] == 0:
+                break  # Padding
+            if version == 2:
+                frame_id, frame_size = head[:3], int.from_bytes(head[3:6], 'big')
+            elif version == 4:
+                frame_id, frame_size = head[:4], syncsafe(head[4:8])
+            else:
+                frame_id, frame_size = head[:4], struct.unpack('>I', head[4:8])[0]
+            position += frame_header
+            key = frames.get(frame_id)
+            if key and key not in tags and frame_size <= MAX_TAG_BYTES:
+                tags[key] = decode_id3_text(f.read(frame_size))
+            position += frame_size
+    
+    if not tags.get('title') and size >= 128:
+        f.seek(size - 128)
+        v1 = f.read(128)
+        if v1[:3] == b'TAG':
+            field = lambda start, end: v1[start:end].split(b'\0')[0].decode('latin-1').strip()
+            tags = {'title': field(3, 33), 'artist': field(33, 63), 'album': field(63, 93)}
+            if v1[125] == 0 and v1[126]:
+                tags['track'] = v1[126]
+    return tags, audio_start
+
+def mp3_duration(f, audio_start, size):
+    """
+    Duration of an mp3 from its first frame
+    
+    VBR files carry the frame count in a Xing/Info or VBRI header; for CBR
+    files the duration follows from the bitrate and the audio size.
+    """
+    f.seek(audio_start)
+    data = f.read(4096)
+    for i in range(len(data) - 4):
+        if data[i] != 0xff or data[i + 1] & 0xe0 != 0xe0:
+            continue
+        header = int.from_bytes(data[i:i + 4], 'big')
+        version = (header >> 19) & 3  # 3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5
+        layer = (header >> 17) & 3    # 1 = layer III
+        bitrate_index = (header >> 12) & 15
+        rate_index = (header >> 10) & 3
+        if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+            continue
+        mpeg1 = version == 3
+        bitrate = MP3_BITRATES[1 if mpeg1 else 2][bitrate_index] * 1000
+        sample_rate = MP3_SAMPLE_RATES[rate_index] >> (0 if mpeg1 else 1 if version == 2 else 2)
+        samples_per_frame = 1152 if mpeg1 else 576
+        mono = (header >> 6) & 3 == 3
+        
+        side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+        xing = i + 4 + side_info
+        if data[xing:xing + 4] in (b'Xing', b'Info'):
+            if data[xing + 7] & 1:
+                frames = int.from_bytes(data[xing + 8:xing + 12], 'big')
+                return frames * samples_per_frame / sample_rate
+        elif data[i + 36:i + 40] == b'VBRI':
+            frames = int.from_bytes(data[i + 50:i + 54], 'big')
+            return frames * samples_per_frame / sample_rate
+        return (size - audio_start - i) * 8 / bitrate
+    return None
+
+def read_flac(f):
+    """Read the STREAMINFO and VORBIS_COMMENT blocks of a FLAC file"""
+    tags = {}
+    if f.read(4) != b'fLaC':
+        return tags
+    while True:
+        head = f.read(4)
+        if len(head) < 4:
+            break
+        block_type, length = head[0] & 0x7f, int.from_bytes(head[1:4], 'big')
+        if block_type == 0:  # STREAMINFO
+            info = int.from_bytes(f.read(length)[10:18], 'big')
+            sample_rate, samples = info >> 44, info & ((1 << 36) - 1)
+            if sample_rate and samples:
+                tags['duration'] = samples / sample_rate
+        elif block_type == 4 and length <= MAX_TAG_BYTES:  # VORBIS_COMMENT
+            tags.update(parse_vorbis_comment(f.read(length)))
+        else:
+            f.seek(length, os.SEEK_CUR)  # Pictures, seek tables, padding
+        if head[0] & 0x80:  # Last metadata block
+            break
+    return tags
+
+def parse_vorbis_comment(data):
+    """Read the fields of a Vorbis comment block (little-endian lengths, KEY=value strings)"""
+    tags = {}
+    try:
+        vendor = struct.unpack_from('<I', data, 0)[0]
+        offset = 4 + vendor
+        count = struct.unpack_from('<I', data, offset)[0]
+        offset += 4
+        for _ in range(count):
+            length = struct.unpack_from('<I', data, offset)[0]
+            key, _, value = data[offset + 4:offset + 4 + length].decode('utf-8', 'replace').partition('=')
+            offset += 4 + length
+            field = VORBIS_FIELDS.get(key.upper())
+            if field and field not in tags:
+                tags[field] = value.strip()
+    except struct.error:
+        pass  # Truncated block; keep what was read
+    return tags
+
+def mp4_atoms(f, start, end):
+    """Iterate (type, payload start, payload end) over the atoms between two offsets"""
+    position = start
+    while position + 8 <= end:
+        f.seek(position)
+        head = f.read(8)
+        if len(head) < 8:
+            return
+        size, kind = struct.unpack('>I4s', head)
+        header = 8
+        if size == 1:  # 64-bit size follows
+            size = struct.unpack('>Q', f.read(8))[0]
+            header = 16
+        elif size == 0:  # Extends to the end
+            size = end - position
+        if size < header:
+            return
+        yield kind, position + header, min(position + size, end)
+        position += size
+
+def read_mp4(f, size):
+    """Read the duration (mvhd) and iTunes-style tags (ilst) of an MP4/QuickTime file"""
+    tags = {}
+    for kind, start, end in mp4_atoms(f, 0, size):
+        if kind != b'moov':
+            continue  # The media data is skipped, wherever it is
+        for child, child_start, child_end in mp4_atoms(f, start, end):
+            if child == b'mvhd':
+                f.seek(child_start)
+                data = f.read(32)
+                if data[:1] == b'\x01':
+                    timescale, duration = struct.unpack_from('>IQ', data, 20)
+                else:
+                    timescale, duration = struct.unpack_from('>II', data, 12)
+                if timescale:
+                    tags['duration'] = duration / timescale
+            elif child in (b'udta', b'meta'):
+                tags.update(read_mp4_meta(f, child, child_start, child_end))
+        break
+    return tags
+
+def read_mp4_meta(f, kind, start, end):
+    """Find the ilst item list below udta/meta and read its text items"""
+    tags = {}
+    if kind == b'meta':
+        # ISO meta is a full atom (4 bytes of version and flags); QuickTime's is not
+        f.seek(start)
+        if f.read(8)[4:8] != b'hdlr':
+            start += 4
+    for child, child_start, child_end in mp4_atoms(f, start, end):
+        if child == b'meta':
+            tags.update(read_mp4_meta(f, child, child_start, child_end))
+        elif child == b'ilst':
+            for item, item_start, item_end in mp4_atoms(f, child_start, child_end):
+                field = MP4_ITEMS.get(item)
+                if not field or item_end - item_start > MAX_TAG_BYTES:
+                    continue  # Cover art and other items are never read
+                for data_kind, data_start, data_end in mp4_atoms(f, item_start, item_end):
+                    if data_kind != b'data':
+                        continue
+                    f.seek(data_start + 8)  # Type and locale
+                    value = f.read(data_end - data_start - 8)
+                    if field in ('track', 'disc'):
+                        tags[field] = struct.unpack('>H', value[2:4])[0] if len(value) >= 4 else None
+                    else:
+                        tags[field] = value.decode('utf-8', 'replace').strip()
+                    break
+    return tags
+
+def read_tags(path, size):
+    """
+    Read a media file's tags
+    
+    Returns:
+        Dict with any of title, artist, album, album_artist, track, disc and duration
+    """
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        with open(path, 'rb') as f:
+            if extension == '.mp3':
+                tags, audio_start = read_id3(f, size)
+                length = tags.pop('length', None)
+                if length and length.isdigit():
+                    tags['duration'] = int(length) / 1000
+                else:
+                    tags['duration'] = mp3_duration(f, audio_start, size)
+                return tags
+            if extension == '.flac':
+                return read_flac(f)
+            if extension in MP4_EXTENSIONS:
+                return read_mp4(f, size)
+    except (OSError, struct.error, IndexError, ValueError):
+        pass  # Unreadable or damaged; indexed by its file name
+    return {}
+
+def is_media_command(command):
+    """Check whether a command plays music or shows videos from the media library"""
+    return config.get('media_index_enabled', True) and bool(MEDIA_PATTERN.fullmatch(command.strip().rstrip('.!?')))
+
+def format_duration(seconds):
+    """Human readable duration, e.g. '3:25' or '1 h 12 min'"""
+    seconds = int(seconds or 0)
+    if seconds >= 3600:
+        return f"{seconds // 3600} h {seconds % 3600 // 60} min"
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+class MediaIndex:
+    # Files parsed per write transaction
+    BATCH_SIZE = 256
+    COLUMNS = "path, title, artist, album, album_artist, track, disc, duration"
+    
+    def __init__(self, db_file=None):
+        """
+        Initialize the media index
+        
+        Args:
+            db_file: SQLite file holding the catalog
+        """
+        db_dir = Path.home() / ".ai_assistant" / "database"
+        db_dir.mkdir(parents=True, exist_ok=True)
+        self.db_file = Path(db_file) if db_file else db_dir / "media_index.db"
+        self.playlist_dir = Path.home() / ".ai_assistant" / "playlists"
+        self.local = threading.local()
+        self.refresh_lock = threading.Lock()
+        self.refresh_thread = None
+        self.stop_event = threading.Event()
+        self.refreshing = False
+        self.has_fts = False
+        
+        self.init_database()
+    
+    def get_connection(self):
+        """Get this thread's connection (sqlite3 connections are not shareable)"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_file), timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+    
+    def init_database(self):
+        """Create tables"""
+        conn = self.get_connection()
+        with conn:
+            conn.executescript(SCHEMA)
+        
+        # The trigram tokenizer needs SQLite 3.34+; substring queries scan otherwise
+        try:
+            with conn:
+                conn.executescript(FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            self.has_fts = False
+    
+    def find_media(self, root):
+        """Walk a root for media files, yielding (path, mtime, size)"""
+        extensions = AUDIO_EXTENSIONS | VIDEO_EXTENSIONS
+        stack = [root]
+        while stack and not self.stop_event.is_set():
+            folder = stack.pop()
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.name[0] == '.':
+                            continue
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif os.path.splitext(entry.name)[1].lower() in extensions:
+                                stat = entry.stat(follow_symlinks=False)
+                                yield entry.path, stat.st_mtime, stat.st_size
+                        except OSError:
+                            continue
+            except OSError:
+                continue  # Unreadable or vanished folder
+    
+    def refresh(self, roots):
+        """
+        Bring the catalog up to date for the given root folders
+        
+        Returns:
+            Number of files that were (re)read
+        """
+        with self.refresh_lock:
+            self.refreshing = True
+            try:
+                return self.refresh_roots([os.path.abspath(root) for root in roots if os.path.isdir(root)])
+            finally:
+                self.refreshing = False
+    
+    def refresh_roots(self, roots):
+        """Find changed media files under the roots and (re)read their tags"""
+        conn = self.get_connection()
+        known = {row['path']: (row['mtime'], row['size']) for row in conn.execute("SELECT path, mtime, size FROM media")}
+        seen = set()
+        changed = []
+        for root in roots:
+            for path, mtime, size in self.find_media(root):
+                seen.add(path)
+                if known.get(path) != (mtime, size):
+                    changed.append((path, mtime, size))
+        if self.stop_event.is_set():
+            return 0  # Interrupted walk; don't mistake unvisited files for deleted ones
+        
+        prefixes = tuple(root.rstrip(os.sep) + os.sep for root in roots)
+        removed = [(path,) for path in known if path.startswith(prefixes) and path not in seen]
+        if removed:
+            with conn:
+                conn.executemany("DELETE FROM media WHERE path = ?", removed)
+        
+        indexed = 0
+        with ThreadPoolExecutor(max_workers=max(1, config.get('media_index_workers', 4))) as pool:
+            for start in range(0, len(changed), self.BATCH_SIZE):
+                if self.stop_event.is_set():
+                    break
+                batch = changed[start:start + self.BATCH_SIZE]
+                rows = list(pool.map(self.make_row, batch))
+                with conn:
+                    conn.executemany("DELETE FROM media WHERE path = ?", [(path,) for path, _, _ in batch])
+                    conn.executemany(
+                        "INSERT INTO media (path, mtime, size, kind, title, artist, album, album_artist, "
+                        "track, disc, duration, title_key, artist_key, album_key, album_artist_key) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        rows
+                    )
+                indexed += len(batch)
+        return indexed
+    
+    def make_row(self, item):
+        """Read one file's tags into a catalog row (on a worker)"""
+        path, mtime, size = item
+        tags = read_tags(path, size)
+        extension = os.path.splitext(path)[1].lower()
+        kind = 'audio' if extension in AUDIO_EXTENSIONS else 'video'
+        title = tags.get('title') or os.path.splitext(os.path.basename(path))[0]
+        artist = tags.get('artist') or None
+        album = tags.get('album') or None
+        album_artist = tags.get('album_artist') or None
+        return (
+            path, mtime, size, kind, title, artist, album, album_artist,
+            parse_number(tags.get('track')), parse_number(tags.get('disc')), tags.get('duration'),
+            normalize(title), normalize(artist), normalize(album), normalize(album_artist)
+        )
+    
+    def find(self, columns, query, kind='audio', order="album_key, disc, track, title_key", limit=None):
+        """
+        Look up catalog rows by one or more key columns
+        
+        Tries an exact key match, then a key prefix (both indexed), then a
+        substring anywhere in the key (through the trigram index when there is one).
+        
+        Returns:
+            List of rows (path, title, artist, album, album_artist, track, disc, duration)
+        """
+        key = normalize(query)
+        if not key:
+            return []
+        attempts = [
+            (" OR ".join(f"{column} = ?" for column in columns), (key,) * len(columns)),
+            (" OR ".join(f"({column} >= ? AND {column} < ?)" for column in columns),
+             (key, key + '\U0010ffff') * len(columns))
+        ]
+        if self.has_fts and len(key) >= 3:
+            attempts.append((
+                "id IN (SELECT rowid FROM media_fts WHERE media_fts MATCH ?)",
+                ("{" + " ".join(columns) + "} : \"" + key.replace('"', '""') + '"',)
+            ))
+        else:
+            escaped = key.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            attempts.append((" OR ".join(f"{column} LIKE ? ESCAPE '\\'" for column in columns),
+                             (f"%{escaped}%",) * len(columns)))
+        
+        conn = self.get_connection()
+        for condition, values in attempts:
+            rows = conn.execute(
+                f"SELECT {self.COLUMNS} FROM media WHERE kind = ? AND ({condition}) ORDER BY {order}"
+                + (" LIMIT ?" if limit else ""),
+                (kind,) + values + ((limit,) if limit else ())
+            ).fetchall()
+            if rows:
+                return rows
+        return []
+    
+    def songs_by(self, artist):
+        """Tracks of an artist (or album artist), album by album"""
+        return self.find(('artist_key', 'album_artist_key'), artist)
+    
+    def album(self, name):
+        """Tracks of the best matching album, in disc and track order"""
+        rows = self.find(('album_key',), name, order="album_key, album_artist_key, disc, track, title_key")
+        if not rows:
+            return []
+        # A prefix or substring can match several albums; keep the first
+        first = (rows[0]['album'], rows[0]['album_artist'])
+        return [row for row in rows if (row['album'], row['album_artist']) == first]
+    
+    def songs(self, title, artist=None):
+        """Tracks with a title, optionally by an artist"""
+        rows = self.find(('title_key',), title, order="artist_key, album_key, track")
+        if artist:
+            wanted = normalize(artist)
+            rows = [row for row in rows if wanted in normalize(row['artist']) or wanted in normalize(row['album'])]
+        return rows
+    
+    def shuffle(self, limit):
+        """A random selection of the library's tracks"""
+        # The random order is taken over the kind index alone; only the chosen rows are read
+        return self.get_connection().execute(
+            f"SELECT {self.COLUMNS} FROM media WHERE id IN "
+            f"(SELECT id FROM media WHERE kind = 'audio' ORDER BY RANDOM() LIMIT ?) ORDER BY RANDOM()", (limit,)
+        ).fetchall()
+    
+    def videos(self, query=None, limit=10):
+        """Videos whose title matches a query, or the newest videos"""
+        if query:
+            return self.find(('title_key',), query, kind='video', order="title_key", limit=limit)
+        return self.get_connection().execute(
+            f"SELECT {self.COLUMNS} FROM media WHERE kind = 'video' ORDER BY mtime DESC LIMIT ?", (limit,)
+        ).fetchall()
+    
+    def write_playlist(self, name, rows):
+        """
+        Write an extended M3U playlist of catalog rows
+        
+        Returns:
+            Path of the playlist
+        """
+        self.playlist_dir.mkdir(parents=True, exist_ok=True)
+        path = self.playlist_dir / ((re.sub(r"[^\w-]+", "_", name).strip("_")[:60] or "playlist") + ".m3u")
+        lines = ["#EXTM3U"]
+        for row in rows:
+            label = f"{row['artist']} - {row['title']}" if row['artist'] else row['title']
+            lines.append(f"#EXTINF:{int(row['duration'] or -1)},{label}")
+            lines.append(row['path'])
+        atomic_write_lines(path, lines)
+        return str(path)
+    
+    def not_found(self, what):
+        """Message for a query with no matches"""
+        if self.refreshing:
+            return f"I couldn't find {what} yet - I'm still indexing your media library."
+        return f"I couldn't find {what} in your media library."
+    
+    def empty_message(self):
+        """Message for a request that needs any music at all (shuffle) when there is none"""
+        if self.refreshing:
+            return "I haven't found any music yet - I'm still indexing your media library."
+        return "Your media library is empty."
+    
+    def get_stats(self):
+        """Get catalog size information"""
+        conn = self.get_connection()
+        counts = dict(conn.execute("SELECT kind, COUNT(*) FROM media GROUP BY kind").fetchall())
+        return {
+            'tracks': counts.get('audio', 0),
+            'videos': counts.get('video', 0),
+            'artists': conn.execute("SELECT COUNT(DISTINCT artist_key) FROM media WHERE kind = 'audio'").fetchone()[0],
+            'albums': conn.execute("SELECT COUNT(DISTINCT album_key) FROM media WHERE kind = 'audio'").fetchone()[0],
+            'refreshing': self.refreshing
+        }
+    
+    def start_background_refresh(self, roots, interval=1800):
+        """
+        Keep the catalog fresh from a daemon thread
+        
+        Args:
+            roots: Folders to index
+            interval: Seconds between incremental refreshes
+        """
+        if self.refresh_thread and self.refresh_thread.is_alive():
+            return
+        
+        def refresh_loop():
+            while not self.stop_event.is_set():
+                try:
+                    self.refresh(roots)
+                except Exception as e:
+                    print(f"Media index refresh error: {e}")
+                self.stop_event.wait(interval)
+        
+        self.refresh_thread = threading.Thread(target=refresh_loop, daemon=True)
+        self.refresh_thread.start()
+    
+    def stop(self):
+        """Stop the background refresh"""
+        self.stop_event.set()
+
+def handle_media_command(command):
+    """
+    Answer "play songs by X", "play the album Y" and "show my videos" from the catalog
+    
+    Several tracks are written to an M3U playlist, which the default player opens.
+    
+    Returns:
+        A message, or a multiple_results dict like FileHandler.handle_search_results
+    """
+    from file_handler import file_handler
+    match = MEDIA_PATTERN.fullmatch(command.strip().rstrip('.!?'))
+    if not match:
+        return "I didn't catch what to play."
+    groups = match.groupdict()
+    
+    if 'video' in command and not (groups['artist'] or groups['album'] or groups['title'] or groups['title2']):
+        rows = media_index.videos(groups['video'])
+        if not rows:
+            return media_index.not_found(f"videos matching '{groups['video']}'" if groups['video'] else "videos")
+        if len(rows) == 1:
+            return file_handler.open_path(rows[0]['path'])
+        return {
+            'type': 'multiple_results',
+            'message': f"Found {len(rows)} videos" + (f" matching '{groups['video']}':" if groups['video'] else ":"),
+            'results': [row['path'] for row in rows]
+        }
+    
+    if groups['artist']:
+        rows, label = media_index.songs_by(groups['artist']), f"songs by {groups['artist']}"
+        if rows:
+            label = f"songs by {rows[0]['album_artist'] or rows[0]['artist'] or groups['artist']}"
+    elif groups['album']:
+        rows, label = media_index.album(groups['album']), f"the album {groups['album']}"
+        if rows:
+            label = f"the album {rows[0]['album']}"
+    elif groups['title'] or groups['title2']:
+        title = groups['title'] or groups['title2']
+        rows, label = media_index.songs(title, groups['artist2']), f"'{title}'"
+    else:
+        rows, label = media_index.shuffle(config.get('media_playlist_max', 200)), "your music, shuffled"
+        if not rows:
+            return media_index.empty_message()
+    if not rows:
+        return media_index.not_found(label)
+    
+    if len(rows) == 1:
+        track = rows[0]
+        target = track['path']
+        label = f"{track['title']} by {track['artist']}" if track['artist'] else track['title']
+    else:
+        target = media_index.write_playlist(label, rows)
+    response = file_handler.open_path(target)
+    if not response.startswith("Opened"):
+        return response
+    total = format_duration(sum(row['duration'] or 0 for row in rows))
+    if len(rows) == 1:
+        return f"🎵 Playing {label} ({total})"
+    return f"🎵 Playing {label}: {len(rows)} tracks, {total}"
+
+# Global media index instance
+media_index = MediaIndex()
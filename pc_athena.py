@@ -14,6 +14,8 @@ import math
 import platform
 from pathlib import Path
 
+from history_archive import HistoryArchive
+
 # Try to import optional modules with fallbacks
 try:
     import speech_recognition as sr
@@ -54,6 +56,7 @@ class PCAthena:
         self.notes = []
         self.reminders = []
         self.history = []
+        self.history_archive = HistoryArchive(Path("athena_data") / "archive")
         self.settings = {
             "voice_enabled": self.voice_enabled,
             "tts_enabled": self.tts_enabled,
@@ -172,8 +175,9 @@ class PCAthena:
             "content": content
         })
         
-        # Keep only last 200 interactions
-        if len(self.history) > 200:
+        # Keep the last 200 interactions live; roll older ones into the archive in batches
+        if len(self.history) > 300:
+            self.history_archive.append(self.history[:-200])
             self.history = self.history[-200:]
     
     def save_data(self):
@@ -185,7 +189,7 @@ class PCAthena:
             data = {
                 "notes": self.notes,
                 "reminders": self.reminders,
-                "history": self.history[-100:],  # Save only recent history
+                "history": self.history,  # Older history lives in the archive
                 "settings": self.settings
             }
             
@@ -593,7 +597,8 @@ class PCAthena:
             self.speak("No interaction history available.")
             return
         
-        print(f"\n📊 RECENT INTERACTIONS ({len(self.history)} total):")
+        total = len(self.history) + self.history_archive.get_stats()['entries']
+        print(f"\n📊 RECENT INTERACTIONS ({total} total):")
         print("=" * 60)
         
         recent_history = self.history[-30:]  # Show last 30 interactions
@@ -0,0 +1,145 @@
+"""
+Per-root search statistics
+Remembers how fast each search root has been walked (entries per second,
+smoothed over runs) and how often its walk ran out of time. Searches use this
+to try fast roots first and to skip roots that are known to be slow - a
+network share or a sleeping USB disk - for a while, instead of letting one of
+them hold up every search.
+"""
+import json
+import time
+import atexit
+import threading
+from pathlib import Path
+
+from config import config
+from utils.file_store import atomic_write_json
+
+class RootStats:
+    # Weight of the newest run in the smoothed throughput
+    SMOOTHING = 0.3
+    # Walks shorter than this say little about a root's speed
+    MIN_ENTRIES = 1000
+    MIN_SECONDS = 0.05
+    # Consecutive timed-out walks that mark a root as slow
+    MAX_TIMEOUTS = 2
+    # Seconds a recorded walk waits before the statistics are written, so the
+    # walks of one search (and of searches right after it) share one write
+    FLUSH_DELAY = 10
+    
+    def __init__(self, stats_file=None):
+        """
+        Initialize the statistics store
+        
+        Args:
+            stats_file: JSON file the statistics are kept in
+        """
+        db_dir = Path.home() / ".ai_assistant" / "database"
+        db_dir.mkdir(parents=True, exist_ok=True)
+        self.stats_file = Path(stats_file) if stats_file else db_dir / "root_stats.json"
+        self.lock = threading.Lock()
+        self.roots = {}  # root -> {'rate', 'samples', 'timeouts', 'last_run'}
+        self.dirty = False
+        self.flush_timer = None
+        
+        self.load()
+    
+    def load(self):
+        """Load the saved statistics"""
+        try:
+            with open(self.stats_file, 'r', encoding='utf-8') as f:
+                self.roots = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error loading search root statistics: {e}")
+    
+    def save(self):
+        """Write the statistics (hold the lock)"""
+        try:
+            atomic_write_json(self.stats_file, self.roots)
+        except Exception as e:
+            print(f"Error saving search root statistics: {e}")
+    
+    def record(self, root, entries, seconds, timed_out=False):
+        """
+        Record one walk of a root
+        
+        Args:
+            root: Folder that was walked
+            entries: Directory entries listed
+            seconds: Time the walk took
+            timed_out: Whether the walk was stopped by its time budget
+        """
+        with self.lock:
+            stats = self.roots.setdefault(root, {'rate': None, 'samples': 0, 'timeouts': 0, 'last_run': 0})
+            stats['last_run'] = time.time()
+            stats['timeouts'] = stats['timeouts'] + 1 if timed_out else 0
+            if timed_out or (entries >= self.MIN_ENTRIES and seconds >= self.MIN_SECONDS):
+                rate = entries / max(seconds, self.MIN_SECONDS)
+                if stats['rate'] is None:
+                    stats['rate'] = rate
+                else:
+                    stats['rate'] += self.SMOOTHING * (rate - stats['rate'])
+                stats['samples'] += 1
+            
+            # The write is deferred and batched
+            self.dirty = True
+            if self.flush_timer is None:
+                self.flush_timer = threading.Timer(self.FLUSH_DELAY, self.flush)
+                self.flush_timer.daemon = True
+                self.flush_timer.start()
+    
+    def flush(self):
+        """Write deferred statistics"""
+        with self.lock:
+            if self.flush_timer is not None:
+                self.flush_timer.cancel()
+                self.flush_timer = None
+            if self.dirty:
+                self.save()
+                self.dirty = False
+    
+    def rate(self, root):
+        """Smoothed entries per second of a root, or None if it hasn't been measured"""
+        stats = self.roots.get(root)
+        return stats['rate'] if stats else None
+    
+    def slow_reason(self, root, now=None):
+        """
+        Why a root should be skipped right now
+        
+        A slow root is tried again once file_search_slow_root_retry seconds
+        have passed since its last walk, so a share that came back is noticed.
+        
+        Returns:
+            A short reason, or None if the root should be searched
+        """
+        stats = self.roots.get(root)
+        if not stats:
+            return None
+        if (now or time.time()) - stats['last_run'] >= config.get('file_search_slow_root_retry', 3600):
+            return None
+        if stats['timeouts'] >= self.MAX_TIMEOUTS:
+            return f"ran out of time on the last {stats['timeouts']} searches"
+        min_rate = config.get('file_search_slow_root_rate', 1000)
+        if stats['samples'] >= 2 and stats['rate'] < min_rate:
+            return f"slow, about {stats['rate']:,.0f} entries/s"
+        return None
+    
+    def order(self, roots):
+        """Roots measured below the slow rate last, the others in their given order"""
+        min_rate = config.get('file_search_slow_root_rate', 1000)
+        def key(root):
+            rate = self.rate(root)
+            return 0 if rate is None or rate >= min_rate else 1
+        return sorted(roots, key=key)
+    
+    def get_stats(self):
+        """Get a copy of the statistics of every root"""
+        with self.lock:
+            return {root: dict(stats) for root, stats in self.roots.items()}
+
+# Global root statistics instance
+root_stats = RootStats()
+atexit.register(root_stats.flush)
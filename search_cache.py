@@ -0,0 +1,94 @@
+"""
+Result cache for file searches
+Remembers the matches of recent folder walks together with the mtime of every
+directory the walk listed. A later identical search re-stats just those
+directories: if none changed, no entry was added, removed or renamed where
+the walk looked, so the cached matches are what a new walk would find.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from config import config
+
+class SearchCache:
+    # Walks that listed more directories than this cost too much to revalidate
+    MAX_DIRS = 20000
+    
+    def __init__(self, max_entries=None):
+        """
+        Initialize the cache
+        
+        Args:
+            max_entries: Number of searches kept (defaults to config file_search_cache_size)
+        """
+        self.max_entries = max_entries or config.get('file_search_cache_size', 128)
+        self.entries = OrderedDict()  # key -> (value, ((folder, mtime_ns), ...))
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+    
+    def make_key(self, kind, root, query, *options):
+        """Cache key for a search of a root; the query is case and whitespace normalized"""
+        return (kind, os.path.normcase(os.path.abspath(root)), " ".join(query.lower().split())) + options
+    
+    def get(self, key):
+        """
+        Look up a search, checking that the folders it listed are unchanged
+        
+        Returns:
+            The cached value (e.g. the walk's matches), or None on a miss
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+        
+        value, folders = entry
+        try:
+            valid = all(os.stat(folder).st_mtime_ns == mtime_ns for folder, mtime_ns in folders)
+        except OSError:
+            valid = False  # A listed folder is gone
+        
+        with self.lock:
+            if valid:
+                self.hits += 1
+                return value
+            self.stale += 1
+            self.misses += 1
+            if self.entries.get(key) is entry:
+                del self.entries[key]
+        return None
+    
+    def put(self, key, value, folders):
+        """Remember the result of a completed walk and the (folder, mtime_ns) pairs it listed"""
+        if len(folders) > self.MAX_DIRS:
+            return
+        with self.lock:
+            self.entries[key] = (value, tuple(folders))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+    
+    def clear(self):
+        """Forget every cached search"""
+        with self.lock:
+            self.entries.clear()
+    
+    def get_stats(self):
+        """Get hit/miss counters"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+# Global search cache instance
+search_cache = SearchCache()
@@ -19,8 +19,16 @@ import uuid
 import hashlib
 
 from file_handler import file_handler
+from file_index import file_index
 from advanced_voice_handler import advanced_voice_handler
 from database import db
+from history_writer import history_writer
+from history_search import is_history_search, extract_search_query, parse_time_range, format_search_results
+from folder_watcher import is_watch_command, handle_watch_command
+from content_index import is_content_search, handle_content_search
+from duplicate_finder import is_duplicate_command, handle_duplicate_command
+from disk_usage import is_disk_usage_command, handle_disk_usage_command
+from media_index import is_media_command, handle_media_command
 from config import config
 from advanced_features import AdvancedFeatures
 
@@ -150,6 +158,30 @@ class SmartCommandProcessor:
     
     def process_main_command(self, command):
         """Main command processing with enhanced features"""
+        # History search (before greetings and file search, which match 'hi' and 'search')
+        if is_history_search(command):
+            return self.search_history(command)
+        
+        # Folder watches ("tell me when a file lands in downloads")
+        if is_watch_command(command):
+            return handle_watch_command(command, db.get_file_aliases(self.user_id), self.process_command)
+        
+        # Document content search ("find the document that mentions invoice 4417")
+        if is_content_search(command):
+            return self.format_file_results(handle_content_search(command))
+        
+        # Music and videos from the media catalog ("play songs by queen")
+        if is_media_command(command):
+            return self.format_file_results(handle_media_command(command))
+        
+        # Duplicate files ("find duplicate files in downloads")
+        if is_duplicate_command(command):
+            return handle_duplicate_command(command, self.user_id)
+        
+        # Disk usage ("what's taking up space in downloads")
+        if is_disk_usage_command(command):
+            return handle_disk_usage_command(command, self.user_id)
+        
         # Greeting detection
         if any(greeting in command for greeting in ['hello', 'hi', 'hey', 'good morning', 'good afternoon', 'good evening']):
             return self.handle_greeting(command)
@@ -291,6 +323,19 @@ class SmartCommandProcessor:
         """Enhanced file operations with smart suggestions"""
         result = file_handler.parse_file_command(command, self.user_id)
         
+        if isinstance(result, dict) and result.get('type') == 'multiple_results':
+            return self.format_file_results(result)
+        
+        # Add smart suggestions if file not found
+        if isinstance(result, str) and ("not found" in result.lower() or result.startswith("No files found")):
+            suggestions = self.get_file_suggestions(command)
+            if suggestions:
+                result += f"\n\nDid you mean:\n{suggestions}"
+        
+        return result
+    
+    def format_file_results(self, result):
+        """Number multiple file results so the user can pick one"""
         if isinstance(result, dict) and result.get('type') == 'multiple_results':
             self.last_search_results = result['results']
             response = result['message'] + "\n"
@@ -299,12 +344,6 @@ class SmartCommandProcessor:
             response += "\nSay the number to open that file, or say 'cancel' to abort."
             return response
         
-        # Add smart suggestions if file not found
-        if isinstance(result, str) and "not found" in result.lower():
-            suggestions = self.get_file_suggestions(command)
-            if suggestions:
-                result += f"\n\nDid you mean:\n{suggestions}"
-        
         return result
     
     def get_file_suggestions(self, command):
@@ -316,6 +355,18 @@ class SmartCommandProcessor:
             if '.' in word or len(word) > 3:
                 potential_files.append(word)
         
+        # Real files with similar names, for misheard or misspelled names
+        filler = {'open', 'find', 'search', 'play', 'show', 'launch', 'run', 'execute', 'for', 'the', 'my',
+                  'a', 'an', 'file', 'folder', 'in', 'on', 'from', 'drive', 'please', 'me'}
+        query = ' '.join(word for word in words if word not in filler)
+        try:
+            matches = file_index.suggest(query) if query else []
+        except Exception as e:
+            print(f"Suggestion error: {e}")
+            matches = []
+        if matches:
+            return "\n".join(f"• {match['name']} ({os.path.dirname(match['path'])})" for match in matches)
+        
         if potential_files:
             return f"• Try searching for: {', '.join(potential_files)}\n• Check your recent files\n• Make sure the file exists"
         
@@ -330,6 +381,8 @@ class SmartCommandProcessor:
 • "Open Downloads folder" - Open any folder
 • "Find resume.pdf on C drive" - Search for files
 • "Play music from Music folder" - Launch media
+• "Play songs by Queen" - Play from your music library
+• "Tell me when a file lands in Downloads" - Watch a folder
 
 🤖 AI FEATURES:
 • "Generate image of a sunset" - Create AI images
@@ -368,6 +421,10 @@ class SmartCommandProcessor:
 • "Take screenshot" - Screen capture
 • "Random number between 1 and 100" - RNG
 
+📜 HISTORY:
+• "Show history" - Recent conversations
+• "What did I ask about resumes last week?" - Search history
+
 ⚙️ ASSISTANT SETTINGS:
 • "Change name to Jarvis" - Rename assistant
 • "Change voice to male/female" - Voice type
@@ -815,6 +872,16 @@ Just speak naturally! I understand context and can help with complex requests.
         
         return response
     
+    def search_history(self, command):
+        """Search past conversations, e.g. 'what did I ask about resumes last week'"""
+        since, until, label, query = parse_time_range(extract_search_query(command))
+        if not query:
+            return "What should I look for? Try: 'search history for resume last week'"
+        
+        history_writer.flush()  # Include interactions still in the write queue
+        results = db.search_chat_history(self.user_id, query, since=since, until=until, limit=10)
+        return format_search_results(results, query, label)
+    
     def generate_intelligent_response(self, command):
         """Generate intelligent response for unrecognized commands"""
         # Analyze command for intent
@@ -861,7 +928,7 @@ Just speak naturally! I understand context and can help with complex requests.
             if len(self.conversation_context) > 20:
                 self.conversation_context = self.conversation_context[-20:]
             
-            # Save to database
-            db.save_chat_history(self.user_id, prompt, str(response))
+            # Queue for the background writer so the response isn't held up by disk I/O
+            history_writer.save(self.user_id, prompt, str(response))
         except Exception as e:
             print(f"Error saving interaction: {e}")
\ No newline at end of file
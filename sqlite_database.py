@@ -0,0 +1,575 @@
+"""
+SQLite storage backend for AI Assistant
+Drop-in replacement for the JSON DatabaseManager with indexed per-user history
+"""
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from config import config
+from history_search import query_terms
+from history_archive import HistoryArchive
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE,
+    password_hash TEXT NOT NULL,
+    assistant_name TEXT,
+    voice_preference TEXT,
+    created_at TEXT,
+    last_login TEXT
+);
+CREATE TABLE IF NOT EXISTS chat_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER,
+    prompt TEXT,
+    response TEXT,
+    timestamp TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_chat_history_user_timestamp
+    ON chat_history (user_id, timestamp);
+CREATE TABLE IF NOT EXISTS file_aliases (
+    user_id TEXT NOT NULL,
+    alias TEXT NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (user_id, alias)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Full-text index over prompts and responses, kept in sync by triggers
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS chat_history_fts USING fts5 (
+    prompt, response, content='chat_history', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS chat_history_fts_insert AFTER INSERT ON chat_history BEGIN
+    INSERT INTO chat_history_fts (rowid, prompt, response) VALUES (new.id, new.prompt, new.response);
+END;
+CREATE TRIGGER IF NOT EXISTS chat_history_fts_delete AFTER DELETE ON chat_history BEGIN
+    INSERT INTO chat_history_fts (chat_history_fts, rowid, prompt, response)
+    VALUES ('delete', old.id, old.prompt, old.response);
+END;
+"""
+
+def iter_json_array(f, chunk_size=64 * 1024):
+    """Yield the objects of a top-level JSON array without loading the whole file"""
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size).lstrip()
+    if not buffer:
+        return
+    if not buffer.startswith('['):
+        raise ValueError("Expected a JSON array")
+    buffer = buffer[1:]
+    eof = False
+    
+    while True:
+        buffer = buffer.lstrip()
+        if buffer.startswith(','):
+            buffer = buffer[1:].lstrip()
+        if buffer.startswith(']'):
+            return
+        
+        try:
+            obj, end = decoder.raw_decode(buffer)
+        except ValueError:
+            if eof:
+                raise
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        
+        yield obj
+        buffer = buffer[end:]
+
+class SQLiteDatabaseManager:
+    # Rows per transaction when bulk loading
+    BATCH_SIZE = 1000
+    # Minimum number of rows moved to the archive at once
+    ARCHIVE_BATCH = 10000
+    # Inserts between checks of the live table size
+    ARCHIVE_CHECK_INTERVAL = 1000
+    
+    def __init__(self, db_file=None):
+        self.db_dir = Path.home() / ".ai_assistant" / "database"
+        self.db_dir.mkdir(parents=True, exist_ok=True)
+        self.db_file = Path(db_file) if db_file else self.db_dir / "assistant.db"
+        self.local = threading.local()
+        self.has_fts = False
+        self.hot_limit = config.get('history_hot_limit', 50000)
+        self.archive = HistoryArchive(self.db_dir / "archive")
+        self.archive_lock = threading.Lock()
+        self.inserts_since_check = 0
+        self.alias_cache = {}  # user_id -> aliases, dropped when that user's aliases change
+        
+        # Initialize database schema
+        self.init_database()
+    
+    def get_connection(self):
+        """Get this thread's connection (sqlite3 connections are not shareable)"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_file), timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+    
+    def init_database(self):
+        """Create tables and indexes"""
+        conn = self.get_connection()
+        with conn:
+            conn.executescript(SCHEMA)
+        
+        # FTS5 is compiled into almost every SQLite build, but fall back to LIKE if not
+        try:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'chat_history_fts'"
+            ).fetchone()
+            with conn:
+                conn.executescript(FTS_SCHEMA)
+                if not exists:
+                    # Index rows written before the FTS table existed
+                    conn.execute("INSERT INTO chat_history_fts (chat_history_fts) VALUES ('rebuild')")
+            self.has_fts = True
+        except sqlite3.OperationalError as e:
+            print(f"Full-text search unavailable, using slower matching: {e}")
+    
+    def get_meta(self, key, default=None):
+        """Read a value from the meta table"""
+        row = self.get_connection().execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+        return row['value'] if row else default
+    
+    def set_meta(self, key, value):
+        """Write a value to the meta table"""
+        conn = self.get_connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value))
+            )
+    
+    def create_user(self, email, password, assistant_name="Assistant", voice_preference="female"):
+        """Create a new user"""
+        try:
+            now = datetime.now().isoformat()
+            conn = self.get_connection()
+            with conn:
+                cursor = conn.execute(
+                    "INSERT INTO users (email, password_hash, assistant_name, voice_preference, created_at, last_login) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (email, password, assistant_name, voice_preference, now, now)
+                )
+            return cursor.lastrowid
+        
+        except sqlite3.IntegrityError:
+            return None  # User already exists
+        except Exception as e:
+            print(f"Error creating user: {e}")
+            return None
+    
+    def authenticate_user(self, email, password):
+        """Authenticate user login"""
+        try:
+            conn = self.get_connection()
+            user = conn.execute(
+                "SELECT id, password_hash, assistant_name FROM users WHERE email = ?", (email,)
+            ).fetchone()
+            
+            if user is None or user['password_hash'] != password:
+                return None  # Authentication failed
+            
+            with conn:
+                conn.execute(
+                    "UPDATE users SET last_login = ? WHERE id = ?",
+                    (datetime.now().isoformat(), user['id'])
+                )
+            
+            return {
+                "id": user['id'],
+                "assistant_name": user['assistant_name'] or 'Assistant'
+            }
+        
+        except Exception as e:
+            print(f"Error authenticating user: {e}")
+            return None
+    
+    def save_chat_history(self, user_id, prompt, response):
+        """Save chat interaction to history"""
+        self.save_chat_history_batch([{
+            "user_id": user_id,
+            "prompt": prompt,
+            "response": response,
+            "timestamp": datetime.now().isoformat()
+        }])
+    
+    def save_chat_history_batch(self, entries):
+        """Save several chat interactions in one transaction"""
+        try:
+            conn = self.get_connection()
+            with conn:
+                conn.executemany(
+                    "INSERT INTO chat_history (user_id, prompt, response, timestamp) VALUES (?, ?, ?, ?)",
+                    [self.history_row(entry) for entry in entries]
+                )
+            
+            self.inserts_since_check += len(entries)
+            if self.inserts_since_check >= self.ARCHIVE_CHECK_INTERVAL:
+                self.inserts_since_check = 0
+                self.archive_old_history()
+        except Exception as e:
+            print(f"Error saving chat history: {e}")
+    
+    def import_chat_history(self, entries, batch_size=1000):
+        """
+        Bulk-load history entries, e.g. from history_transfer
+        
+        Returns:
+            Number of entries imported
+        """
+        count = 0
+        batch = []
+        for entry in entries:
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                self.save_chat_history_batch(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            self.save_chat_history_batch(batch)
+            count += len(batch)
+        return count
+    
+    def archive_old_history(self):
+        """
+        Move each user's oldest rows beyond the hot limit into compressed archive segments
+        
+        The limit applies per user, so one heavy user never pushes another
+        user's recent history out of the live table.
+        """
+        if not self.archive_lock.acquire(blocking=False):
+            return 0  # Another thread is already archiving
+        try:
+            conn = self.get_connection()
+            users = conn.execute(
+                "SELECT user_id, COUNT(*) - ? AS excess FROM chat_history GROUP BY user_id HAVING excess >= ?",
+                (self.hot_limit, self.ARCHIVE_BATCH)
+            ).fetchall()
+            
+            archived = 0
+            for user in users:
+                rows = conn.execute(
+                    "SELECT id, user_id, prompt, response, timestamp FROM chat_history "
+                    "WHERE user_id IS ? ORDER BY timestamp, id LIMIT ?",
+                    (user['user_id'], user['excess'])
+                ).fetchall()
+                self.archive.append(
+                    {"user_id": row['user_id'], "prompt": row['prompt'],
+                     "response": row['response'], "timestamp": row['timestamp']}
+                    for row in rows
+                )
+                with conn:
+                    conn.executemany("DELETE FROM chat_history WHERE id = ?", [(row['id'],) for row in rows])
+                archived += len(rows)
+            return archived
+            
+        except Exception as e:
+            print(f"Error archiving chat history: {e}")
+            return 0
+        finally:
+            self.archive_lock.release()
+    
+    def get_chat_history(self, user_id, limit=50):
+        """Get user's chat history"""
+        try:
+            rows = self.get_connection().execute(
+                "SELECT prompt, response, timestamp FROM chat_history "
+                "WHERE user_id = ? ORDER BY timestamp DESC, id DESC LIMIT ?",
+                (user_id, limit)
+            ).fetchall()
+            
+            # Oldest first, matching the JSON backend
+            history = [(row['prompt'], row['response'], row['timestamp'] or '') for row in reversed(rows)]
+            
+            # Continue into the archive when the live table doesn't have enough
+            older = [
+                (entry['prompt'], entry['response'], entry.get('timestamp', ''))
+                for entry in self.archive.get_recent(user_id, limit - len(history))
+            ]
+            
+            return older + history
+        
+        except Exception as e:
+            print(f"Error getting chat history: {e}")
+            return []
+    
+    def iter_chat_history(self, user_id=None, since=None, until=None):
+        """
+        Stream history entries oldest first, archive then live table
+        
+        Args:
+            user_id: Only entries of this user (None for all users)
+            since: Only entries at or after this datetime/ISO timestamp
+            until: Only entries before this datetime/ISO timestamp
+        """
+        since = since.isoformat() if isinstance(since, datetime) else since
+        until = until.isoformat() if isinstance(until, datetime) else until
+        
+        conditions = []
+        params = []
+        if user_id is not None:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        if since:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            conditions.append("timestamp < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        
+        # Archived rows are always older than the live table. The cursor's read snapshot
+        # and the list of archive segments are taken together while archiving is held
+        # off, so every row is seen exactly once; rows archived later are still in the
+        # snapshot and only in segments not listed. The lock is released before
+        # yielding, so a slow consumer doesn't hold up archiving. The cursor streams
+        with self.archive_lock:
+            cursor = self.get_connection().execute(
+                f"SELECT user_id, prompt, response, timestamp FROM chat_history {where}ORDER BY id",
+                params
+            )
+            segments = self.archive.find_segments(user_id, since, until)
+        yield from self.archive.iter_entries(user_id, since, until, oldest_first=True, segments=segments)
+        
+        for row in cursor:
+            yield {"user_id": row['user_id'], "prompt": row['prompt'],
+                   "response": row['response'], "timestamp": row['timestamp'] or ''}
+    
+    def search_chat_history(self, user_id, query, since=None, until=None, limit=10):
+        """Full-text search over a user's prompts and responses"""
+        terms = query_terms(query)
+        if not terms:
+            return []
+        
+        try:
+            since = since.isoformat() if isinstance(since, datetime) else since
+            until = until.isoformat() if isinstance(until, datetime) else until
+            conditions = ["h.user_id = ?"]
+            params = [user_id]
+            if since:
+                conditions.append("h.timestamp >= ?")
+                params.append(since)
+            if until:
+                conditions.append("h.timestamp < ?")
+                params.append(until)
+            
+            if self.has_fts:
+                # Prefix-match any term, ranked by BM25 (lower is better)
+                match = " OR ".join(f'"{term}"*' for term in terms)
+                sql = (
+                    "SELECT h.prompt, h.response, h.timestamp FROM chat_history_fts "
+                    "JOIN chat_history h ON h.id = chat_history_fts.rowid "
+                    f"WHERE chat_history_fts MATCH ? AND {' AND '.join(conditions)} "
+                    "ORDER BY bm25(chat_history_fts), h.id DESC LIMIT ?"
+                )
+                params = [match] + params
+            else:
+                # Words starting with a term, the same rule as FTS5 and the JSON backend
+                like = " OR ".join("(' ' || h.prompt LIKE ? OR ' ' || h.response LIKE ?)" for _ in terms)
+                sql = (
+                    "SELECT h.prompt, h.response, h.timestamp FROM chat_history h "
+                    f"WHERE ({like}) AND {' AND '.join(conditions)} "
+                    "ORDER BY h.timestamp DESC LIMIT ?"
+                )
+                params = [f"% {term}%" for term in terms for _ in range(2)] + params
+            
+            rows = self.get_connection().execute(sql, params + [limit]).fetchall()
+            results = [(row['prompt'], row['response'], row['timestamp'] or '') for row in rows]
+            
+            # Fill up from the archive; live matches rank first
+            if len(results) < limit and self.archive.find_segments(user_id, since, until):
+                results += self.archive.search(user_id, query, since, until, limit - len(results))
+            
+            return results
+            
+        except Exception as e:
+            print(f"Error searching chat history: {e}")
+            return []
+    
+    def add_file_alias(self, user_id, alias, path):
+        """Add file/folder alias"""
+        try:
+            conn = self.get_connection()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO file_aliases (user_id, alias, path) VALUES (?, ?, ?)",
+                    (str(user_id), alias.lower(), path)
+                )
+            self.alias_cache.pop(str(user_id), None)
+        except Exception as e:
+            print(f"Error adding file alias: {e}")
+    
+    def get_file_aliases(self, user_id):
+        """Get user's file aliases (cached; the returned dict must not be modified)"""
+        try:
+            user_id_str = str(user_id)
+            if user_id_str not in self.alias_cache:
+                rows = self.get_connection().execute(
+                    "SELECT alias, path FROM file_aliases WHERE user_id = ?", (user_id_str,)
+                ).fetchall()
+                self.alias_cache[user_id_str] = {row['alias']: row['path'] for row in rows}
+            return self.alias_cache[user_id_str]
+        
+        except Exception as e:
+            print(f"Error getting file aliases: {e}")
+            return {}
+    
+    def insert_batches(self, sql, rows, commit=True):
+        """
+        Insert rows from an iterator in fixed-size batches
+        
+        Args:
+            commit: Commit each batch; pass False to leave them to the caller's transaction
+        """
+        conn = self.get_connection()
+        count = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.BATCH_SIZE:
+                if commit:
+                    with conn:
+                        conn.executemany(sql, batch)
+                else:
+                    conn.executemany(sql, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            if commit:
+                with conn:
+                    conn.executemany(sql, batch)
+            else:
+                conn.executemany(sql, batch)
+            count += len(batch)
+        return count
+    
+    def migrate_from_json(self, json_dir=None):
+        """One-shot streaming import of the JSON database files"""
+        json_dir = Path(json_dir) if json_dir else self.db_dir
+        if self.get_meta('migrated_from_json'):
+            return None
+        
+        stats = {'users': 0, 'chat_history': 0, 'file_aliases': 0}
+        conn = self.get_connection()
+        try:
+            # One transaction with the migrated flag: a crash leaves nothing behind, so a re-run can't duplicate rows
+            conn.execute("BEGIN")
+            self.import_json_files(json_dir, stats)
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                ('migrated_from_json', datetime.now().isoformat())
+            )
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        return stats
+    
+    def import_json_files(self, json_dir, stats):
+        """Insert the JSON files' rows without committing (see migrate_from_json)"""
+        # Users
+        users_file = json_dir / "users.json"
+        if users_file.exists():
+            with open(users_file, 'r', encoding='utf-8') as f:
+                stats['users'] = self.insert_batches(
+                    "INSERT OR IGNORE INTO users (id, email, password_hash, assistant_name, voice_preference, created_at, last_login) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        (user.get('id'), user.get('email'), user.get('password_hash', ''),
+                         user.get('assistant_name', 'Assistant'), user.get('voice_preference', 'female'),
+                         user.get('created_at'), user.get('last_login'))
+                        for user in iter_json_array(f)
+                    ),
+                    commit=False
+                )
+        
+        # Chat history: the per-user journals, or a legacy file if they were never created
+        history_sql = "INSERT INTO chat_history (user_id, prompt, response, timestamp) VALUES (?, ?, ?, ?)"
+        shard_index_file = json_dir / "history" / "index.json"
+        journal_file = json_dir / "chat_history.jsonl"
+        legacy_file = json_dir / "chat_history.json"
+        if shard_index_file.exists():
+            with open(shard_index_file, 'r', encoding='utf-8') as f:
+                shards = json.load(f)
+            for shard in shards.values():
+                shard_file = json_dir / "history" / shard['file']
+                if not shard_file.exists():
+                    continue
+                with open(shard_file, 'r', encoding='utf-8') as f:
+                    stats['chat_history'] += self.insert_batches(history_sql, (
+                        self.history_row(entry) for entry in self.iter_journal_lines(f)
+                    ), commit=False)
+        elif journal_file.exists():
+            with open(journal_file, 'r', encoding='utf-8') as f:
+                stats['chat_history'] = self.insert_batches(history_sql, (
+                    self.history_row(entry) for entry in self.iter_journal_lines(f)
+                ), commit=False)
+        elif legacy_file.exists():
+            with open(legacy_file, 'r', encoding='utf-8') as f:
+                stats['chat_history'] = self.insert_batches(history_sql, (
+                    self.history_row(entry) for entry in iter_json_array(f)
+                ), commit=False)
+        
+        # File aliases
+        aliases_file = json_dir / "file_aliases.json"
+        if aliases_file.exists():
+            with open(aliases_file, 'r', encoding='utf-8') as f:
+                aliases = json.load(f)
+            stats['file_aliases'] = self.insert_batches(
+                "INSERT OR REPLACE INTO file_aliases (user_id, alias, path) VALUES (?, ?, ?)",
+                (
+                    (str(user_id), alias, path)
+                    for user_id, user_aliases in aliases.items()
+                    for alias, path in user_aliases.items()
+                ),
+                commit=False
+            )
+    
+    @staticmethod
+    def iter_journal_lines(f):
+        """Yield entries of a line-delimited JSON file, skipping damaged lines"""
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+    
+    @staticmethod
+    def history_row(entry):
+        """Convert a JSON history entry into a chat_history row"""
+        return (
+            entry.get('user_id'),
+            entry.get('prompt', ''),
+            entry.get('response', ''),
+            entry.get('timestamp', '')
+        )
+
+if __name__ == "__main__":
+    database = SQLiteDatabaseManager()
+    result = database.migrate_from_json()
+    if result is None:
+        print(f"{database.db_file} was already migrated.")
+    else:
+        print(f"Migrated {result['users']} users, {result['chat_history']} history entries "
+              f"and {result['file_aliases']} aliases into {database.db_file}")
@@ -0,0 +1,20 @@
+"""
+Shared test setup
+The modules create their global instances (database, indexes, config) under
+~/.ai_assistant on import, so HOME points at a scratch folder before any of
+them is imported, and each test gets a fresh home of its own.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+os.environ['HOME'] = tempfile.mkdtemp(prefix="ai_assistant_tests_")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    """A fresh home folder for the objects a test creates"""
+    monkeypatch.setenv('HOME', str(tmp_path))
+    return tmp_path
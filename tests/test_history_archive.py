@@ -0,0 +1,118 @@
+"""Tests for journal compaction and the history archive"""
+import gzip
+import json
+
+from database import DatabaseManager
+from history_archive import HistoryArchive
+
+def make_entries(count, user_id=1, start=0, word="hello"):
+    return [
+        {"user_id": user_id, "prompt": f"{word} prompt {i}", "response": f"response {i}",
+         "timestamp": f"2024-01-01T{i // 3600:02d}:{i // 60 % 60:02d}:{i % 60:02d}"}
+        for i in range(start, start + count)
+    ]
+
+def small_database(db_dir):
+    """A JSON database that compacts every few entries"""
+    database = DatabaseManager(db_dir)
+    database.HISTORY_LIMIT = 10
+    database.COMPACT_THRESHOLD = 25
+    database.archive.segment_size = 7
+    return database
+
+def test_compaction_round_trip(home):
+    database = small_database(home / "db")
+    entries = make_entries(100)
+    for start in range(0, 100, 4):
+        database.save_chat_history_batch(entries[start:start + 4])
+    
+    assert database.archive.get_stats()['entries'] > 0
+    assert len(list(database.read_user_journal(1))) < database.COMPACT_THRESHOLD
+    
+    streamed = list(database.iter_chat_history(1))
+    assert [entry['prompt'] for entry in streamed] == [entry['prompt'] for entry in entries]
+    
+    history = database.get_chat_history(1, limit=30)
+    assert [prompt for prompt, _, _ in history] == [entry['prompt'] for entry in entries[-30:]]
+    
+    # A fresh manager reads the same archive back from its manifest
+    reopened = DatabaseManager(home / "db")
+    assert [entry['prompt'] for entry in reopened.iter_chat_history(1)] == [entry['prompt'] for entry in entries]
+
+def test_compaction_keeps_users_apart(home):
+    database = small_database(home / "db")
+    database.save_chat_history_batch(make_entries(40, user_id=1, word="one"))
+    database.save_chat_history_batch(make_entries(5, user_id=2, word="two"))
+    
+    assert len(list(database.iter_chat_history(1))) == 40
+    assert [entry['prompt'] for entry in database.iter_chat_history(2)] == [f"two prompt {i}" for i in range(5)]
+    assert len(list(database.iter_chat_history())) == 45
+
+def test_search_spans_archive_and_journal(home):
+    database = small_database(home / "db")
+    database.save_chat_history_batch(make_entries(30, word="hello"))
+    database.save_chat_history_batch(make_entries(3, start=30, word="goodbye"))
+    database.save_chat_history_batch(make_entries(1, start=33, word="zebra"))
+    
+    results = database.search_chat_history(1, "hello prompt 3", limit=5)
+    assert results[0][0] == "hello prompt 3"
+    # Query terms match words by prefix
+    assert [prompt for prompt, _, _ in database.search_chat_history(1, "zeb")] == ["zebra prompt 33"]
+    assert database.search_chat_history(2, "hello") == []
+
+def test_archive_append_and_read(tmp_path):
+    archive = HistoryArchive(tmp_path / "archive", segment_size=4)
+    entries = make_entries(10)
+    
+    assert archive.append(entries) == 10
+    assert [segment['count'] for segment in archive.segments] == [4, 4, 2]
+    assert json.loads((tmp_path / "archive" / "manifest.json").read_text()) == archive.segments
+    with gzip.open(tmp_path / "archive" / archive.segments[0]['file'], 'rt') as f:
+        assert [json.loads(line) for line in f] == entries[:4]
+    
+    assert list(archive.iter_entries(1, oldest_first=True)) == entries
+    assert list(archive.iter_entries(1)) == entries[::-1]
+    assert list(archive.iter_entries(2)) == []
+    assert list(archive.iter_entries(1, since=entries[3]['timestamp'], until=entries[6]['timestamp'],
+                                     oldest_first=True)) == entries[3:6]
+    assert archive.get_recent(1, limit=3) == entries[-3:]
+
+def test_get_recent_orders_by_timestamp(tmp_path):
+    archive = HistoryArchive(tmp_path / "archive", segment_size=4)
+    newer = make_entries(4, start=10)
+    older = make_entries(4)
+    archive.append(newer)
+    archive.append(older)  # An import of older history lands in a later segment
+    
+    assert archive.get_recent(1, limit=5) == older[-1:] + newer
+
+def test_find_segments_leaves_caller_list_alone(tmp_path):
+    archive = HistoryArchive(tmp_path / "archive", segment_size=4)
+    archive.append(make_entries(12))
+    segments = archive.find_segments(1)
+    snapshot = list(segments)
+    
+    list(archive.iter_entries(1, oldest_first=True, segments=segments))
+    archive.get_recent(1, limit=2, segments=segments)
+    
+    assert segments == snapshot
+    assert [segment['id'] for segment in segments] == [3, 2, 1]
+
+def test_archive_search_uses_segment_indexes(tmp_path):
+    archive = HistoryArchive(tmp_path / "archive", segment_size=4)
+    entries = make_entries(8)
+    entries[2]['prompt'] = "where is my passport"
+    archive.append(entries)
+    
+    assert (tmp_path / "archive" / archive.segments[0]['file'].replace(".jsonl.gz", ".terms.json.gz")).exists()
+    assert [prompt for prompt, _, _ in archive.search(1, "passport")] == ["where is my passport"]
+    assert [prompt for prompt, _, _ in archive.search(1, "pass")] == ["where is my passport"]
+    assert archive.search(1, "passport", since=entries[3]['timestamp']) == []
+    assert archive.search(2, "passport") == []
+    
+    # Segments without an index file get one on first search
+    for segment in archive.segments:
+        archive.index_file(segment['file']).unlink()
+    reopened = HistoryArchive(tmp_path / "archive", segment_size=4)
+    assert [prompt for prompt, _, _ in reopened.search(1, "passport")] == ["where is my passport"]
+    assert archive.index_file(archive.segments[0]['file']).exists()
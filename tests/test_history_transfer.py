@@ -0,0 +1,78 @@
+"""Tests for history import/export"""
+import pytest
+
+from database import DatabaseManager
+from sqlite_database import SQLiteDatabaseManager
+from history_transfer import export_history, import_history
+
+def make_entries(count, user_id):
+    return [
+        {"user_id": user_id, "prompt": f"prompt {i}, with \"quotes\"\nand a newline", "response": f"response {i}",
+         "timestamp": f"2024-01-{1 + i // 60:02d}T00:00:{i % 60:02d}"}
+        for i in range(count)
+    ]
+
+def open_database(backend, path):
+    if backend == "sqlite":
+        path.mkdir()
+        return SQLiteDatabaseManager(path / "assistant.db")
+    return DatabaseManager(path)
+
+@pytest.fixture(params=["json", "sqlite"])
+def backend(request):
+    return request.param
+
+@pytest.mark.parametrize("name", ["history.jsonl", "history.csv", "history.jsonl.gz", "history.csv.gz"])
+def test_round_trip(home, backend, name):
+    source = open_database(backend, home / "source")
+    entries = make_entries(150, user_id=1) + make_entries(20, user_id=2)
+    source.save_chat_history_batch(entries)
+    
+    assert export_history(home / name, source) == 170
+    
+    target = open_database(backend, home / "target")
+    progress = []
+    assert import_history(home / name, target, progress=progress.append) == 170
+    assert progress[-1] == 170
+    
+    assert list(target.iter_chat_history(1)) == entries[:150]
+    assert list(target.iter_chat_history(2)) == entries[150:]
+    history = target.get_chat_history(1, limit=2)
+    assert history == [(entry['prompt'], entry['response'], entry['timestamp']) for entry in entries[148:150]]
+
+def test_filters(home, backend):
+    source = open_database(backend, home / "source")
+    entries = make_entries(150, user_id=1) + make_entries(20, user_id=2)
+    source.save_chat_history_batch(entries)
+    
+    assert export_history(home / "user.jsonl", source, user_id=1, since="2024-01-02") == 90
+    assert export_history(home / "all.jsonl", source) == 170
+    
+    target = open_database(backend, home / "target")
+    assert import_history(home / "all.jsonl", target, user_id=2, until="2024-01-01T00:00:10") == 10
+    assert list(target.iter_chat_history()) == entries[150:160]
+
+def test_import_skips_damaged_lines(home, backend):
+    entries = make_entries(3, user_id=1)
+    source = open_database(backend, home / "source")
+    source.save_chat_history_batch(entries)
+    export_history(home / "history.jsonl", source)
+    with open(home / "history.jsonl", 'a', encoding='utf-8') as f:
+        f.write("{not json\n\n")
+    
+    target = open_database(backend, home / "target")
+    assert import_history(home / "history.jsonl", target) == 3
+    assert list(target.iter_chat_history(1)) == entries
+
+def test_import_is_newest_first_after_live_history(home):
+    database = DatabaseManager(home / "db")
+    entries = make_entries(10, user_id=1)
+    database.save_chat_history_batch(entries[:5])
+    
+    source = DatabaseManager(home / "source")
+    source.save_chat_history_batch(entries[5:])
+    export_history(home / "newer.jsonl", source)
+    import_history(home / "newer.jsonl", database)
+    
+    history = database.get_chat_history(1, limit=3)
+    assert [timestamp for _, _, timestamp in history] == [entry['timestamp'] for entry in entries[7:]]
@@ -0,0 +1,91 @@
+"""Tests for the write-behind history queue"""
+import threading
+import time
+
+from history_writer import HistoryWriter
+
+class StalledDatabase:
+    """A database whose writes block until released"""
+    def __init__(self):
+        self.release = threading.Event()
+        self.batches = []
+    
+    def save_chat_history_batch(self, batch):
+        self.release.wait()
+        self.batches.append(list(batch))
+    
+    def saved(self):
+        return [entry["prompt"] for batch in self.batches for entry in batch]
+
+def stalled_writer(max_queue=3):
+    """A writer stuck on its first batch with a full queue behind it"""
+    database = StalledDatabase()
+    writer = HistoryWriter(database, batch_size=1, flush_interval=0.01, max_queue=max_queue)
+    writer.save(1, "first", "r")
+    deadline = time.monotonic() + 2
+    while writer.queue.qsize() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    for i in range(max_queue):
+        assert writer.save(1, f"queued {i}", "r")
+    return database, writer
+
+def test_writes_in_order():
+    database = StalledDatabase()
+    database.release.set()
+    writer = HistoryWriter(database, batch_size=2, flush_interval=0.01)
+    for i in range(5):
+        writer.save(1, f"prompt {i}", "r")
+    
+    assert writer.flush()
+    assert database.saved() == [f"prompt {i}" for i in range(5)]
+    writer.close()
+    assert not writer.thread.is_alive()
+
+def test_full_queue_drops_without_blocking():
+    database, writer = stalled_writer()
+    
+    start = time.monotonic()
+    assert not writer.save(1, "dropped", "r")
+    assert time.monotonic() - start < 0.5
+    assert writer.get_stats()['dropped'] == 1
+    
+    database.release.set()
+    assert writer.flush()
+    assert database.saved() == ["first", "queued 0", "queued 1", "queued 2"]
+    writer.close()
+
+def test_flush_gives_up_on_a_full_queue():
+    database, writer = stalled_writer()
+    
+    start = time.monotonic()
+    assert not writer.flush(timeout=0.2)
+    assert time.monotonic() - start < 1
+    
+    database.release.set()
+    writer.close()
+
+def test_flush_gives_up_on_a_stalled_write():
+    database = StalledDatabase()
+    writer = HistoryWriter(database, batch_size=10, flush_interval=10)
+    writer.save(1, "stalled", "r")
+    
+    start = time.monotonic()
+    assert not writer.flush(timeout=0.2)
+    assert time.monotonic() - start < 1
+    
+    database.release.set()
+    writer.close()
+    assert database.saved() == ["stalled"]
+
+def test_close_is_bounded_on_a_full_queue():
+    database, writer = stalled_writer()
+    
+    start = time.monotonic()
+    writer.close(timeout=0.2)
+    assert time.monotonic() - start < 1
+    assert writer.thread.is_alive()
+    
+    database.release.set()
+    writer.close()
+    assert not writer.thread.is_alive()
+    assert database.saved() == ["first", "queued 0", "queued 1", "queued 2"]
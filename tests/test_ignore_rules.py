@@ -0,0 +1,107 @@
+"""Tests for the file search ignore rules"""
+import os
+
+import pytest
+
+from config import config
+from file_handler import file_handler
+from ignore_rules import IgnoreRules, DEFAULT_IGNORE_PATTERNS, get_ignore_rules
+
+def test_name_rules_match_at_any_depth():
+    rules = IgnoreRules(["build", "*.log"])
+    
+    assert rules.ignored("build", True, "build")
+    assert rules.ignored("build", False, "src/build")
+    assert rules.ignored("debug.log", False, "a/b/debug.log")
+    assert not rules.ignored("build.py", False, "build.py")
+    assert not rules.ignored("log", True, "log")
+
+def test_folder_only_rules():
+    rules = IgnoreRules(["cache/"])
+    
+    assert rules.ignored("cache", True, "cache")
+    assert not rules.ignored("cache", False, "cache")
+
+def test_path_rules_match_from_the_root():
+    rules = IgnoreRules(["docs/drafts", "/out", "src/*.gen.py"])
+    
+    assert rules.needs_path
+    assert rules.ignored("drafts", True, "docs/drafts")
+    assert not rules.ignored("drafts", True, "old/docs/drafts")
+    assert rules.ignored("out", True, "out")
+    assert not rules.ignored("out", True, "src/out")
+    assert rules.ignored("a.gen.py", False, "src/a.gen.py")
+    assert not rules.ignored("a.gen.py", False, "src/sub/a.gen.py")
+
+def test_double_star_spans_folders():
+    rules = IgnoreRules(["**/tmp/*.bak", "logs/**"])
+    
+    assert rules.ignored("x.bak", False, "tmp/x.bak")
+    assert rules.ignored("x.bak", False, "a/b/tmp/x.bak")
+    assert not rules.ignored("x.bak", False, "a/tmpx/x.bak")
+    assert rules.ignored("today.txt", False, "logs/2024/today.txt")
+
+def test_wildcards_stay_within_a_name():
+    rules = IgnoreRules(["report?.txt", "data[0-9].csv", "img[!a-z].png", "a/*/c"])
+    
+    assert rules.ignored("report1.txt", False, "report1.txt")
+    assert not rules.ignored("report10.txt", False, "report10.txt")
+    assert rules.ignored("data7.csv", False, "data7.csv")
+    assert not rules.ignored("datax.csv", False, "datax.csv")
+    assert rules.ignored("img1.png", False, "img1.png")
+    assert not rules.ignored("imgx.png", False, "imgx.png")
+    assert rules.ignored("c", True, "a/b/c")
+    assert not rules.ignored("c", True, "a/b/d/c")
+
+def test_negation_re_includes():
+    rules = IgnoreRules(["*.log", "!keep.log", "vendor/", "!vendor/mine/"])
+    
+    assert rules.ignored("debug.log", False, "debug.log")
+    assert not rules.ignored("keep.log", False, "logs/keep.log")
+    assert rules.ignored("vendor", True, "vendor")
+    assert not rules.ignored("mine", True, "vendor/mine")
+
+def test_comments_and_blank_lines():
+    rules = IgnoreRules(["# *.txt", "", "   ", "!"])
+    
+    assert rules.empty
+    assert not rules.ignored("notes.txt", False, "notes.txt")
+
+def test_defaults():
+    rules = IgnoreRules(DEFAULT_IGNORE_PATTERNS)
+    
+    assert rules.ignored("node_modules", True, "web/node_modules")
+    assert rules.ignored("foo.egg-info", True, "foo.egg-info")
+    assert rules.ignored("~$budget.xlsx", False, "~$budget.xlsx")
+    assert rules.ignored("module.pyc", False, "module.pyc")
+    assert not rules.ignored("node_modules", False, "node_modules")
+    assert not rules.ignored("report.txt", False, "report.txt")
+
+@pytest.fixture
+def tree(tmp_path):
+    for path in ["report.txt", "node_modules/pkg/report.txt", "docs/report.txt", "docs/drafts/report.txt",
+                 "build/report.txt", "build/keep/report.txt"]:
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text("x")
+    return tmp_path
+
+def scan(tree, name):
+    patterns, _ = file_handler.file_patterns(name)
+    return sorted(
+        os.path.relpath(path, tree).replace(os.sep, '/')
+        for paths in file_handler.scan_tree(str(tree), patterns[:1], max_depth=5)
+        for path in paths
+    )
+
+def test_walk_skips_ignored_folders(tree, monkeypatch):
+    monkeypatch.setitem(config.config, 'file_search_ignore', ["docs/drafts", "build/", "!build/keep/"])
+    monkeypatch.setitem(config.config, 'file_search_ignore_defaults', True)
+    
+    assert scan(tree, "report.txt") == ["docs/report.txt", "report.txt"]
+
+def test_defaults_can_be_turned_off(tree, monkeypatch):
+    monkeypatch.setitem(config.config, 'file_search_ignore', [])
+    monkeypatch.setitem(config.config, 'file_search_ignore_defaults', False)
+    
+    assert "node_modules/pkg/report.txt" in scan(tree, "report.txt")
+    assert get_ignore_rules().empty
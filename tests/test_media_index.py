@@ -0,0 +1,142 @@
+"""Tests for the media tag parsers and catalog, on small generated files"""
+import struct
+
+import pytest
+
+from media_index import MediaIndex, read_tags, normalize, parse_number
+
+def syncsafe_bytes(value):
+    return bytes((value >> shift) & 0x7f for shift in (21, 14, 7, 0))
+
+def id3_frame(frame_id, text, version=3, encoding=3):
+    body = bytes([encoding]) + text.encode({0: 'latin-1', 1: 'utf-16', 3: 'utf-8'}[encoding])
+    size = syncsafe_bytes(len(body)) if version == 4 else struct.pack('>I', len(body))
+    return frame_id + size + b'\0\0' + body
+
+def id3_tag(frames, version=3, padding=64):
+    body = b"".join(frames) + b'\0' * padding
+    return b'ID3' + bytes([version, 0, 0]) + syncsafe_bytes(len(body)) + body
+
+def mp3_frames(seconds):
+    """Silent MPEG-1 layer III frames, 128 kbit/s at 44.1 kHz"""
+    frame = b'\xff\xfb\x90\x00' + b'\0' * 413  # 144 * 128000 / 44100 bytes
+    return frame * int(seconds * 128000 / 8 / len(frame))
+
+def flac_block(block_type, data, last=False):
+    return bytes([block_type | (0x80 if last else 0)]) + len(data).to_bytes(3, 'big') + data
+
+def flac_file(comments, sample_rate=44100, samples=44100 * 90):
+    info = (sample_rate << 44) | (1 << 41) | (15 << 36) | samples
+    streaminfo = b'\0' * 10 + info.to_bytes(8, 'big') + b'\0' * 16
+    vendor = b'test'
+    comment = struct.pack('<I', len(vendor)) + vendor + struct.pack('<I', len(comments))
+    for text in comments:
+        data = text.encode('utf-8')
+        comment += struct.pack('<I', len(data)) + data
+    return (b'fLaC' + flac_block(0, streaminfo) + flac_block(6, b'\xff' * 500)
+            + flac_block(4, comment) + flac_block(1, b'\0' * 100, last=True) + b'\xff\xf8' * 100)
+
+def atom(kind, *children):
+    body = b"".join(children)
+    return struct.pack('>I4s', len(body) + 8, kind) + body
+
+def mp4_item(kind, value):
+    if isinstance(value, tuple):
+        payload, data_type = struct.pack('>HHHH', 0, *value, 0), 0
+    else:
+        payload, data_type = value.encode('utf-8'), 1
+    return atom(kind, atom(b'data', struct.pack('>II', data_type, 0) + payload))
+
+def mp4_file(items, timescale=1000, duration=215000):
+    mvhd = atom(b'mvhd', b'\0' * 12 + struct.pack('>II', timescale, duration) + b'\0' * 80)
+    hdlr = atom(b'hdlr', b'\0' * 8 + b'mdirappl' + b'\0' * 13)
+    meta = atom(b'meta', b'\0' * 4, hdlr, atom(b'ilst', *items))
+    return atom(b'ftyp', b'M4A \0\0\0\0') + atom(b'mdat', b'\0' * 4096) + atom(b'moov', mvhd, atom(b'udta', meta))
+
+def write(path, data):
+    path.write_bytes(data)
+    return str(path), len(data)
+
+def test_id3v23(tmp_path):
+    data = id3_tag([
+        id3_frame(b'TIT2', "Blue in Green"), id3_frame(b'APIC', "x" * 2000),
+        id3_frame(b'TPE1', "Miles Davis", encoding=1), id3_frame(b'TALB', "Kind of Blue", encoding=0),
+        id3_frame(b'TRCK', "3/5"), id3_frame(b'TPOS', "1")
+    ]) + mp3_frames(10)
+    tags = read_tags(*write(tmp_path / "song.mp3", data))
+    
+    assert {key: tags[key] for key in ('title', 'artist', 'album', 'track', 'disc')} == {
+        'title': "Blue in Green", 'artist': "Miles Davis", 'album': "Kind of Blue", 'track': "3/5", 'disc': "1"
+    }
+    assert tags['duration'] == pytest.approx(10, abs=0.1)
+
+def test_id3v24_length_frame(tmp_path):
+    data = id3_tag([id3_frame(b'TIT2', "Teardrop", version=4), id3_frame(b'TLEN', "330000", version=4)],
+                   version=4) + mp3_frames(1)
+    tags = read_tags(*write(tmp_path / "song.mp3", data))
+    
+    assert tags == {'title': "Teardrop", 'duration': 330}
+
+def test_id3v1_fallback(tmp_path):
+    v1 = (b'TAG' + b'So What'.ljust(30, b'\0') + b'Miles Davis'.ljust(30, b'\0')
+          + b'Kind of Blue'.ljust(30, b'\0') + b'1959' + b'\0' * 28 + b'\0\x01\x00')
+    tags = read_tags(*write(tmp_path / "song.mp3", mp3_frames(2) + v1))
+    
+    assert (tags['title'], tags['artist'], tags['album'], tags['track']) == ("So What", "Miles Davis", "Kind of Blue", 1)
+
+def test_flac(tmp_path):
+    data = flac_file(["title=Hoppípolla", "ARTIST=Sigur Rós", "Album=Takk...", "TRACKNUMBER=2", "COMMENT=x=y"])
+    tags = read_tags(*write(tmp_path / "song.flac", data))
+    
+    assert tags == {'title': "Hoppípolla", 'artist': "Sigur Rós", 'album': "Takk...", 'track': "2", 'duration': 90}
+
+def test_mp4(tmp_path):
+    data = mp4_file([
+        mp4_item(b'covr', "not read"), mp4_item(b'\xa9nam', "Windowlicker"), mp4_item(b'\xa9ART', "Aphex Twin"),
+        mp4_item(b'\xa9alb', "Windowlicker EP"), mp4_item(b'trkn', (1, 3)), mp4_item(b'disk', (1, 1))
+    ])
+    tags = read_tags(*write(tmp_path / "song.m4a", data))
+    
+    assert tags == {'title': "Windowlicker", 'artist': "Aphex Twin", 'album': "Windowlicker EP",
+                    'track': 1, 'disc': 1, 'duration': 215}
+
+def test_damaged_files_have_no_tags(tmp_path):
+    assert read_tags(*write(tmp_path / "a.mp3", b'ID3\x03\0\0\x7f\x7f\x7f\x7fTIT2')) == {'duration': None}
+    assert read_tags(*write(tmp_path / "b.flac", b'fLaC\x84\0\0\x40tr')) == {}
+    assert read_tags(*write(tmp_path / "c.m4a", atom(b'moov', struct.pack('>I4s', 100, b'udta')))) == {}
+    assert read_tags(*write(tmp_path / "d.wav", b'RIFF')) == {}
+
+def test_keys():
+    assert normalize("The Beatles") == "beatles"
+    assert normalize("Sigur Rós") == "sigur ros"
+    assert normalize("The") == "the"
+    assert parse_number("3/12") == 3
+    assert parse_number(0) is None
+    assert parse_number("") is None
+
+def test_catalog(home):
+    music = home / "Music"
+    (music / "Kind of Blue").mkdir(parents=True)
+    write(music / "Kind of Blue" / "03.mp3", id3_tag([
+        id3_frame(b'TIT2', "Blue in Green"), id3_frame(b'TPE1', "Miles Davis"),
+        id3_frame(b'TALB', "Kind of Blue"), id3_frame(b'TRCK', "3")
+    ]) + mp3_frames(1))
+    write(music / "Kind of Blue" / "01.mp3", id3_tag([
+        id3_frame(b'TIT2', "So What"), id3_frame(b'TPE1', "Miles Davis"),
+        id3_frame(b'TALB', "Kind of Blue"), id3_frame(b'TRCK', "1")
+    ]) + mp3_frames(1))
+    write(music / "hoppipolla.flac", flac_file(["TITLE=Hoppípolla", "ARTIST=Sigur Rós"]))
+    write(music / "untagged.m4a", mp4_file([]))
+    
+    index = MediaIndex(home / "media.db")
+    assert index.refresh([str(music)]) == 4
+    assert index.refresh([str(music)]) == 0  # Nothing changed
+    
+    assert [row['title'] for row in index.album("kind of blue")] == ["So What", "Blue in Green"]
+    assert [row['title'] for row in index.songs_by("miles")] == ["So What", "Blue in Green"]
+    assert [row['title'] for row in index.songs_by("sigur ros")] == ["Hoppípolla"]
+    assert [row['title'] for row in index.songs("untagged")] == ["untagged"]
+    
+    (music / "hoppipolla.flac").unlink()
+    index.refresh([str(music)])
+    assert index.get_stats()['tracks'] == 3
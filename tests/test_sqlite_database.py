@@ -0,0 +1,76 @@
+"""Tests for the JSON to SQLite migration"""
+import json
+
+import pytest
+
+from database import DatabaseManager
+from sqlite_database import SQLiteDatabaseManager
+
+def make_json_database(db_dir, entries=300):
+    """A JSON database with one user, some history and an alias"""
+    database = DatabaseManager(db_dir)
+    user_id = database.create_user("ann@example.com", "secret")
+    database.save_chat_history_batch([
+        {"user_id": user_id, "prompt": f"prompt {i}", "response": f"response {i}",
+         "timestamp": f"2024-01-01T00:{i // 60:02d}:{i % 60:02d}"}
+        for i in range(entries)
+    ])
+    database.add_file_alias(user_id, "taxes", str(db_dir))
+    database.flush_user_updates()
+    return user_id
+
+def count_rows(database, table):
+    return database.get_connection().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+def test_migration_imports_everything(home):
+    json_dir = home / "json"
+    user_id = make_json_database(json_dir)
+    database = SQLiteDatabaseManager(home / "assistant.db")
+    
+    stats = database.migrate_from_json(json_dir)
+    
+    assert stats == {'users': 1, 'chat_history': 300, 'file_aliases': 1}
+    history = database.get_chat_history(user_id, limit=3)
+    assert [prompt for prompt, _, _ in history] == ["prompt 297", "prompt 298", "prompt 299"]
+    assert database.get_file_aliases(user_id) == {"taxes": str(json_dir)}
+
+def test_migration_runs_once(home):
+    json_dir = home / "json"
+    make_json_database(json_dir)
+    database = SQLiteDatabaseManager(home / "assistant.db")
+    
+    database.migrate_from_json(json_dir)
+    assert database.migrate_from_json(json_dir) is None
+    assert SQLiteDatabaseManager(home / "assistant.db").migrate_from_json(json_dir) is None
+    assert count_rows(database, "chat_history") == 300
+
+def test_interrupted_migration_leaves_nothing_behind(home, monkeypatch):
+    json_dir = home / "json"
+    make_json_database(json_dir)
+    database = SQLiteDatabaseManager(home / "assistant.db")
+    
+    # Crash after the history went in, before the aliases and the migrated flag
+    def crash(*args, **kwargs):
+        raise KeyboardInterrupt
+    original = database.insert_batches
+    monkeypatch.setattr(database, 'insert_batches', lambda sql, rows, commit=True: (
+        crash() if "file_aliases" in sql else original(sql, rows, commit)
+    ))
+    with pytest.raises(KeyboardInterrupt):
+        database.migrate_from_json(json_dir)
+    assert count_rows(database, "chat_history") == 0
+    
+    monkeypatch.delattr(database, 'insert_batches')
+    assert database.migrate_from_json(json_dir)['chat_history'] == 300
+    assert count_rows(database, "chat_history") == 300
+
+def test_string_time_bounds_are_accepted(home):
+    database = SQLiteDatabaseManager(home / "assistant.db")
+    database.save_chat_history_batch([
+        {"user_id": 1, "prompt": "old invoice", "response": "", "timestamp": "2020-01-01T00:00:00"},
+        {"user_id": 1, "prompt": "new invoice", "response": "", "timestamp": "2024-01-01T00:00:00"},
+    ])
+    
+    results = database.search_chat_history(1, "invoice", since="2023-01-01")
+    
+    assert [prompt for prompt, _, _ in results] == ["new invoice"]
@@ -0,0 +1,79 @@
+"""
+Fuzzy filename matching
+A trigram index over file names that ranks near-miss queries ("resum",
+"quarterly report final") against the real names by trigram similarity
+"""
+import re
+import heapq
+from array import array
+from collections import Counter, defaultdict
+
+SEPARATORS = re.compile(r"[^a-z0-9]+")
+
+def normalize_name(name):
+    """Lowercase a name and turn separators (_ - . etc.) into single spaces"""
+    return SEPARATORS.sub(' ', name.lower()).strip()
+
+def trigrams(text):
+    """Set of trigrams of a normalized name, padded so word edges count"""
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class TrigramIndex:
+    # Candidates (by shared trigram count) that get an exact similarity score
+    CANDIDATES = 200
+    
+    def __init__(self, names):
+        """
+        Build the index
+        
+        Args:
+            names: Iterable of file names
+        """
+        self.names = []
+        postings = defaultdict(list)
+        for name in names:
+            name_id = len(self.names)
+            self.names.append(name)
+            for gram in trigrams(normalize_name(name)):
+                postings[gram].append(name_id)
+        
+        # Compact posting lists: 4 bytes per entry instead of a Python int
+        self.postings = {gram: array('I', ids) for gram, ids in postings.items()}
+        # Trigrams this common say little about a name, so they don't pick candidates
+        self.common_limit = max(1000, len(self.names) // 20)
+    
+    def search(self, query, limit=5, min_score=0.5):
+        """
+        Rank names against a query
+        
+        Scores mostly reward covering the query's trigrams, with a smaller
+        share for overall (Jaccard) similarity so tighter names rank first.
+        
+        Returns:
+            List of (score, name), best first
+        """
+        query_grams = trigrams(normalize_name(query))
+        if not query_grams:
+            return []
+        
+        lists = sorted((self.postings[gram] for gram in query_grams if gram in self.postings), key=len)
+        if not lists:
+            return []
+        selective = [ids for ids in lists if len(ids) <= self.common_limit] or lists[:1]
+        
+        counts = Counter()
+        for ids in selective:
+            counts.update(ids)
+        
+        results = []
+        for name_id, _ in heapq.nlargest(self.CANDIDATES, counts.items(), key=lambda item: item[1]):
+            name = self.names[name_id]
+            name_grams = trigrams(normalize_name(name))
+            shared = len(query_grams & name_grams)
+            score = 0.75 * shared / len(query_grams) + 0.25 * shared / len(query_grams | name_grams)
+            if score >= min_score:
+                results.append((round(score, 3), name))
+        
+        results.sort(key=lambda result: (-result[0], len(result[1])))
+        return results[:limit]
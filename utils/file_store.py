@@ -0,0 +1,59 @@
+"""
+Crash-safe file storage helpers for Athena AI Assistant
+Per-file locks for read-modify-write cycles and atomic commits via
+write-to-temp + os.replace, so readers always see a complete file
+"""
+
+import os
+import json
+import tempfile
+import threading
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+def get_file_lock(path):
+    """
+    Get the lock guarding writes to a file
+    
+    Args:
+        path: File path; all paths resolving to the same file share one lock
+    """
+    key = os.path.abspath(str(path))
+    with _locks_guard:
+        lock = _locks.get(key)
+        if lock is None:
+            lock = _locks[key] = threading.RLock()
+        return lock
+
+def atomic_write_text(path, text, encoding="utf-8"):
+    """
+    Replace a file's contents atomically
+    
+    The data is written and fsynced to a temporary file in the same
+    directory, then swapped in with os.replace. A crash leaves either the
+    old or the new file, never a half-written one, and readers that
+    already opened the old file keep a consistent snapshot.
+    """
+    directory = os.path.dirname(os.path.abspath(str(path)))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(str(path)))
+    try:
+        with os.fdopen(fd, "w", encoding=encoding) as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, str(path))
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+def atomic_write_json(path, data, indent=2):
+    """Serialize data as JSON and replace the file atomically"""
+    atomic_write_text(path, json.dumps(data, indent=indent))
+
+def atomic_write_lines(path, lines):
+    """Replace a file with the given lines (newlines are added) atomically"""
+    atomic_write_text(path, "".join(line + "\n" for line in lines))
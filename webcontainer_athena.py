@@ -15,6 +15,8 @@ import random
 import math
 from pathlib import Path
 
+from history_archive import HistoryArchive
+
 # WebContainer-safe imports only
 try:
     import requests
@@ -59,6 +61,7 @@ class WebContainerAthena:
     def __init__(self):
         self.running = True
         self.commands_history = []
+        self.history_archive = HistoryArchive(Path("athena_archive"))
         self.wake_word = "athena"
         self.notes = []
         self.reminders = []
@@ -131,7 +134,7 @@ class WebContainerAthena:
                 "notes": self.notes,
                 "reminders": self.reminders,
                 "settings": self.settings,
-                "history": self.commands_history[-50:]  # Save only recent history
+                "history": self.commands_history  # Older history lives in the archive
             }
             
             with open("athena_data.json", "w") as f:
@@ -473,8 +476,9 @@ To enable actual screenshots:
         }
         self.commands_history.append(activity)
         
-        # Keep only last 50 activities
-        if len(self.commands_history) > 50:
+        # Keep the last 50 activities live; roll older ones into the archive in batches
+        if len(self.commands_history) > 100:
+            self.history_archive.append(self.commands_history[:-50])
             self.commands_history = self.commands_history[-50:]
     
     def show_history(self):
@@ -689,7 +693,7 @@ Available commands (say "athena" followed by):
                 "notes": self.notes,
                 "reminders": self.reminders,
                 "settings": self.settings,
-                "history": self.commands_history[-50:]  # Save only recent history
+                "history": self.commands_history  # Older history lives in the archive
             }
             
             with open("athena_data.json", "w") as f:
@@ -1031,8 +1035,9 @@ To enable actual screenshots:
         }
         self.commands_history.append(activity)
         
-        # Keep only last 50 activities
-        if len(self.commands_history) > 50:
+        # Keep the last 50 activities live; roll older ones into the archive in batches
+        if len(self.commands_history) > 100:
+            self.history_archive.append(self.commands_history[:-50])
             self.commands_history = self.commands_history[-50:]
     
     def show_history(self):